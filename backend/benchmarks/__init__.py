@@ -0,0 +1,22 @@
+import statistics
+import time
+
+
+def time_calls(func, repeat):
+    """
+    Calls func repeat times and returns the (median, p95) call latency in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * .95))]
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(v)) for v in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,85 @@
+"""
+Measures creating a board from templates of growing size, laid out in one transaction and, for comparison, one
+add_node transaction per column and card as boards used to be created.
+
+Needs a scratch redis server, which is flushed before and after the run:
+
+    python -m benchmarks.board_creation_benchmark --host localhost --port 6379
+"""
+import argparse
+import sys
+import redis
+from benchmarks import print_table, time_calls
+from retro.engine.board_engine import BoardEngine
+from retro.store.redis_store import RedisStore
+from retro.utils.config import Config
+
+# (columns, cards per column)
+TEMPLATE_SIZES = ((3, 0), (6, 3), (6, 20), (10, 50))
+
+
+class _CountingIndex(object):
+    def __init__(self):
+        self.updates = 0
+
+    def create_board(self, board_node):
+        pass
+
+    def update_board(self, board_node):
+        self.updates += 1
+
+    def update_cards(self, board_id, updates, deletes):
+        pass
+
+    def remove_board(self, board_id):
+        pass
+
+
+def _template(columns, cards):
+    return {"id": "benchmark", "columns": [{"name": "column %s" % i,
+                                            "nodes": [{"text": "prompt %s" % j} for j in range(cards)]}
+                                           for i in range(columns)]}
+
+
+def _create_node_by_node(engine, template):
+    board_nodes = engine.create_board("benchmark", content={"name": "benchmark"})
+    board_id = board_nodes[0].id
+
+    for column in template["columns"]:
+        parent_id = engine.add_node(board_id, board_id, "benchmark", {"name": column["name"]}).id
+        for content in column["nodes"]:
+            parent_id = engine.add_node(board_id, parent_id, "benchmark", content).id
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    client = redis.StrictRedis(host=args.host, port=args.port, encoding='utf-8', decode_responses=True)
+    client.flushall()
+
+    rows = []
+    for columns, cards in TEMPLATE_SIZES:
+        index = _CountingIndex()
+        engine = BoardEngine(Config(), RedisStore(index, client=client))
+        engine.templates["benchmark"] = template = _template(columns, cards)
+
+        single = time_calls(lambda: engine.create_board("benchmark", template="benchmark",
+                                                        content={"name": "benchmark"}), args.repeat)
+        single_updates, index.updates = index.updates / args.repeat, 0
+        per_node = time_calls(lambda: _create_node_by_node(engine, template), args.repeat)
+        per_node_updates = index.updates / args.repeat
+
+        rows.append([columns, columns * cards, "%.2f" % single[0], "%.2f" % single[1], "%.0f" % single_updates,
+                     "%.2f" % per_node[0], "%.2f" % per_node[1], "%.0f" % per_node_updates])
+        client.flushall()
+
+    print_table(["columns", "cards", "template p50", "template p95", "index updates", "per node p50", "per node p95",
+                 "index updates"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
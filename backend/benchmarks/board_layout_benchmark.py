@@ -0,0 +1,72 @@
+"""
+Compares the per-node and single-key redis board layouts on boards of 10, 100 and 1000 cards.
+
+Needs a scratch redis server, which is flushed before and after the run:
+
+    python -m benchmarks.board_layout_benchmark --host localhost --port 6379
+"""
+import argparse
+import sys
+import redis
+from benchmarks import print_table, time_calls
+from retro.engine.board_engine import BoardEngine
+from retro.store.redis_layouts import LAYOUTS
+from retro.store.redis_store import RedisStore
+from retro.utils.config import Config
+
+BOARD_SIZES = (10, 100, 1000)
+COLUMNS = 4
+
+
+class _NoIndex(object):
+    def create_board(self, board_node):
+        pass
+
+    def update_board(self, board_node):
+        pass
+
+    def remove_board(self, board_id):
+        pass
+
+
+def _build_board(engine, cards):
+    board_id = engine.create_board("benchmark", content={"name": "benchmark"})[0].id
+    tails = [engine.add_node(board_id, board_id, "benchmark", {"name": "column %s" % i}).id for i in range(COLUMNS)]
+
+    for i in range(cards):
+        column = i % COLUMNS
+        tails[column] = engine.add_node(board_id, tails[column], "benchmark", {"text": "card %s" % i, "votes": 0}).id
+
+    return board_id, tails
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    client = redis.StrictRedis(host=args.host, port=args.port, encoding='utf-8', decode_responses=True)
+    client.flushall()
+
+    rows = []
+    for layout in LAYOUTS:
+        engine = BoardEngine(Config(), RedisStore(_NoIndex(), client=client, layout=layout))
+
+        for cards in BOARD_SIZES:
+            board_id, tails = _build_board(engine, cards)
+            get_board = time_calls(lambda: engine.get_board(board_id), args.repeat)
+            add_node = time_calls(lambda: engine.add_node(board_id, tails[0], "benchmark", {"text": "x"}), args.repeat)
+            memory = sum(client.memory_usage(key) or 0 for key in client.scan_iter(count=1000))
+            delete_board = time_calls(lambda: engine.delete_board(board_id), 1)
+
+            rows.append([layout, cards, "%.2f" % get_board[0], "%.2f" % get_board[1],
+                         "%.2f" % add_node[0], "%.2f" % add_node[1], "%.2f" % delete_board[0], memory])
+            client.flushall()
+
+    print_table(["layout", "cards", "get p50", "get p95", "add p50", "add p95", "delete", "bytes"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
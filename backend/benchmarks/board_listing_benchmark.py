@@ -0,0 +1,95 @@
+"""
+Compares the latency of deep board listing pages fetched with start/count against pages fetched with cursors, and of
+board name searches through regular expressions against searches through search tokens.
+
+    python -m benchmarks.board_listing_benchmark --boards 100000 --page 100 --search "platform ret"
+
+Needs a mongo to write boards to. They go to a separate database, which is dropped afterwards.
+"""
+import argparse
+import re
+import sys
+from pymongo import MongoClient
+from benchmarks import print_table, time_calls
+from retro.chain.node import BoardNode
+from retro.index.cursor import next_cursor
+from retro.index.mongo_index import MongoIndex
+
+_DATABASE = "retrospec_benchmark"
+_WORDS = ["Sprint", "Team", "Alpha", "Release", "Platform", "Mobile", "Quarterly", "Incident", "Design", "Retro"]
+
+
+def _fill(index, boards):
+    batch = []
+    for i in range(boards):
+        # Names are shuffled relative to creation time, so the two sort keys walk the boards in different orders.
+        batch.append(BoardNode("board%08d" % i, creator="someone@example.com", create_time=1530000000000 + i * 1000,
+                               last_update_time=1530000000000 + i * 1000,
+                               content={"name": "%s %s %s" % (_WORDS[i % 10], _WORDS[i // 10 % 10],
+                                                               i * 7919 % boards)}))
+        if len(batch) == 1000:
+            index.update_boards(batch)
+            batch = []
+
+    if batch:
+        index.update_boards(batch)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=27017)
+    parser.add_argument("--boards", type=int, default=100000)
+    parser.add_argument("--count", type=int, default=20, help="Boards per page.")
+    parser.add_argument("--page", type=int, default=100, help="Page to measure, counting from 2.")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--search", default="platform ret", help="Board name search to time.")
+    args = parser.parse_args(argv)
+
+    client = MongoClient(host=args.host, port=args.port)
+    index = MongoIndex(client=client, database=_DATABASE)
+    try:
+        index.create_indices()
+        _fill(index, args.boards)
+
+        rows = []
+        for sort_key, sort_order in (("create_time", "asc"), ("content.name", "desc")):
+            start = (args.page - 1) * args.count
+            # The cursor a client would hold after paging up to the page before.
+            previous = index.get_boards(start=start - args.count, count=args.count, sort_key=sort_key,
+                                        sort_order=sort_order)
+            cursor = next_cursor(previous, args.count, sort_key)
+
+            skip = index.get_boards(start=start, count=args.count, sort_key=sort_key, sort_order=sort_order)
+            keyset = index.get_boards(count=args.count, sort_key=sort_key, sort_order=sort_order, cursor=cursor)
+            assert [board["id"] for board in skip] == [board["id"] for board in keyset]
+
+            for method, kwargs in (("start/count", dict(start=start)), ("cursor", dict(cursor=cursor))):
+                p50, p95 = time_calls(lambda: index.get_boards(count=args.count, sort_key=sort_key,
+                                                               sort_order=sort_order, **kwargs), args.repeat)
+                rows.append([sort_key, sort_order, method, args.page, "%.2f" % p50, "%.2f" % p95])
+
+        print_table(["sort key", "order", "paging", "page", "p50 ms", "p95 ms"], rows)
+        print()
+
+        # What searching content.name cost before it had search tokens.
+        pattern = re.compile(args.search, re.IGNORECASE)
+        regex = lambda: list(client[_DATABASE].boards.find({"content.name": pattern}).limit(args.count)
+                             .sort("create_time", 1))
+        search_terms = {"content.name": args.search}
+        rows = []
+        for method, search in (("regex", regex),
+                               ("tokens", lambda: index.get_boards(search_terms=search_terms, count=args.count)),
+                               ("relevance", lambda: index.get_boards(search_terms=search_terms, count=args.count,
+                                                                      sort_key="relevance"))):
+            p50, p95 = time_calls(search, args.repeat)
+            rows.append([method, repr(args.search), len(search()), "%.2f" % p50, "%.2f" % p95])
+
+        print_table(["search", "terms", "results", "p50 ms", "p95 ms"], rows)
+        print("Searches fail after %sms." % index.search_time_ms)
+    finally:
+        client.drop_database(_DATABASE)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
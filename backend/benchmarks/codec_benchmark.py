@@ -0,0 +1,73 @@
+"""
+Measures encode/decode throughput and stored size of every node codec. Runs without redis.
+
+    python -m benchmarks.codec_benchmark --nodes 10000
+"""
+import argparse
+import sys
+import time
+from benchmarks import print_table
+from retro.chain.node import ContentNode
+from retro.store import codecs
+from retro.store.exceptions import CodecUnavailableError
+
+
+def _sample_nodes(count):
+    return [ContentNode("board|%s" % i, content={"text": "Card number %s with some typical retro text" % i,
+                                                 "votes": i % 7, "color": "#c0c0c0"},
+                        version=i, orig_version=1, creator="someone@example.com", create_time=1530000000000 + i,
+                        last_update_time=1530000000000 + i, parent="board|%s" % (i - 1), child="board|%s" % (i + 1),
+                        column_header="board|column").to_dict()
+            for i in range(count)]
+
+
+def _throughput(func, items):
+    start = time.perf_counter()
+    results = [func(item) for item in items]
+
+    return len(items) / (time.perf_counter() - start), results
+
+
+def _size(encoded):
+    if isinstance(encoded, dict):
+        return sum(len(k) + len(v) for k, v in encoded.items())
+
+    return len(encoded)
+
+
+def _to_bytes(encoded):
+    # Nodes are read back from redis without decoding, so decoders are measured on bytes.
+    if isinstance(encoded, dict):
+        return {k.encode(): _to_bytes(v) for k, v in encoded.items()}
+
+    return encoded.encode() if isinstance(encoded, str) else encoded
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    node_dicts = _sample_nodes(args.nodes)
+
+    rows = []
+    for name in codecs.CODECS:
+        try:
+            codec = codecs.get_codec(name)
+        except CodecUnavailableError as cue:
+            print("Skipping %s: %s" % (name, cue))
+            continue
+
+        # Node hashes as written by the per-node layout, and single values as written by the per-board layout.
+        for form, encode, decode in (("hash", codec.encode_fields, codecs.decode_fields),
+                                     ("value", codec.encode, codecs.decode)):
+            encode_rate, encoded = _throughput(encode, node_dicts)
+            decode_rate, _ = _throughput(decode, [_to_bytes(e) for e in encoded])
+            rows.append([name, form, "%.0f" % encode_rate, "%.0f" % decode_rate,
+                         "%.0f" % (sum(_size(e) for e in encoded) / len(encoded))])
+
+    print_table(["codec", "form", "encode/s", "decode/s", "bytes/node"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,109 @@
+"""
+Measures what the MemStore journal costs: write throughput with and without it, write amplification, and recovery time.
+
+    python -m benchmarks.mem_store_benchmark --boards 50 --cards 200 --writers 8
+
+Write amplification is the bytes written to log segments and snapshots over the encoded size of the nodes that
+transactions changed. Recovery is timed from the log alone and from a snapshot with a short tail, up to the first board
+read.
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from benchmarks import print_table
+from retro.chain.board import Board
+from retro.chain.node import BoardNode
+from retro.store import codecs
+from retro.store.mem_journal import MemJournal
+from retro.store.mem_store import MemStore
+
+
+def _fill(store, args):
+    """
+    Creates the boards, then adds cards to them from args.writers threads. Returns the encoded size of every node the
+    transactions wrote.
+    """
+    codec = codecs.get_codec(args.codec)
+    written = [0] * args.writers
+    boards = []
+    for b in range(args.boards):
+        board_id = "board%s" % b
+        store.create_board(BoardNode(board_id, content={"name": board_id}))
+        boards.append(Board(store, board_id))
+
+    def write(writer):
+        for board in boards[writer::args.writers]:
+            column = board.add_node("someone@example.com", {"name": "column"}, board.board_id)
+            parent = column.id
+            for i in range(args.cards):
+                content = {"text": "Card number %s with some typical retro text" % i}
+                card = board.add_node("someone@example.com", content, parent)
+                # A card write also rewrites the parent and the board node.
+                written[writer] += 3 * len(codec.encode(card.to_dict()))
+                parent = card.id
+
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum(written)
+
+
+def _recover(path, args):
+    start = time.perf_counter()
+    store = MemStore(journal=MemJournal(path, codec=args.codec))
+    opened = time.perf_counter()
+    Board(store, "board0").nodes()
+    first_read = time.perf_counter()
+    store.journal.close()
+
+    return (opened - start) * 1000, (first_read - start) * 1000
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boards", type=int, default=50)
+    parser.add_argument("--cards", type=int, default=200, help="Cards added to every board.")
+    parser.add_argument("--writers", type=int, default=8, help="Threads writing at the same time.")
+    parser.add_argument("--codec", default="msgpack")
+    args = parser.parse_args(argv)
+
+    writes = args.boards * (args.cards + 2)
+    rows = []
+
+    start = time.perf_counter()
+    _fill(MemStore(), args)
+    rows.append(["none", "%.0f" % (writes / (time.perf_counter() - start)), "-", "-", "-", "-", "-"])
+
+    for snapshot_records in (0, 1000):
+        path = tempfile.mkdtemp()
+        try:
+            # snapshot_records=0 only snapshots on request, so recovery replays every record.
+            journal = MemJournal(path, codec=args.codec, snapshot_records=snapshot_records or sys.maxsize)
+            store = MemStore(journal=journal)
+            start = time.perf_counter()
+            logical = _fill(store, args)
+            rate = writes / (time.perf_counter() - start)
+            if snapshot_records:
+                store.snapshot()
+            store.journal.close()
+
+            stats = journal.stats
+            amplification = (stats["log_bytes"] + stats["snapshot_bytes"]) / float(logical)
+            open_ms, first_read_ms = _recover(path, args)
+            rows.append(["snapshot" if snapshot_records else "log only", "%.0f" % rate,
+                         "%.1f" % (writes / float(stats["fsyncs"] or 1)), "%.2f" % amplification,
+                         stats["snapshots"], "%.1f" % open_ms, "%.1f" % first_read_ms])
+        finally:
+            shutil.rmtree(path)
+
+    print_table(["journal", "writes/s", "writes/fsync", "write amp", "snapshots", "recover ms", "first read ms"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+"""
+Measures Node from_dict, to_dict, copy, deepcopy, equality and hashing throughput, and the memory each node takes.
+
+    python -m benchmarks.node_benchmark --nodes 100000
+
+to_dict is measured on fresh nodes and again on the same nodes, which is what serving, journaling and publishing a
+node that was just written do.
+"""
+import argparse
+import copy
+import sys
+import time
+import tracemalloc
+from benchmarks import print_table
+from retro.chain.node import BoardNode, ColumnHeaderNode, ContentNode, Node
+
+
+def _sample_dicts(count):
+    columns = ["board|column_%s" % i for i in range(4)]
+    dicts = [BoardNode("board", content={"name": "Team retro"}, children=set(columns), creator="someone@example.com",
+                       create_time=1530000000000, last_update_time=1530000000000).to_dict()]
+    dicts.extend(ColumnHeaderNode(column, content={"name": column}, parent="board", child=None).to_dict()
+                 for column in columns)
+    dicts.extend(ContentNode("board|%s" % i, content={"text": "Card number %s with some typical retro text" % i,
+                                                      "votes": i % 7},
+                             version=i, orig_version=1, creator="someone@example.com", create_time=1530000000000 + i,
+                             last_update_time=1530000000000 + i, parent="board|%s" % (i - 1),
+                             child="board|%s" % (i + 1), column_header=columns[i % 4]).to_dict()
+                 for i in range(count - len(dicts)))
+
+    return dicts
+
+
+def _rate(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+
+    return "%.0f" % (len(items) / (time.perf_counter() - start))
+
+
+def _bytes_per_node(node_dicts):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Content is shared with node_dicts, so only the nodes themselves are counted.
+    nodes = [Node.from_dict(node_dict) for node_dict in node_dicts]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return "%.0f" % (size / len(nodes))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    node_dicts = _sample_dicts(args.nodes)
+    nodes = [Node.from_dict(node_dict) for node_dict in node_dicts]
+    others = [node.copy() for node in nodes]
+    fresh = [Node.from_dict(node_dict) for node_dict in node_dicts]
+
+    rows = [["from_dict", _rate(Node.from_dict, node_dicts)],
+            ["to_dict", _rate(Node.to_dict, fresh)],
+            ["to_dict again", _rate(Node.to_dict, fresh)],
+            ["copy", _rate(Node.copy, nodes)],
+            ["deepcopy", _rate(copy.deepcopy, nodes)],
+            ["==", _rate(lambda pair: pair[0] == pair[1], list(zip(nodes, others)))],
+            ["hash", _rate(hash, nodes)],
+            ["bytes/node", _bytes_per_node(node_dicts)]]
+
+    print_table(["operation", "nodes/s"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
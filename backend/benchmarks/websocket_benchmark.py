@@ -0,0 +1,109 @@
+"""
+Compares how many sockets the eventlet and asyncio websocket servers hold, and how fast they deliver board events.
+
+Start both servers against the same redis, then point the benchmark at them by name:
+
+    python retro/websocket_server/app.py
+    WEBSOCKET_PORT=4216 python retro/websocket_server/asgi_app.py
+    python -m benchmarks.websocket_benchmark eventlet=http://localhost:4215 asgi=http://localhost:4216 --clients 2000
+
+Every client subscribes to one board, and events are published to redis the same way RedisStore publishes them. Needs
+the asyncio Socket.IO client (pip install "python-socketio[asyncio_client]").
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+import socketio
+from benchmarks import print_table
+from retro.store.redis_store import RedisStore
+from retro.websocket_server import namespace
+from retro.websocket_server.websocket_message import NodeUpdateMessage
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return float('nan')
+
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent))]
+
+
+async def _connect(url, board_id, latencies, semaphore):
+    client = socketio.AsyncClient(reconnection=False)
+    subscribed = asyncio.Event()
+
+    @client.on('subscribe_response', namespace=namespace)
+    def on_subscribe(_data):
+        subscribed.set()
+
+    @client.on('node_update', namespace=namespace)
+    def on_update(data):
+        latencies.append((time.time() - data['nodes'][0]['sent']) * 1000)
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            await client.connect(url, namespaces=[namespace], transports=['websocket'])
+            await client.emit('subscribe', {'board_id': board_id}, namespace=namespace)
+            await asyncio.wait_for(subscribed.wait(), 30)
+        except (socketio.exceptions.ConnectionError, asyncio.TimeoutError):
+            await client.disconnect()
+            return client, None
+
+    return client, (time.perf_counter() - start) * 1000
+
+
+async def _run(url, store, args):
+    board_id = str(uuid.uuid4())
+    latencies = []
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    results = await asyncio.gather(*(_connect(url, board_id, latencies, semaphore) for _ in range(args.clients)))
+    connect_ms = [ms for _, ms in results if ms is not None]
+
+    for i in range(args.events):
+        message = NodeUpdateMessage([{"id": "%s|%s" % (board_id, i), "sent": time.time()}])
+        store._emit(store.client, board_id, message)
+        await asyncio.sleep(args.interval)
+
+    # Let the last events drain before counting what arrived.
+    await asyncio.sleep(2)
+    await asyncio.gather(*(client.disconnect() for client, _ in results))
+
+    delivered = len(latencies) / float(len(connect_ms) * args.events) if connect_ms else 0.0
+
+    return [len(connect_ms), "%.1f" % (statistics.median(connect_ms) if connect_ms else float('nan')),
+            "%.1f%%" % (delivered * 100), "%.2f" % _percentile(latencies, .5), "%.2f" % _percentile(latencies, .95),
+            "%.2f" % _percentile(latencies, .99)]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("servers", nargs="+", metavar="NAME=URL")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between published events.")
+    parser.add_argument("--host", default="localhost", help="Redis the servers listen to.")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--event-stream-length", type=int, default=0,
+                        help="The servers' REDIS_EVENT_STREAM_LENGTH, so events are written where they read them.")
+    args = parser.parse_args(argv)
+
+    # Only used to publish events, so it needs no index.
+    store = RedisStore(None, host=args.host, port=args.port, event_stream_length=args.event_stream_length)
+
+    rows = []
+    for server in args.servers:
+        name, _, url = server.partition("=")
+        rows.append([name, args.clients] + asyncio.run(_run(url, store, args)))
+
+    print_table(["server", "clients", "connected", "connect p50", "delivered", "latency p50", "latency p95",
+                 "latency p99"], rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,8 +1,11 @@
 from datetime import datetime
 from functools import partial
-from retro.chain.node import ColumnHeaderNode, ContentNode, Node
+from retro.chain.exceptions import UnsupportedMoveError
+from retro.chain.node import BoardNode, ColumnHeaderNode, ContentNode, Node
+from retro.chain.order import KEYS_ORDERING, key_between, keys_between, spread_keys
+from retro.chain.stats import add_stats, board_stats, card_stats, node_stats
 from retro.store.store import TransactionNodes
-from retro.store.exceptions import NodeLockedError, UnlockFailureError
+from retro.store.exceptions import NodeLockedError, UnlockFailureError, UnsupportedScriptError
 from retro.utils import unix_time_millis
 
 
@@ -15,7 +18,7 @@ class Board(object):
         return "%s|%s" % (self.board_id, self.store.next_node_id())
 
     def nodes(self):
-        nodes = self.store.transaction(self.board_id, partial(self._collect_all))
+        nodes = self.store.read_transaction(self.board_id, partial(self._collect_all))
         return nodes.reads
 
     def delete(self):
@@ -26,11 +29,40 @@ class Board(object):
         return self.store.get_node(node_id)
 
     def add_node(self, creator, node_content, parent_id):
-        nodes = self.store.transaction(self.board_id, partial(self._add_node, creator, node_content, parent_id))
-        return nodes.updates[1]
+        new_node_id = self.next_node_id()
+        nodes = self._script_transaction(partial(self._add_node, creator, node_content, parent_id,
+                                                 new_node_id=new_node_id),
+                                         'add_node', parent_id, new_node_id, creator, node_content)
+
+        return next(node for node in nodes.updates if node.id == new_node_id)
+
+    def add_nodes(self, creator, node_contents, parent_id):
+        """
+        Adds several nodes under parent_id in a single transaction: cards in the order given between parent_id and the
+        card that followed it, or columns if parent_id is the board.
+
+        :return: The new nodes.
+        """
+        new_node_ids = [self.next_node_id() for _ in node_contents]
+        nodes = self.store.transaction(self.board_id, partial(self._add_nodes, creator, node_contents, parent_id,
+                                                              new_node_ids))
+        new_nodes = {node.id: node for node in nodes.updates}
+
+        return [new_nodes[node_id] for node_id in new_node_ids]
+
+    def add_columns(self, creator, columns):
+        """
+        Adds columns and their cards in a single transaction, e.g. to lay out a board from a template.
+
+        :param columns: (column content, [card content, ...]) for each column, cards from the top down.
+        :return: The board node followed by each new column and its cards.
+        """
+        nodes = self.store.transaction(self.board_id, partial(self._add_columns, creator, columns))
+        return nodes.updates
 
     def move_node(self, node_id, new_parent_id):
-        nodes = self.store.transaction(self.board_id, partial(self._move_node, node_id, new_parent_id))
+        nodes = self._script_transaction(partial(self._move_node, node_id, new_parent_id),
+                                         'move_node', node_id, new_parent_id)
         return nodes.updates
 
     def edit_node(self, node_id, operations, lock=None, unlock=None):
@@ -42,7 +74,7 @@ class Board(object):
         if cascade:
             nodes = self.store.transaction(self.board_id, partial(self._cascade_remove_nodes, node_id))
         else:
-            nodes = self.store.transaction(self.board_id, partial(self._remove_node, node_id))
+            nodes = self._script_transaction(partial(self._remove_node, node_id), 'remove_node', node_id)
 
         return nodes.deletes
 
@@ -50,20 +82,90 @@ class Board(object):
         nodes = self.store.transaction(self.board_id, partial(self._import_nodes, node_dicts, transform_func))
         return nodes.updates
 
-    def _add_node(self, creator, node_content, parent_id, proxy):
+    def rebuild_stats(self):
+        """
+        Counts the board's stats from all of its nodes. Boards keep them up to date themselves once counted.
+
+        :return: The board node with its stats.
+        """
+        nodes = self.store.transaction(self.board_id, partial(self._rebuild_stats))
+        return nodes.updates[0]
+
+    def get_column(self, column_id, after=None, count=None):
+        """
+        Reads part of a column of a board ordered by key, without reading the cards before it.
+
+        :param after: The order key of the card to start after, None to start at the top.
+        :param count: The number of cards to read, all of them if None.
+        :return: The cards, in order.
+        """
+        nodes = self.store.read_transaction(self.board_id, partial(self._get_column, column_id, after, count))
+        return nodes.reads
+
+    def order_by_keys(self):
+        """
+        Gives every card an order key following its place in the chain, and orders the board by key from then on.
+        Cards are unlinked from each other, so that moving one only rewrites that card. Boards already ordered by key
+        are left as they are.
+
+        :return: The nodes rewritten.
+        """
+        nodes = self.store.transaction(self.board_id, partial(self._order_by_keys))
+        return nodes.updates
+
+    def check_column_headers(self):
+        """
+        Finds the cards that do not point at the column they are in. Cards are added to the column of the card above
+        them, so a wrong pointer spreads to every card added below it. Nothing is written.
+
+        :return: The cards found, pointing at their column.
+        """
+        nodes = self.store.read_transaction(self.board_id, partial(self._check_column_headers, False))
+        return nodes.reads
+
+    def repair_column_headers(self):
+        """
+        Points the cards found by check_column_headers at their column, and counts the board's stats again since
+        they were counted against the wrong columns.
+
+        :return: The cards repaired.
+        """
+        nodes = self.store.transaction(self.board_id, partial(self._check_column_headers, True))
+        return nodes.updates[1:]
+
+    def _script_transaction(self, func, script, *args):
+        # Chain mutations run as store scripts where the store has them, and the board is linked.
+        if self.store.supports_scripts:
+            try:
+                return self.store.script_transaction(self.board_id, script, *args)
+            except UnsupportedScriptError:
+                pass
+
+        return self.store.transaction(self.board_id, func)
+
+    def _add_node(self, creator, node_content, parent_id, proxy, new_node_id=None):
         parent = proxy.get_node(parent_id)
         child = None
-        new_node_id = self.next_node_id()
+        new_node_id = new_node_id or self.next_node_id()
 
-        column_header_parent = self._find_first_parent(proxy, parent_id, ColumnHeaderNode.NODE_TYPE)
+        column_header_id = self._column_header_id(proxy, parent)
         now = unix_time_millis(datetime.now())
 
-        if column_header_parent:
+        if column_header_id and self._ordered_by_key(proxy, parent):
+            # The new card goes between parent and whichever card follows it, and nothing else changes.
+            before = parent.order if isinstance(parent, ContentNode) else None
+            node = ContentNode(new_node_id, creator=creator, content=node_content, parent=column_header_id,
+                               create_time=now, column_header=column_header_id,
+                               order=key_between(before, self._next_order(proxy, column_header_id, before)))
+
+            return TransactionNodes(updates=[node], stats=node_stats(node))
+
+        if column_header_id:
             if parent.child:
                 child = proxy.get_node(parent.child)
             # we will insert this between parent and child nodes
             node = ContentNode(new_node_id, creator=creator, content=node_content, parent=parent_id, child=parent.child,
-                               create_time=now, column_header=column_header_parent.id)
+                               create_time=now, column_header=column_header_id)
 
             parent.set_child(node.id)
             if child:
@@ -76,7 +178,77 @@ class Board(object):
 
         update_nodes = [parent, node, child] if child else [parent, node]
 
-        return TransactionNodes(updates=update_nodes)
+        return TransactionNodes(updates=update_nodes, stats=node_stats(node))
+
+    def _add_nodes(self, creator, node_contents, parent_id, new_node_ids, proxy):
+        if not node_contents:
+            return TransactionNodes()
+
+        parent = proxy.get_node(parent_id)
+        column_header_id = self._column_header_id(proxy, parent)
+        now = unix_time_millis(datetime.now())
+
+        if column_header_id is None:
+            # Every node added to the board is a new column.
+            nodes = [ColumnHeaderNode(node_id, creator=creator, content=content, parent=parent_id, create_time=now)
+                     for node_id, content in zip(new_node_ids, node_contents)]
+            for node in nodes:
+                parent.set_child(node.id)
+
+            return TransactionNodes(updates=[parent] + nodes, stats=board_stats(nodes))
+
+        nodes = [ContentNode(node_id, creator=creator, content=content, create_time=now, column_header=column_header_id)
+                 for node_id, content in zip(new_node_ids, node_contents)]
+
+        if self._ordered_by_key(proxy, parent):
+            before = parent.order if isinstance(parent, ContentNode) else None
+            orders = keys_between(before, self._next_order(proxy, column_header_id, before), len(nodes))
+            for node, order in zip(nodes, orders):
+                node.parent = column_header_id
+                node.order = order
+
+            return TransactionNodes(updates=nodes, stats=board_stats(nodes))
+
+        # The new cards are linked to each other, and spliced in between parent and its child.
+        child = proxy.get_node(parent.child) if parent.child else None
+        previous = parent
+        for node in nodes:
+            node.parent = previous.id
+            previous.set_child(node.id)
+            previous = node
+
+        if child:
+            previous.set_child(child.id)
+            child.parent = previous.id
+
+        update_nodes = [parent] + nodes + ([child] if child else [])
+
+        return TransactionNodes(updates=update_nodes, stats=board_stats(nodes))
+
+    def _add_columns(self, creator, columns, proxy):
+        board_node = proxy.get_node(self.board_id)
+        ordered_by_key = board_node.ordering == KEYS_ORDERING
+        now = unix_time_millis(datetime.now())
+        nodes = []
+
+        for column_content, card_contents in columns:
+            column = ColumnHeaderNode(self.next_node_id(), creator=creator, content=column_content,
+                                      parent=self.board_id, create_time=now)
+            board_node.set_child(column.id)
+            nodes.append(column)
+
+            parent = column
+            orders = spread_keys(len(card_contents)) if ordered_by_key else [None] * len(card_contents)
+            for card_content, order in zip(card_contents, orders):
+                card = ContentNode(self.next_node_id(), creator=creator, content=card_content, create_time=now,
+                                   parent=column.id if ordered_by_key else parent.id, column_header=column.id,
+                                   order=order)
+                if not ordered_by_key:
+                    parent.set_child(card.id)
+                nodes.append(card)
+                parent = card
+
+        return TransactionNodes(updates=[board_node] + nodes, stats=board_stats(nodes))
 
     def _move_node(self, node_id, new_parent_id, proxy):
         # A -> B -> C -> D
@@ -106,10 +278,20 @@ class Board(object):
         # D new parent B
 
         node = proxy.get_node(node_id)
+        if self._ordered_by_key(proxy, node):
+            return self._move_card(node, proxy.get_node(new_parent_id), proxy)
+
         old_parent = proxy.get_node(node.parent)
         old_child = proxy.get_node(node.child) if node.child else None
         new_parent = proxy.get_node(new_parent_id)
         new_child = proxy.get_node(new_parent.child) if new_parent.child else None
+        stats = None
+
+        if isinstance(node, ContentNode) and isinstance(new_parent, (ColumnHeaderNode, ContentNode)):
+            # A card moved to another column takes its counts along.
+            stats = card_stats(node, -1)
+            node.column_header = self._column_header_id(proxy, new_parent)
+            stats = add_stats(stats, card_stats(node))
 
         if old_parent == new_child:
             old_parent = new_child
@@ -132,10 +314,29 @@ class Board(object):
             new_child.parent = node_id
 
         nodes = {node, new_parent, new_child, old_parent, old_child}
-        return TransactionNodes(updates=[node for node in nodes if node is not None])
+        return TransactionNodes(updates=[node for node in nodes if node is not None], stats=stats)
+
+    def _move_card(self, node, new_parent, proxy):
+        # Moves a card on a board ordered by key, by giving it the key between new_parent and the card following it.
+        column_header_id = self._column_header_id(proxy, new_parent)
+        if not isinstance(node, ContentNode) or column_header_id is None:
+            raise UnsupportedMoveError("Only cards can be moved on a board ordered by key, and only into a column.")
+
+        stats = card_stats(node, -1)
+        before = new_parent.order if isinstance(new_parent, ContentNode) else None
+        node.parent = node.column_header = column_header_id
+        node.order = key_between(before, self._next_order(proxy, column_header_id, before, skip=node.id))
+
+        return TransactionNodes(updates=[node], stats=add_stats(stats, card_stats(node)))
 
     def _remove_node(self, node_id, proxy):
         node = proxy.get_node(node_id)
+        if self._ordered_by_key(proxy, node):
+            if isinstance(node, ContentNode):
+                return TransactionNodes(deletes=[node], stats=node_stats(node, -1))
+            # A column's cards have nowhere to go without it.
+            return self._cascade_remove_nodes(node_id, proxy)
+
         parent = proxy.get_node(node.parent)
         child = proxy.get_node(node.child) if node.child else None
 
@@ -145,16 +346,28 @@ class Board(object):
             child.parent = parent.id
 
         update_nodes = [parent, child] if child else [parent]
-        return TransactionNodes(updates=update_nodes, deletes=[node])
+        return TransactionNodes(updates=update_nodes, deletes=[node], stats=node_stats(node, -1))
 
     def _cascade_remove_nodes(self, node_id, proxy):
         node = proxy.get_node(node_id)
-        parent = proxy.get_node(node.parent)
-        parent.remove_child(node_id)
+        ordered_by_key = self._ordered_by_key(proxy, node)
+        updates = []
+
+        if ordered_by_key and isinstance(node, ContentNode):
+            # The card and every card below it, which point at their column rather than at the card.
+            below = [card_id for _, card_id in proxy.get_column_orders(node.column_header, after=node.order)]
+            nodes = [node] + (proxy.get_nodes(below) if below else [])
+        else:
+            parent = proxy.get_node(node.parent)
+            parent.remove_child(node_id)
+            updates.append(parent)
+            nodes = list(self._walk_nodes(proxy, node_id, parent.id, ordered_by_key=ordered_by_key))
 
-        nodes = self._collect_nodes(proxy, node_id, parent.id)
+        stats = None
+        for removed in nodes:
+            stats = add_stats(stats, node_stats(removed, -1))
 
-        return TransactionNodes(updates=[parent], deletes=list(nodes.values()))
+        return TransactionNodes(updates=updates, deletes=nodes, stats=stats)
 
     def _edit_node(self, node_id, operations, lock, unlock, proxy):
         node = proxy.get_node(node_id)
@@ -175,41 +388,191 @@ class Board(object):
             # node is unlocked and we want to lock it
             lock_nodes.append((node_id, lock))
 
+        stats = node_stats(node, -1) if isinstance(node, ContentNode) else None
+
         # apply operations (SET, INCR, DELETE, etc.) to node
         for operation in operations:
             operation.execute(node)
 
-        return TransactionNodes(updates=[node], locks=lock_nodes, unlocks=unlock_nodes)
+        if stats is not None:
+            stats = add_stats(stats, node_stats(node))
+
+        return TransactionNodes(updates=[node], locks=lock_nodes, unlocks=unlock_nodes, stats=stats)
 
     def _import_nodes(self, node_dicts, transform_func, _proxy):
         # Deserialize all node JSON to actual Node objects, and transform their properties if necessary
         nodes = [transform_func(self.board_id, node=Node.from_dict(node_dict)) for node_dict in node_dicts]
+        return TransactionNodes(updates=nodes, stats=board_stats(nodes))
+
+    def _rebuild_stats(self, proxy):
+        nodes = list(self._walk_nodes(proxy, self.board_id))
+        board_node = nodes[0]
+        board_node.stats = board_stats(nodes)
+
+        return TransactionNodes(updates=[board_node])
+
+    def _get_column(self, column_id, after, count, proxy):
+        card_ids = [card_id for _, card_id in proxy.get_column_orders(column_id, after, count)]
+        return TransactionNodes(reads=proxy.get_nodes(card_ids) if card_ids else [])
+
+    def _order_by_keys(self, proxy):
+        nodes = self._collect_nodes(proxy, self.board_id)
+        board_node = nodes[0]
+        if board_node.ordering == KEYS_ORDERING:
+            return TransactionNodes()
+
+        # Each column comes followed by its cards in chain order.
+        columns = []
+        for node in nodes[1:]:
+            if isinstance(node, ColumnHeaderNode):
+                columns.append((node, []))
+            elif isinstance(node, ContentNode):
+                columns[-1][1].append(node)
+
+        for column, cards in columns:
+            column.child = None
+            for card, order in zip(cards, spread_keys(len(cards))):
+                card.parent = card.column_header = column.id
+                card.child = None
+                card.order = order
+
+        board_node.ordering = KEYS_ORDERING
+        board_node.stats = board_stats(nodes)
+
         return TransactionNodes(updates=nodes)
 
+    def _check_column_headers(self, repair, proxy):
+        nodes = {node.id: node for node in self._walk_nodes(proxy, self.board_id)}
+        board_node = nodes[self.board_id]
+        repaired = []
+
+        for column_id in board_node.children:
+            node_id = nodes[column_id].child
+            while node_id:
+                node = nodes[node_id]
+                if node.column_header != column_id:
+                    # Read transactions may hand out the stored nodes themselves.
+                    node = nodes[node_id] = node.copy(column_header=column_id)
+                    repaired.append(node)
+                node_id = node.child
+
+        if not repair:
+            return TransactionNodes(reads=repaired)
+
+        board_node.stats = board_stats(nodes.values())
+        return TransactionNodes(updates=[board_node] + repaired)
+
     def _collect_all(self, proxy):
-        return TransactionNodes(reads=list(self._collect_nodes(proxy, self.board_id).values()))
+        return TransactionNodes(reads=self._collect_nodes(proxy, self.board_id))
 
     def _delete_all(self, proxy):
-        return TransactionNodes(deletes=list(self._collect_nodes(proxy, self.board_id).values()))
+        return TransactionNodes(deletes=list(self._walk_nodes(proxy, self.board_id)))
 
     def _collect_nodes(self, proxy, root_id, parent_id=None):
-        collected = {}
-        top = proxy.get_node(root_id)
-        collected[top.id] = top
+        fetched = {node.id: node for node in self._walk_nodes(proxy, root_id, parent_id)}
+        nodes = list(self._chain_order(fetched, root_id, parent_id))
+
+        # Cards ordered by key are not linked from their column, so they go after it in key order.
+        cards = {}
+        for node in sorted((node for node in fetched.values() if isinstance(node, ContentNode) and node.order),
+                           key=lambda card: (card.order, card.id)):
+            cards.setdefault(node.column_header, []).append(node)
+
+        if not cards:
+            return nodes
+
+        return [card for node in nodes for card in [node] + cards.get(node.id, [])]
+
+    @staticmethod
+    def _walk_nodes(proxy, root_id, parent_id=None, ordered_by_key=False):
+        # Yield every node reachable from root_id without going back through parent_id. The chain is fetched one
+        # frontier at a time (the columns, then every column's next card, and so on) so walking a board costs one
+        # round trip per level instead of one per node. Cards ordered by key only point at their column, so on those
+        # boards a column's cards come from its index instead.
+        seen = {root_id, parent_id}
+        frontier = [root_id]
+
+        while frontier:
+            nodes = proxy.get_nodes(frontier)
+            frontier = []
+
+            for node in nodes:
+                yield node
+
+                neighbor_ids = list(node.neighbors())
+                if isinstance(node, BoardNode) and node.ordering == KEYS_ORDERING:
+                    ordered_by_key = True
+                elif ordered_by_key and isinstance(node, ColumnHeaderNode):
+                    neighbor_ids.extend(card_id for _, card_id in proxy.get_column_orders(node.id))
+
+                for node_id in neighbor_ids:
+                    if node_id not in seen:
+                        seen.add(node_id)
+                        frontier.append(node_id)
+
+    @staticmethod
+    def _chain_order(fetched, root_id, parent_id=None):
+        # Yield the fetched nodes depth first (each column followed by its cards), which is the order callers have
+        # always received. An explicit stack keeps this safe for columns of any length.
+        stack = [(root_id, parent_id)]
+
+        while stack:
+            node_id, from_id = stack.pop()
+            node = fetched[node_id]
+            yield node
+
+            stack.extend(reversed([(neighbor_id, node_id) for neighbor_id in node.neighbors()
+                                   if neighbor_id != from_id]))
+
+    @staticmethod
+    def _ordered_by_key(proxy, node):
+        """
+        :return: Whether node's board orders its cards by key. Cards with a key, and columns with a linked card, answer
+                 that themselves; anything else reads the board node.
+        """
+        if isinstance(node, ContentNode) and node.order is not None:
+            return True
+        if isinstance(node, ContentNode) or (isinstance(node, ColumnHeaderNode) and node.child):
+            return False
+
+        board_node = node if isinstance(node, BoardNode) else proxy.get_node(node.parent)
+        return board_node.ordering == KEYS_ORDERING
+
+    @staticmethod
+    def _next_order(proxy, column_id, before, skip=None):
+        """
+        :return: The key of the first card after the key before in column_id, other than skip. None at the end.
+        """
+        for order, card_id in proxy.get_column_orders(column_id, after=before, count=2):
+            if card_id != skip:
+                return order
+
+        return None
+
+    @classmethod
+    def _column_header_id(cls, proxy, node):
+        """
+        :return: The id of the column a card added or moved under node belongs to, None under the board. Cards know
+                 their column, so the chain is only walked up for cards written without one.
+        """
+        if isinstance(node, ColumnHeaderNode):
+            return node.id
+        if not isinstance(node, ContentNode):
+            return None
+        if node.column_header:
+            return node.column_header
 
-        for node_id in top.neighbors():
-            if node_id != parent_id:
-                collected.update(self._collect_nodes(proxy, node_id, root_id))
+        column_header = cls._find_first_parent(proxy, node.parent, ColumnHeaderNode.NODE_TYPE)
+        return column_header.id if column_header else None
 
-        return collected
+    @staticmethod
+    def _find_first_parent(proxy, node_id, node_type):
+        while node_id:
+            node = proxy.get_node(node_id)
 
-    def _find_first_parent(self, proxy, node_id, node_type):
-        node = proxy.get_node(node_id)
+            if node.NODE_TYPE == node_type:
+                return node
 
-        if node.NODE_TYPE == node_type:
-            return node
+            node_id = node.parent
 
-        if node.parent:
-            return self._find_first_parent(proxy, node.parent, node_type)
-        else:
-            return None
+        return None
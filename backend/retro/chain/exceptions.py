@@ -4,3 +4,7 @@ class UnsupportedOperationError(Exception):
 
 class UnknownNodeTypeError(Exception):
     pass
+
+
+class UnsupportedMoveError(Exception):
+    pass
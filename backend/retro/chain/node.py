@@ -1,3 +1,4 @@
+import copy
 from retro.chain.exceptions import UnknownNodeTypeError
 
 NODE_ID_KEY = "id"
@@ -12,6 +13,9 @@ CHILDREN_KEY = "children"
 PARENT_KEY = "parent"
 CHILD_KEY = "child"
 COLUMN_HEADER_KEY = "column_header"
+STATS_KEY = "stats"
+ORDER_KEY = "order"
+ORDERING_KEY = "ordering"
 
 _NODE_REGISTRY = {}
 
@@ -22,8 +26,16 @@ def register_node(cls):
 
 
 class Node(object):
+    """
+    Nodes are slotted, and cache their to_dict until one of their fields is set. Content is a dict shared with the
+    cached dict, so operations editing it in place need not invalidate anything.
+    """
     NODE_TYPE = 'Node'
     INDEX_FIELDS = []
+    __slots__ = ("id", "content", "version", "orig_version", "creator", "create_time", "last_update_time", "parent",
+                 "_dict")
+    # Every slot of a class but _dict, see __init_subclass__.
+    _FIELDS = __slots__[:-1]
 
     def __init__(self, node_id, content=None, version=1, orig_version=None,
                  creator=None, create_time=None, last_update_time=None, **kwargs):
@@ -36,6 +48,15 @@ class Node(object):
         self.last_update_time = last_update_time
         self.parent = None
 
+    def __init_subclass__(cls, **kwargs):
+        super(Node, cls).__init_subclass__(**kwargs)
+        cls._FIELDS = tuple(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get("__slots__", ())
+                            if name != "_dict")
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_dict", None)
+
     def neighbors(self):
         raise NotImplementedError
 
@@ -43,13 +64,18 @@ class Node(object):
         return "%s|%s|%s" % (self.id, self.content, self.version)
 
     def __eq__(self, other):
+        """
+        Every write bumps the version of the nodes it changes, so a node id at a version is a single state. Compare
+        to_dict() to tell apart changes that were not written yet.
+        """
         if not isinstance(other, Node):
             return False
 
-        return other.to_dict() == self.to_dict()
+        return self.id == other.id and self.version == other.version and self.NODE_TYPE == other.NODE_TYPE
 
     def __hash__(self):
-        return hash(((k, v) for k, v in self.to_dict()))
+        # Versions change while nodes are in sets, ids do not.
+        return hash(self.id)
 
     def __copy__(self):
         return self.copy()
@@ -58,26 +84,47 @@ class Node(object):
         return {}
 
     def copy(self, **kwargs):
-        new_node = self.__class__(self.id)
-        new_node.__dict__.update(self.__dict__)
-        new_node.__dict__.update(kwargs)
+        new_node = object.__new__(self.__class__)
+        set_field = object.__setattr__
+        for name in self._FIELDS:
+            set_field(new_node, name, getattr(self, name))
+        set_field(new_node, "_dict", None)
+
+        for name, value in kwargs.items():
+            setattr(new_node, name, value)
 
         return new_node
 
-    def to_dict(self):
-        d = {
-            NODE_TYPE_KEY: self.NODE_TYPE,
-            NODE_ID_KEY: self.id,
-            CONTENT_KEY: self.content,
-            VERSION_KEY: self.version,
-            ORIG_VERSION_KEY: self.orig_version,
-            CREATOR_KEY: self.creator,
-            CREATE_TIME_KEY: self.create_time,
-            LAST_UPDATE_TIME_KEY: self.last_update_time
-        }
-        d.update(self._dict_items())
+    def __deepcopy__(self, memo):
+        # Stores copy every node a transaction reads. The to_dict cache is left behind rather than copied.
+        new_node = object.__new__(self.__class__)
+        set_field = object.__setattr__
+        for name in self._FIELDS:
+            set_field(new_node, name, copy.deepcopy(getattr(self, name), memo))
+        set_field(new_node, "_dict", None)
 
-        return d
+        return new_node
+
+    def to_dict(self):
+        """
+        :return: A new dict, which callers may change. Its content is the node's own.
+        """
+        d = self._dict
+        if d is None:
+            d = {
+                NODE_TYPE_KEY: self.NODE_TYPE,
+                NODE_ID_KEY: self.id,
+                CONTENT_KEY: self.content,
+                VERSION_KEY: self.version,
+                ORIG_VERSION_KEY: self.orig_version,
+                CREATOR_KEY: self.creator,
+                CREATE_TIME_KEY: self.create_time,
+                LAST_UPDATE_TIME_KEY: self.last_update_time
+            }
+            d.update(self._dict_items())
+            object.__setattr__(self, "_dict", d)
+
+        return dict(d)
 
     @staticmethod
     def from_dict(node_dict):
@@ -85,9 +132,22 @@ class Node(object):
         if not cls:
             raise UnknownNodeTypeError("Unknown node type: %s" % node_dict[NODE_TYPE_KEY])
 
-        # Ignore id because we already passed it in, and ignore type because it's inferred by the class type
-        return cls(node_dict[NODE_ID_KEY], **{k: v for k, v in node_dict.items()
-                                              if k not in (NODE_ID_KEY, NODE_TYPE_KEY)})
+        return cls._from_dict(node_dict)
+
+    @classmethod
+    def _from_dict(cls, node_dict):
+        # Every node read goes through here, so fields are set directly rather than through __init__ and __setattr__.
+        # Slots are named after their to_dict keys, and the type is inferred by the class type.
+        node = object.__new__(cls)
+        set_field = object.__setattr__
+        for name in cls._FIELDS:
+            set_field(node, name, node_dict.get(name))
+        set_field(node, "_dict", None)
+
+        if VERSION_KEY not in node_dict:
+            set_field(node, VERSION_KEY, 1)
+
+        return node
 
     def to_index_dict(self):
         d = {}
@@ -103,11 +163,24 @@ class Node(object):
 @register_node
 class BoardNode(Node):
     NODE_TYPE = 'Board'
-    INDEX_FIELDS = [NODE_ID_KEY, CREATOR_KEY, CREATE_TIME_KEY, LAST_UPDATE_TIME_KEY, CONTENT_KEY]
+    INDEX_FIELDS = [NODE_ID_KEY, CREATOR_KEY, CREATE_TIME_KEY, LAST_UPDATE_TIME_KEY, CONTENT_KEY, STATS_KEY]
+    __slots__ = ("children", "stats", "ordering")
 
-    def __init__(self, node_id, children=set(), **kwargs):
+    def __init__(self, node_id, children=set(), stats=None, ordering=None, **kwargs):
         super(BoardNode, self).__init__(node_id, **kwargs)
         self.children = set(children)
+        # Card counts and content totals, see retro.chain.stats. None until they are counted for the first time.
+        self.stats = stats
+        # How cards are ordered within their column: None through their parent and child, or by their order keys, see
+        # retro.chain.order.
+        self.ordering = ordering
+
+    @classmethod
+    def _from_dict(cls, node_dict):
+        node = super(BoardNode, cls)._from_dict(node_dict)
+        object.__setattr__(node, CHILDREN_KEY, set(node.children or ()))
+
+        return node
 
     def neighbors(self):
         for child in self.children:
@@ -115,16 +188,19 @@ class BoardNode(Node):
 
     def remove_child(self, node_id):
         self.children.remove(node_id)
+        self._dict = None
 
     def set_child(self, node_id):
         self.children.add(node_id)
+        self._dict = None
 
     def _dict_items(self):
-        return {CHILDREN_KEY: list(self.children)}
+        return {CHILDREN_KEY: sorted(self.children), STATS_KEY: self.stats, ORDERING_KEY: self.ordering}
 
 
 class ParentChildNode(Node):
     NODE_TYPE = 'ParentChild'
+    __slots__ = ("child",)
 
     def __init__(self, node_id, parent=None, child=None, **kwargs):
         super(ParentChildNode, self).__init__(node_id, **kwargs)
@@ -151,15 +227,20 @@ class ParentChildNode(Node):
 @register_node
 class ContentNode(ParentChildNode):
     NODE_TYPE = 'Content'
+    __slots__ = ("column_header", "order")
 
-    def __init__(self, node_id, column_header=None, **kwargs):
+    def __init__(self, node_id, column_header=None, order=None, **kwargs):
         super(ContentNode, self).__init__(node_id, **kwargs)
         self.column_header = column_header
+        # Position within the column on boards ordered by key, see retro.chain.order.
+        self.order = order
 
     def _dict_items(self):
-        return {PARENT_KEY: self.parent, CHILD_KEY: self.child, COLUMN_HEADER_KEY: self.column_header}
+        return {PARENT_KEY: self.parent, CHILD_KEY: self.child, COLUMN_HEADER_KEY: self.column_header,
+                ORDER_KEY: self.order}
 
 
 @register_node
 class ColumnHeaderNode(ParentChildNode):
     NODE_TYPE = 'ColumnHeader'
+    __slots__ = ()
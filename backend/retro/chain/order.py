@@ -0,0 +1,103 @@
+"""
+Order keys place cards within their column without linking them to their neighbours. Keys are base 62 fractions
+written as strings, so any two keys sort like the positions they stand for, and there is always a key between two
+others: moving a card only changes its own key.
+"""
+
+# Boards whose cards are ordered by key, see BoardNode.ordering.
+KEYS_ORDERING = "keys"
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_BASE = len(DIGITS)
+_DIGIT_VALUES = {digit: value for value, digit in enumerate(DIGITS)}
+
+
+def key_between(before=None, after=None):
+    """
+    :param before: The key to sort after, None for the start of the column.
+    :param after: The key to sort before, None for the end of the column. Must be greater than before.
+    :return: A key strictly between before and after. Keys added at either end of a column grow by a digit every few
+             dozen additions, and keys added between two others by a digit every five or six.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError("Order key '%s' is not before '%s'." % (before, after))
+
+    if after is None and before is not None:
+        return _increment(before)
+    if before is None and after is not None:
+        return _decrement(after)
+
+    return _midpoint(before or "", after)
+
+
+def keys_between(before=None, after=None, count=1):
+    """
+    :return: count keys in increasing order between before and after. Each key is placed between its neighbours in
+             halves, so the keys grow with the log of count rather than with count.
+    """
+    if count <= 0:
+        return []
+
+    middle = key_between(before, after)
+    below = (count - 1) // 2
+
+    return keys_between(before, middle, below) + [middle] + keys_between(middle, after, count - 1 - below)
+
+
+def spread_keys(count):
+    """
+    :return: count keys in increasing order, spread evenly so that cards can later be added between any two.
+    """
+    width = 1
+    while _BASE ** width <= count:
+        width += 1
+
+    keys = []
+    for i in range(count):
+        value = (i + 1) * _BASE ** width // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, _BASE)
+            digits.append(DIGITS[digit])
+        # Trailing zeros do not change a fraction, and keys never end with one so that there is always room below.
+        keys.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+
+    return keys
+
+
+def _increment(key):
+    # The shortest key after key: the first digit that can be, bumped up.
+    for i, digit in enumerate(key):
+        if _DIGIT_VALUES[digit] < _BASE - 1:
+            return key[:i] + DIGITS[_DIGIT_VALUES[digit] + 1]
+
+    return key + DIGITS[_BASE // 2]
+
+
+def _decrement(key):
+    # The shortest key before key, without ending in a zero.
+    for i, digit in enumerate(key):
+        if _DIGIT_VALUES[digit] > 1:
+            return key[:i] + DIGITS[_DIGIT_VALUES[digit] - 1]
+
+    return _midpoint("", key)
+
+
+def _midpoint(before, after):
+    if after is not None:
+        # Keep the common prefix, padding before with zeros.
+        n = 0
+        while n < len(after) and (before[n] if n < len(before) else DIGITS[0]) == after[n]:
+            n += 1
+        if n:
+            return after[:n] + _midpoint(before[n:], after[n:])
+
+    low = _DIGIT_VALUES[before[0]] if before else 0
+    high = _DIGIT_VALUES[after[0]] if after is not None else _BASE
+
+    if high - low > 1:
+        return DIGITS[(low + high + 1) // 2]
+    if after is not None and len(after) > 1:
+        return after[0]
+
+    return DIGITS[low] + _midpoint(before[1:], None)
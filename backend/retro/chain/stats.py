@@ -0,0 +1,118 @@
+from retro.chain.node import ColumnHeaderNode, ContentNode
+
+CARDS_KEY = "cards"
+TOTALS_KEY = "totals"
+COLUMNS_KEY = "columns"
+
+
+def empty_stats():
+    return {CARDS_KEY: 0, TOTALS_KEY: {}, COLUMNS_KEY: {}}
+
+
+def card_stats(node, sign=1):
+    """
+    :return: What a card adds to its board's stats, or takes away with sign -1: one card, and the value of each integral
+             field of its content (e.g. votes), to the board and to its column.
+    """
+    content = node.content if isinstance(node.content, dict) else {}
+    totals = {field: sign * int(value) for field, value in content.items() if _integral(value) and value}
+    stats = {CARDS_KEY: sign, TOTALS_KEY: totals, COLUMNS_KEY: {}}
+
+    if node.column_header:
+        stats[COLUMNS_KEY][node.column_header] = {CARDS_KEY: sign, TOTALS_KEY: dict(totals)}
+
+    return stats
+
+
+def column_stats(column_id, removed=False):
+    """
+    :return: The stats of adding an empty column, or of removing one.
+    """
+    return {CARDS_KEY: 0, TOTALS_KEY: {}, COLUMNS_KEY: {column_id: None if removed else {CARDS_KEY: 0, TOTALS_KEY: {}}}}
+
+
+def node_stats(node, sign=1):
+    """
+    :return: The stats of adding a node to its board, or of removing it with sign -1.
+    """
+    if isinstance(node, ContentNode):
+        return card_stats(node, sign)
+    if isinstance(node, ColumnHeaderNode):
+        return column_stats(node.id, removed=sign < 0)
+
+    return empty_stats()
+
+
+def board_stats(nodes):
+    """
+    :return: The stats of a board made of nodes, counted from scratch.
+    """
+    stats = empty_stats()
+    for node in nodes:
+        if isinstance(node, ColumnHeaderNode):
+            stats = add_stats(stats, column_stats(node.id))
+
+    for node in nodes:
+        if isinstance(node, ContentNode):
+            stats = add_stats(stats, card_stats(node))
+
+    return stats
+
+
+def add_stats(stats, delta):
+    """
+    :return: New stats with delta added, leaving both unchanged. A column mapped to None was removed, and stays None
+             whatever is added on top, so that deltas can be added up in any number of steps before being applied.
+    """
+    if delta is None:
+        return stats
+    if stats is None:
+        return delta
+
+    columns = dict(stats[COLUMNS_KEY])
+    for column_id, column_delta in delta[COLUMNS_KEY].items():
+        column = columns.get(column_id)
+
+        if column_delta is None or (column is None and column_id in columns):
+            columns[column_id] = None
+        else:
+            column = column or {CARDS_KEY: 0, TOTALS_KEY: {}}
+            columns[column_id] = {CARDS_KEY: column[CARDS_KEY] + column_delta[CARDS_KEY],
+                                  TOTALS_KEY: _add_totals(column[TOTALS_KEY], column_delta[TOTALS_KEY])}
+
+    return {CARDS_KEY: stats[CARDS_KEY] + delta[CARDS_KEY],
+            TOTALS_KEY: _add_totals(stats[TOTALS_KEY], delta[TOTALS_KEY]),
+            COLUMNS_KEY: columns}
+
+
+def apply_stats(board_node, delta):
+    """
+    Adds delta to the board node's stats. Boards whose stats were never counted keep None, see Board.rebuild_stats.
+    """
+    if board_node.stats is None or delta is None:
+        return
+
+    stats = add_stats(board_node.stats, delta)
+    stats[COLUMNS_KEY] = {column_id: column for column_id, column in stats[COLUMNS_KEY].items() if column is not None}
+    board_node.stats = stats
+
+
+def _add_totals(totals, delta):
+    result = dict(totals)
+
+    for field, value in delta.items():
+        total = result.get(field, 0) + value
+        if total:
+            result[field] = total
+        else:
+            result.pop(field, None)
+
+    return result
+
+
+def _integral(value):
+    # Floats without a fraction (e.g. 2.0) count as well, since the chain scripts cannot tell them from integers.
+    if isinstance(value, float):
+        return value.is_integer()
+
+    return isinstance(value, int) and not isinstance(value, bool)
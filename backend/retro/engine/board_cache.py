@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, List
+
+
+class BoardSnapshot(NamedTuple):
+    board_id: str
+    version: int
+    # JSON encoded nodes, board node first.
+    nodes: List[str]
+
+    @property
+    def size(self):
+        return sum(len(node) for node in self.nodes)
+
+
+class BoardSnapshotCache(object):
+    """
+    LRU cache of serialized boards keyed by board id and version. Only the newest version of a board is kept, since every
+    change bumps the version and older snapshots can never be served again. Least recently used boards are evicted once
+    the cached nodes take up more than max_bytes.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()
+
+    def get(self, board_id, version):
+        with self._lock:
+            snapshot = self._snapshots.get(board_id)
+
+            if snapshot is None or snapshot.version != version:
+                return None
+
+            self._snapshots.move_to_end(board_id)
+
+            return snapshot
+
+    def put(self, snapshot):
+        size = snapshot.size
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            current = self._snapshots.get(snapshot.board_id)
+            if current is not None and current.version > snapshot.version:
+                # A slow reader finished after a newer version was cached.
+                return
+
+            self._remove(snapshot.board_id)
+            self._snapshots[snapshot.board_id] = snapshot
+            self.size += size
+
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._snapshots)))
+
+    def discard(self, board_id):
+        with self._lock:
+            self._remove(board_id)
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def _remove(self, board_id):
+        snapshot = self._snapshots.pop(board_id, None)
+        if snapshot is not None:
+            self.size -= snapshot.size
@@ -5,6 +5,8 @@ from typing import Dict
 
 from retro.chain.board import Board
 from retro.chain.node import BoardNode, Node
+from retro.chain.stats import empty_stats
+from retro.engine.board_cache import BoardSnapshot, BoardSnapshotCache
 from retro.store.exceptions import ExistingNodeError
 from retro.store.store import Store
 from retro.utils import unix_time_millis
@@ -20,6 +22,7 @@ class BoardEngine(object):
         self.config = config
         self.store = store
         self.templates = self._build_templates(self.config.template_config)
+        self.board_cache = BoardSnapshotCache(int(self.config.board_cache_bytes))
 
     def get_templates(self):
         return list(self.templates.values())
@@ -29,7 +32,8 @@ class BoardEngine(object):
             content = {}
 
         template_def = self.templates[template] if template else {'columns': []}
-        board_node = BoardNode(self.store.next_node_id(), content=content)
+        board_node = BoardNode(self.store.next_node_id(), content=content, stats=empty_stats(),
+                               ordering=self.config.board_ordering or None)
 
         # Not a huge fan of setting the time here, but it works for now
         now = unix_time_millis(datetime.now())
@@ -38,25 +42,25 @@ class BoardEngine(object):
         board_node.creator = creator
         self.store.create_board(board_node)
 
-        return self._generate_nodes_from_template(template_def, board_node.id, creator, nodes=[board_node])
+        columns = self._template_columns(template_def)
+        if not columns:
+            return [board_node]
 
-    def _generate_nodes_from_template(self, template_def: dict, board_id: str, creator: str, nodes=None):
-        nodes = nodes or []
+        # The whole template is one transaction, so one version, index update and update message for the board.
+        board = Board(self.store, board_node.id)
+        return board.add_columns(creator, columns)
 
-        def _add_node(_parent_id, content):
-            n = self.add_node(board_id, _parent_id, creator, content=content)
-            nodes.append(n)
-            return n.id
+    @staticmethod
+    def _template_columns(template_def: dict):
+        columns = []
 
         for column_dict in template_def['columns']:
             # Allow users to provide column names as a list of strings if they want to.
             if isinstance(column_dict, str):
                 column_dict = {"name": column_dict}
-            parent_id = _add_node(board_id, {'name': column_dict.get("name")})
-            for node_content in column_dict.get("nodes", []):
-                parent_id = _add_node(parent_id, node_content)
+            columns.append(({'name': column_dict.get("name")}, list(column_dict.get("nodes", []))))
 
-        return nodes
+        return columns
 
     def import_board(self, board_dict, child_dicts, copy=False, force=False):
         def _skip_node_transform(*_args, node):
@@ -72,6 +76,9 @@ class BoardEngine(object):
             transform_func = self._copy_node_and_update_ids
             board_node = transform_func(board_node.id, board_node)
 
+        # Imported stats can't be trusted to match the imported nodes, so the nodes are counted as they are imported.
+        board_node.stats = empty_stats()
+
         # Create the board. This is done outside of the transaction because redis watches the board_node to ensure the
         # transaction can be executed without race conditions.
         if not force and self.has_board(board_node.id):
@@ -89,20 +96,70 @@ class BoardEngine(object):
 
         return board.nodes()
 
+    def get_board_version(self, board_id):
+        return self.store.get_board_version(board_id)
+
+    def get_board_snapshot(self, board_id, version=None):
+        """
+        Returns the board's nodes already JSON encoded. Boards are only read and encoded again once their version has
+        changed.
+
+        :param version: The current board version, if the caller already read it.
+        """
+        if version is None:
+            version = self.get_board_version(board_id)
+
+        snapshot = self.board_cache.get(board_id, version)
+
+        if snapshot is None:
+            nodes = self.get_board(board_id)
+            snapshot = BoardSnapshot(board_id, nodes[0].version, [json.dumps(node.to_dict()) for node in nodes])
+            self.board_cache.put(snapshot)
+
+        return snapshot
+
+    def get_board_changes(self, board_id, since_version):
+        """
+        :return: The nodes changed since since_version, or None if the client has to reload the whole board.
+        """
+        return self.store.get_board_changes(board_id, since_version)
+
     def has_board(self, board_id):
         return self.store.has_board(board_id)
 
+    def get_board_stats(self, board_id):
+        """
+        :return: The board node, whose stats hold the board's card counts and content totals, overall and per column.
+                 Boards created before boards kept stats have None until retro.store.count_board_stats has counted
+                 them.
+        """
+        return self.store.get_node(board_id)
+
+    def transaction_stats(self, board_id=None):
+        return self.store.transaction_stats(board_id)
+
+    def index_stats(self):
+        return self.store.index_stats()
+
     def delete_board(self, board_id):
         self.store.remove_board(board_id)
+        self.board_cache.discard(board_id)
 
         board = Board(self.store, board_id)
 
         return board.delete()
 
-    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None):
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
         return self.store.get_boards(filters=filters, search_terms=search_terms,
                                      start=start, count=count,
-                                     sort_key=sort_key, sort_order=sort_order)
+                                     sort_key=sort_key, sort_order=sort_order, cursor=cursor)
+
+    def search_cards(self, query, count=20, cursor=None):
+        """
+        :return: The most recently updated cards, on any board, containing every word of query.
+        """
+        return self.store.search_cards(query, count=count, cursor=cursor)
 
     def get_node(self, board_id, node_id):
         board = Board(self.store, board_id)
@@ -113,6 +170,14 @@ class BoardEngine(object):
 
         return board.add_node(creator, content or {}, parent_id)
 
+    def add_nodes(self, board_id: str, parent_id: str, creator: str, contents: list):
+        """
+        Adds a node for each of contents under parent_id, in order, in a single transaction.
+        """
+        board = Board(self.store, board_id)
+
+        return board.add_nodes(creator, contents, parent_id)
+
     def move_node(self, board_id, node_id, new_parent_id):
         board = Board(self.store, board_id)
         return board.move_node(node_id, new_parent_id)
@@ -127,9 +192,32 @@ class BoardEngine(object):
         board = Board(self.store, board_id)
         return board.remove_node(node_id, cascade)
 
+    def get_column(self, board_id, column_id, after=None, count=None):
+        """
+        :return: Up to count cards of a board ordered by key, starting after the order key after.
+        """
+        board = Board(self.store, board_id)
+        return board.get_column(column_id, after, count)
+
+    def order_board_by_keys(self, board_id):
+        """
+        Moves a linked board over to order keys. See Board.order_by_keys.
+        """
+        board = Board(self.store, board_id)
+        return board.order_by_keys()
+
     def update_listener(self, message_cb=lambda *x: True):
         self.store.update_listener(message_cb=message_cb)
 
+    def follow_board(self, board_id):
+        return self.store.follow_board(board_id)
+
+    def unfollow_board(self, board_id):
+        self.store.unfollow_board(board_id)
+
+    def get_board_events(self, board_id, after_event_id, until_event_id='+'):
+        return self.store.get_board_events(board_id, after_event_id, until_event_id)
+
     def _build_templates(self, template_config):
         templates = {self._default_template['id']: self._default_template}
 
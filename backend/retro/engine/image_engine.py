@@ -13,8 +13,5 @@ class ImageEngine(object):
         card_reader = CardReader(image_bytes)
         cards = card_reader.get_cards_content()
 
-        nodes = []
-        for card in cards:
-            nodes.append(self.board_engine.add_node(board_id, parent_id, creator, content=card))
-
-        return nodes
+        # One transaction for the whole photo, with the cards in the order they were read.
+        return self.board_engine.add_nodes(board_id, parent_id, creator, cards)
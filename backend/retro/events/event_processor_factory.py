@@ -48,6 +48,8 @@ class ExpiredLockProcessor(EventProcessorBase):
         # NodeUnlockMessage using the data inside the redis event, which in this case will be the NODELOCK key that was
         # deleted.
         node_id = self.event['data'].partition('NODELOCK.')[2]
+        # Clustered stores hash tag the board id in lock keys ("NODELOCK.{board_id}|node"). Node ids never contain braces.
+        node_id = node_id.replace('{', '').replace('}', '')
         if node_id:
             # If the node_id does not contain a '|', that means it's either a board id or just bad data. We don't have
             # board locking implemented in the UI, but if we ever wanted it, this code should just work. The split won't
@@ -68,4 +70,8 @@ class BoardUpdateProcessor(EventProcessorBase):
         # Decode the previously serialized WebsocketMessage from event['data'] and pass it to the message_cb to be
         # emitted.
         board_id = self.event['channel'].partition('|')[2]
-        return self.message_cb(WebsocketMessage.decode(self.event['data']), board_id)
+        message = WebsocketMessage.decode(self.event['data'])
+        # Events read from a board's event stream carry the stream entry id, which clients can resubscribe from.
+        message.event_id = self.event.get('id')
+
+        return self.message_cb(message, board_id)
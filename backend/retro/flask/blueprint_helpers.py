@@ -1,6 +1,7 @@
 import datetime
 import decimal
 import json
+import uuid
 from flask import make_response
 from retro.utils import timedelta_total_seconds, unix_time_millis
 
@@ -18,14 +19,44 @@ def default_encoder(obj):
     raise TypeError(repr(obj) + " is not JSON serializable")
 
 
+class RawJSON(object):
+    """
+    Text that is already JSON, e.g. a cached node, which dumps_json writes out as it is instead of encoding it again.
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def dumps_json(data, *args, **kwargs):
+    """
+    json.dumps with default_encoder, which also writes out every RawJSON in data as it is.
+    """
+    default = kwargs.pop("default", default_encoder)
+    # Each RawJSON is encoded as a string no other value can contain, which is then swapped for its text.
+    marker = uuid.uuid4().hex
+    raws = []
+
+    def encode(obj):
+        if isinstance(obj, RawJSON):
+            raws.append(obj.text)
+            return "%s%s" % (marker, len(raws) - 1)
+        return default(obj)
+
+    text = json.dumps(data, *args, default=encode, **kwargs)
+    for i, raw in enumerate(raws):
+        text = text.replace('"%s%s"' % (marker, i), raw, 1)
+
+    return text
+
+
 # wrapper around the flask make_response method that includes encoding to json
 def make_response_json(data, *args, **kwargs):
     if not data:
         response = make_response_empty()
     else:
-        json_kwargs = {"default": default_encoder}
-        json_kwargs.update(kwargs)
-        response = make_response(json.dumps(data, *args, **json_kwargs))
+        response = make_response(dumps_json(data, *args, **kwargs))
     response.headers['Content-Type'] = "application/json; charset=utf-8"
     return response
 
@@ -1,16 +1,23 @@
 import base64
 
 import flask
-import json
 import logging
 from flask import Blueprint, make_response, request, Response
+from retro.chain.exceptions import UnsupportedMoveError
 from retro.chain.operations import OperationFactory
 from retro.engine.image_engine import ImageEngine
-from retro.index.exceptions import InvalidSortOrder
-from retro.store.exceptions import NodeLockedError, UnlockFailureError, NodeNotFoundError, ExistingNodeError
-from .blueprint_helpers import make_response_json
+from retro.index.cursor import next_cursor
+from retro.index.exceptions import InvalidCursor, InvalidSortOrder, SearchTimeoutError
+from retro.index.search import CARD_SORT_KEY
+from retro.store.exceptions import NodeLockedError, UnlockFailureError, NodeNotFoundError, ExistingNodeError, \
+    TransactionTimeoutError
+from .blueprint_helpers import RawJSON, dumps_json, make_response_json, make_response_empty
 
 _logger = logging.getLogger(__name__)
+# Card searches return at most this many cards per page, so a page is always cheap to find.
+MAX_CARD_SEARCH_COUNT = 100
+# Nodes added by one batch request, which is a single transaction.
+MAX_BATCH_NODES = 500
 
 
 def build_blueprint(board_engine):
@@ -23,6 +30,11 @@ def build_blueprint(board_engine):
         _logger.exception("Unhandled exception from retro API request.")
         return "Unhandled exception. Check logs for details", 500
 
+    @blueprint.errorhandler(TransactionTimeoutError)
+    def _transaction_timeout(tte):
+        _logger.warning(tte)
+        return "Board is too busy, try again later.", 503
+
     @blueprint.before_request
     def init_request():
         flask.g.user_id = request.headers.get('X-Saml-Subject')
@@ -31,6 +43,14 @@ def build_blueprint(board_engine):
     def healthcheck():
         return make_response("Success", 200)
 
+    @blueprint.route("/api/v1/metrics/transactions", methods=["GET"])
+    def transaction_metrics():
+        return make_response_json(board_engine.transaction_stats(request.args.get("board_id")))
+
+    @blueprint.route("/api/v1/metrics/index", methods=["GET"])
+    def index_metrics():
+        return make_response_json(board_engine.index_stats())
+
     @blueprint.route("/api/v1/auth", methods=["GET"])
     def auth():
         return make_response_json({"username": flask.g.user_id})
@@ -42,6 +62,7 @@ def build_blueprint(board_engine):
             count = int(request.args.get("count", 20))
             sort_key = request.args.get("sort_key")
             sort_order = request.args.get("sort_order")
+            cursor = request.args.get("cursor")
             filters = {}
             search_terms = {}
 
@@ -52,22 +73,97 @@ def build_blueprint(board_engine):
                     search_terms[k[7:]] = v
 
             boards = board_engine.get_boards(filters=filters or None, search_terms=search_terms or None,
-                                             start=start, count=count, sort_key=sort_key, sort_order=sort_order)
-            response = make_response_json({"boards": boards})
+                                             start=start, count=count, sort_key=sort_key, sort_order=sort_order,
+                                             cursor=cursor)
+            # Pass next back as the cursor parameter, with the same filters and sort, to get the following page.
+            response = make_response_json({"boards": boards, "next": next_cursor(boards, count, sort_key)})
         except InvalidSortOrder as iso:
             _logger.exception(iso)
             response = make_response("Provided sort order '%s' is invalid." % request.args.get("sort_order"), 400)
+        except InvalidCursor as ic:
+            _logger.exception(ic)
+            response = make_response("Provided cursor '%s' is invalid." % request.args.get("cursor"), 400)
+        except SearchTimeoutError as ste:
+            _logger.warning(ste)
+            response = make_response("Search took too long. Try more specific search terms.", 503)
+        except (ValueError, TypeError) as ver:
+            _logger.exception(ver)
+            response = make_response("Invalid request parameters.", 400)
+
+        return response
+
+    @blueprint.route("/api/v1/cards", methods=["GET"])
+    def search_cards():
+        try:
+            query = request.args.get("q", "")
+            count = min(int(request.args.get("count", 20)), MAX_CARD_SEARCH_COUNT)
+            cursor = request.args.get("cursor")
+
+            cards = board_engine.search_cards(query, count=count, cursor=cursor)
+            response = make_response_json({"cards": cards, "next": next_cursor(cards, count, CARD_SORT_KEY)})
+        except InvalidCursor as ic:
+            _logger.exception(ic)
+            response = make_response("Provided cursor '%s' is invalid." % request.args.get("cursor"), 400)
+        except SearchTimeoutError as ste:
+            _logger.warning(ste)
+            response = make_response("Search took too long. Try more specific search terms.", 503)
         except (ValueError, TypeError) as ver:
             _logger.exception(ver)
             response = make_response("Invalid request parameters.", 400)
 
         return response
 
+    def _not_modified(version):
+        # Boards are tagged with their version, so a client that already has the current version gets a 304.
+        if request.if_none_match.contains(str(version)):
+            response = make_response_empty(304)
+            response.set_etag(str(version))
+            return response
+
+        return None
+
     @blueprint.route("/api/v1/boards/<board_id>", methods=["GET"])
     def get_board(board_id):
-        board_nodes = board_engine.get_board(board_id)
+        version = board_engine.get_board_version(board_id)
+        response = _not_modified(version)
+
+        if response is None:
+            since_version = request.args.get("since_version", type=int)
+            changes = board_engine.get_board_changes(board_id, since_version) if since_version is not None else None
+
+            if changes is not None:
+                response = make_response_json({"version": changes.version,
+                                               "full": False,
+                                               "nodes": [node.to_dict() for node in changes.updates],
+                                               "deleted": changes.deletes})
+                response.set_etag(str(changes.version))
+            else:
+                # Without since_version, or when it is too old for the change log, the client gets the whole board.
+                snapshot = board_engine.get_board_snapshot(board_id, version)
+                # The nodes are cached as JSON already, so they are written out as they are.
+                nodes = RawJSON("[%s]" % ", ".join(snapshot.nodes))
+                body = {"nodes": nodes}
+                if since_version is not None:
+                    body = {"version": snapshot.version, "full": True, "nodes": nodes, "deleted": []}
 
-        return make_response_json({"nodes": [node.to_dict() for node in board_nodes]})
+                response = make_response_json(body)
+                response.set_etag(str(snapshot.version))
+
+        return response
+
+    @blueprint.route("/api/v1/boards/<board_id>/stats", methods=["GET"])
+    def get_board_stats(board_id):
+        board_node = board_engine.get_board_stats(board_id)
+        if board_node.stats is None:
+            return make_response("Stats of board '%s' have not been counted yet." % board_id, 404)
+
+        response = _not_modified(board_node.version)
+
+        if response is None:
+            response = make_response_json(dict(board_node.stats, version=board_node.version))
+            response.set_etag(str(board_node.version))
+
+        return response
 
     @blueprint.route("/api/v1/boards", methods=["POST"])
     def create_board():
@@ -139,14 +235,21 @@ def build_blueprint(board_engine):
         }
         """
         filename = request.args.get("filename", board_id)
-        board_nodes = board_engine.get_board(board_id)
-        board_node = board_nodes.pop(0)
+        version = board_engine.get_board_version(board_id)
+        response = _not_modified(version)
+
+        if response is None:
+            snapshot = board_engine.get_board_snapshot(board_id, version)
+            board_node, child_nodes = snapshot.nodes[0], snapshot.nodes[1:]
+
+            response = Response(dumps_json({board_id: {"board_node": RawJSON(board_node),
+                                                       "child_nodes": RawJSON("[%s]" % ", ".join(child_nodes))}}),
+                                mimetype="application/json")
+            response.set_etag(str(snapshot.version))
 
-        return Response(json.dumps({
-            board_id: {"board_node": board_node.to_dict(),
-                       "child_nodes": [node.to_dict() for node in board_nodes]}}),
-            mimetype="application/json",
-            headers={"Content-Disposition": "attachment;filename=%s" % filename})
+        response.headers["Content-Disposition"] = "attachment;filename=%s" % filename
+
+        return response
 
     @blueprint.route("/api/v1/boards/<board_id>/nodes", methods=["POST"])
     def create_node(board_id):
@@ -162,12 +265,45 @@ def build_blueprint(board_engine):
 
         return make_response_json(node.to_dict())
 
+    @blueprint.route("/api/v1/boards/<board_id>/nodes:batch", methods=["POST"])
+    def create_nodes(board_id):
+        args = request.json or {}
+
+        parent_id = args.get("parent_id")
+        contents = args.get("contents")
+
+        if not parent_id:
+            return make_response("No parent_id provided in request!", 400)
+        if not isinstance(contents, list) or not all(isinstance(content, dict) for content in contents):
+            return make_response("contents must be a list of node contents!", 400)
+        if len(contents) > MAX_BATCH_NODES:
+            return make_response("At most %s nodes can be added at once!" % MAX_BATCH_NODES, 400)
+
+        nodes = board_engine.add_nodes(board_id, parent_id, flask.g.user_id, contents)
+
+        return make_response_json({"nodes": [node.to_dict() for node in nodes]})
+
     @blueprint.route("/api/v1/boards/<board_id>/nodes/<node_id>", methods=["GET"])
     def get_node(board_id, node_id):
         node = board_engine.get_node(board_id, node_id)
 
         return make_response_json(node.to_dict())
 
+    @blueprint.route("/api/v1/boards/<board_id>/columns/<column_id>/nodes", methods=["GET"])
+    def get_column(board_id, column_id):
+        try:
+            after = request.args.get("after")
+            count = int(request.args["count"]) if "count" in request.args else None
+        except ValueError as ver:
+            _logger.exception(ver)
+            return make_response("Invalid request parameters.", 400)
+
+        # Cards of boards ordered by key only. Pass next back as after to get the following cards.
+        nodes = board_engine.get_column(board_id, column_id, after, count)
+        next_after = nodes[-1].order if nodes and count and len(nodes) == count else None
+
+        return make_response_json({"nodes": [node.to_dict() for node in nodes], "next": next_after})
+
     @blueprint.route("/api/v1/boards/<board_id>/nodes/<node_id>", methods=["PUT"])
     def update_node(board_id, node_id):
         return _update_node(board_id, node_id, request.json or {})
@@ -208,6 +344,9 @@ def build_blueprint(board_engine):
         except NodeNotFoundError as nnf:
             _logger.exception(nnf)
             return make_response("Node with id '%s' does not exist!" % node_id, 400)
+        except UnsupportedMoveError as ume:
+            _logger.warning(ume)
+            return make_response(str(ume), 400)
 
     @blueprint.route("/api/v1/boards/<board_id>/nodes/<node_id>", methods=["DELETE"])
     def delete_node(board_id, node_id):
@@ -1,3 +1,4 @@
-
 class Index:
-    pass
+    def stats(self):
+        # Counters for indices that keep any.
+        return {}
@@ -0,0 +1,35 @@
+"""
+Adds search tokens to the boards indexed before board search used them. Searches match boards without tokens with
+regular expressions that scan every one of them, so run this once when upgrading, after the servers have been switched
+to the new version. Servers write tokens for every board they index, so boards created or edited meanwhile already have
+them and are skipped.
+
+    python -m retro.index.build_search_tokens
+
+The index is configured from the same MONGO_HOST and MONGO_PORT environment variables as the servers.
+"""
+import argparse
+import logging
+import sys
+from retro.index.mongo_index import MongoIndex
+from retro.utils.config import Config
+from retro.utils.retro_logging import setup_basic_logging
+
+_logger = logging.getLogger(__name__)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Add search tokens to boards indexed without them.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    setup_basic_logging()
+    cfg = Config.from_env()
+    index = MongoIndex(host=cfg.mongo_host, port=int(cfg.mongo_port))
+    index.create_indices()
+
+    _logger.info("Added search tokens to %s boards.", index.build_search_tokens(batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+from retro.chain.node import CREATE_TIME_KEY, NODE_ID_KEY
+from .exceptions import InvalidCursor
+from .search import RELEVANCE_SORT_KEY, field_value
+
+DEFAULT_SORT_KEY = CREATE_TIME_KEY
+
+
+def next_cursor(boards, count, sort_key=None):
+    """
+    :return: The cursor of the page after boards, or None if boards is the last page. Searches sorted by relevance
+             have no cursors, and are paged with start.
+    """
+    if not boards or len(boards) < count or sort_key == RELEVANCE_SORT_KEY:
+        return None
+
+    sort_key = sort_key or DEFAULT_SORT_KEY
+    payload = json.dumps([sort_key, field_value(boards[-1], sort_key), boards[-1][NODE_ID_KEY]], separators=(",", ":"))
+
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort_key=None):
+    """
+    :return: The sort value and id of the last board on the previous page.
+    """
+    try:
+        cursor_sort_key, value, board_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError) as err:
+        raise InvalidCursor("Cursor '%s' is not valid." % cursor) from err
+
+    if cursor_sort_key != (sort_key or DEFAULT_SORT_KEY):
+        raise InvalidCursor("Cursor '%s' was issued for sort key '%s'." % (cursor, cursor_sort_key))
+
+    return value, board_id
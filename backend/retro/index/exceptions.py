@@ -1,2 +1,10 @@
 class InvalidSortOrder(Exception):
     pass
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class SearchTimeoutError(Exception):
+    pass
@@ -0,0 +1,164 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from retro.index import Index
+
+
+class BloomFilter(object):
+    """
+    A set that can answer "definitely not in it" without storing its members. Members can't be removed.
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def _positions(self, key):
+        # Double hashing: every position is derived from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+
+class BoardExistenceCache(Index):
+    """
+    Wraps an index so has_board rarely reaches it. Once loaded, a Bloom filter of every board id answers "no" for ids
+    that were never boards, and an LRU remembers the answer for ids checked or seen recently.
+
+    Boards created and removed through this cache update it directly. Other processes' boards must be reported through
+    board_seen and board_removed (see RedisStore.board_existence_listener), or the filter would deny them. Until load is
+    called, and after reset, every miss goes to the index.
+    """
+    def __init__(self, index, max_size=100000, error_rate=0.001):
+        super(BoardExistenceCache, self).__init__()
+        self.index = index
+        self.max_size = max_size
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._known = OrderedDict()
+        self._stats = {"hits": 0, "bloom_rejections": 0, "misses": 0}
+
+    def load(self):
+        """
+        Fills the Bloom filter with every board in the index. Start reporting boards before calling this, so boards
+        created while it runs are not missed.
+        """
+        board_ids = list(self.index.get_board_ids())
+        # Leave room to grow before the error rate degrades. A reload sizes it again.
+        bloom = BloomFilter(max(len(board_ids) * 2, 1024), self.error_rate)
+        for board_id in board_ids:
+            bloom.add(board_id)
+
+        with self._lock:
+            # Boards reported while loading were added to the LRU, and must not be denied by the new filter.
+            for board_id, exists in self._known.items():
+                if exists:
+                    bloom.add(board_id)
+
+            self._bloom = bloom
+
+    def reset(self):
+        """
+        Forgets everything, for when board events may have been missed. has_board asks the index until load is called.
+        """
+        with self._lock:
+            self._bloom = None
+            self._known.clear()
+
+    def board_seen(self, board_id):
+        with self._lock:
+            if self._bloom is not None and self._known.get(board_id) is not True:
+                self._bloom.add(board_id)
+
+            self._remember(board_id, True)
+
+    def board_removed(self, board_id):
+        with self._lock:
+            self._remember(board_id, False)
+
+    def has_board(self, board_id):
+        with self._lock:
+            exists = self._known.get(board_id)
+
+            if exists is not None:
+                self._known.move_to_end(board_id)
+                self._stats["hits"] += 1
+                return exists
+
+            if self._bloom is not None and board_id not in self._bloom:
+                self._stats["bloom_rejections"] += 1
+                return False
+
+            self._stats["misses"] += 1
+
+        exists = self.index.has_board(board_id)
+
+        with self._lock:
+            # An event may have answered meanwhile, and is more recent than the index.
+            if board_id not in self._known:
+                self._remember(board_id, exists)
+
+        return exists
+
+    def create_indices(self):
+        self.index.create_indices()
+
+    def drop_indices(self):
+        self.index.drop_indices()
+
+    def get_boards(self, *args, **kwargs):
+        return self.index.get_boards(*args, **kwargs)
+
+    def get_board_ids(self):
+        return self.index.get_board_ids()
+
+    def search_cards(self, *args, **kwargs):
+        return self.index.search_cards(*args, **kwargs)
+
+    def create_board(self, board_node):
+        self.index.create_board(board_node)
+        self.board_seen(board_node.id)
+
+    def update_board(self, board_node):
+        self.index.update_board(board_node)
+
+    def update_boards(self, board_nodes):
+        self.index.update_boards(board_nodes)
+
+    def update_cards(self, board_id, card_nodes, removed_card_ids=()):
+        self.index.update_cards(board_id, card_nodes, removed_card_ids)
+
+    def remove_board(self, board_id):
+        self.index.remove_board(board_id)
+        self.board_removed(board_id)
+
+    def remove_all_boards(self):
+        self.index.remove_all_boards()
+        self.reset()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.index.stats(), existence_cache=dict(
+                self._stats, known=len(self._known), loaded=self._bloom is not None,
+                bloom_boards=self._bloom.count if self._bloom is not None else 0))
+
+    def _remember(self, board_id, exists):
+        self._known[board_id] = exists
+        self._known.move_to_end(board_id)
+
+        while len(self._known) > self.max_size:
+            self._known.popitem(last=False)
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from retro.index import Index
+
+_logger = logging.getLogger(__name__)
+
+
+class IndexWriter(Index):
+    """
+    Wraps an index so board updates are written behind the request. Updates are held per board for flush_interval
+    seconds, so a burst of edits to one board becomes a single write, and every board due is written with one
+    update_boards call. Card changes are held per board the same way, and the latest change of each card is written.
+
+    Creating and removing boards still goes straight to the index. Removing a board drops its pending update and waits
+    for a flush in progress, so the board cannot be written back after it is gone.
+    """
+    def __init__(self, index, flush_interval=0.05):
+        super(IndexWriter, self).__init__()
+        self.index = index
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        # Board id -> (latest board node, monotonic time of the oldest update it replaces).
+        self._pending = {}
+        # Board id -> ({card id -> latest card node, None once removed}, monotonic time of the oldest change).
+        self._pending_cards = {}
+        self._closed = False
+        self._stats = {"updates": 0, "coalesced": 0, "card_updates": 0, "flushes": 0, "flushed": 0, "cards_flushed": 0,
+                       "errors": 0, "last_flush_ms": 0.0}
+
+        self._thread = threading.Thread(target=self._run, name="IndexWriter", daemon=True)
+        self._thread.start()
+
+    def create_indices(self):
+        self.index.create_indices()
+
+    def drop_indices(self):
+        self.index.drop_indices()
+
+    def has_board(self, board_id):
+        return self.index.has_board(board_id)
+
+    def get_boards(self, *args, **kwargs):
+        return self.index.get_boards(*args, **kwargs)
+
+    def get_board_ids(self):
+        return self.index.get_board_ids()
+
+    def search_cards(self, *args, **kwargs):
+        return self.index.search_cards(*args, **kwargs)
+
+    def create_board(self, board_node):
+        self.index.create_board(board_node)
+
+    def update_board(self, board_node):
+        with self._cond:
+            closed = self._closed
+
+            if not closed:
+                pending = self._pending.get(board_node.id)
+                self._pending[board_node.id] = (board_node, pending[1] if pending else time.monotonic())
+                self._stats["updates"] += 1
+                if pending:
+                    self._stats["coalesced"] += 1
+
+                self._cond.notify()
+
+        if closed:
+            # Nothing flushes after close, so late updates are written directly, replacing any older pending one.
+            with self._flush_lock:
+                with self._cond:
+                    self._pending.pop(board_node.id, None)
+
+                self.index.update_board(board_node)
+
+    def update_cards(self, board_id, card_nodes, removed_card_ids=()):
+        with self._cond:
+            pending = self._pending_cards.pop(board_id, None)
+            cards = pending[0] if pending else {}
+            cards.update((card_id, None) for card_id in removed_card_ids)
+            cards.update((card_node.id, card_node) for card_node in card_nodes)
+
+            closed = self._closed
+            if not closed:
+                self._pending_cards[board_id] = (cards, pending[1] if pending else time.monotonic())
+                self._stats["card_updates"] += 1
+                self._cond.notify()
+
+        if closed:
+            # Any older change still pending was taken along, so it can't overwrite this one later.
+            with self._flush_lock:
+                self._write_cards(board_id, cards)
+
+    def remove_board(self, board_id):
+        with self._flush_lock:
+            with self._cond:
+                self._pending.pop(board_id, None)
+                self._pending_cards.pop(board_id, None)
+
+            self.index.remove_board(board_id)
+
+    def remove_all_boards(self):
+        with self._flush_lock:
+            with self._cond:
+                self._pending.clear()
+                self._pending_cards.clear()
+
+            self.index.remove_all_boards()
+
+    def stats(self):
+        with self._cond:
+            oldest = self._oldest()
+
+            return dict(self.index.stats(), **self._stats, queue_size=len(self._pending),
+                        card_queue_size=sum(len(cards) for cards, _ in self._pending_cards.values()),
+                        lag_ms=(time.monotonic() - oldest) * 1000 if oldest is not None else 0.0)
+
+    def flush(self):
+        """
+        Writes every pending update now.
+
+        :return: False if the index failed the write. The updates stay pending.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                card_batch, self._pending_cards = self._pending_cards, {}
+
+            if not batch and not card_batch:
+                return True
+
+            start = time.monotonic()
+            failed = False
+            if batch:
+                try:
+                    self.index.update_boards([board_node for board_node, _ in batch.values()])
+                except Exception:
+                    _logger.exception("Error writing %s board(s) to the index. Will retry.", len(batch))
+                    failed = True
+
+                    with self._cond:
+                        # Updates queued meanwhile are newer, but keep the time of the failed one so the lag shows.
+                        for board_id, (board_node, queued) in batch.items():
+                            newer = self._pending.get(board_id)
+                            self._pending[board_id] = (newer[0], queued) if newer else (board_node, queued)
+
+            written_cards = 0
+            for board_id, (cards, queued) in card_batch.items():
+                if not failed:
+                    try:
+                        self._write_cards(board_id, cards)
+                        written_cards += len(cards)
+                        continue
+                    except Exception:
+                        _logger.exception("Error writing cards of board '%s' to the index. Will retry.", board_id)
+                        failed = True
+
+                # Once the index failed, the remaining boards' cards wait for the next flush too.
+                with self._cond:
+                    newer = self._pending_cards.get(board_id)
+                    if newer:
+                        cards.update(newer[0])
+                    self._pending_cards[board_id] = (cards, queued)
+
+            with self._cond:
+                self._stats["cards_flushed"] += written_cards
+                if failed:
+                    self._stats["errors"] += 1
+                    return False
+
+                self._stats["flushes"] += 1
+                self._stats["flushed"] += len(batch)
+                self._stats["last_flush_ms"] = (time.monotonic() - start) * 1000
+
+            return True
+
+    def close(self):
+        """
+        Stops the background writer once everything pending has been flushed.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        # A flush that failed during shutdown leaves its updates pending, so give them one last try.
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._pending_cards and not self._closed:
+                    self._cond.wait()
+
+                if self._closed:
+                    break
+
+                oldest = self._oldest()
+                delay = oldest + self.flush_interval - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+            if not self.flush():
+                # Don't hammer an index that is down.
+                time.sleep(self.flush_interval)
+
+        self.flush()
+
+    def _oldest(self):
+        # Called with _cond held.
+        return min([queued for _, queued in self._pending.values()] +
+                   [queued for _, queued in self._pending_cards.values()], default=None)
+
+    def _write_cards(self, board_id, cards):
+        self.index.update_cards(board_id, [card_node for card_node in cards.values() if card_node is not None],
+                                [card_id for card_id, card_node in cards.items() if card_node is None])
@@ -0,0 +1,277 @@
+import bisect
+import copy
+import heapq
+import re
+import threading
+from retro.chain.node import CREATOR_KEY, LAST_UPDATE_TIME_KEY
+from retro.index import Index
+from .cursor import DEFAULT_SORT_KEY, decode_cursor
+from .exceptions import InvalidCursor, InvalidSortOrder
+from .mongo_index import SORT_KEYS
+from .search import CARD_SORT_KEY, RELEVANCE_SORT_KEY, SEARCH_FIELDS, board_tokens, card_result, card_text, \
+    card_words, field_value, query_tokens, query_words
+
+_SORT_ORDERS = {"asc": 1, "desc": -1}
+# Fields kept sorted. Listings sorted by any other field sort every matching board.
+SORTED_FIELDS = SORT_KEYS + (CREATOR_KEY,)
+
+
+def sort_tuple(value):
+    """
+    Orders values the way MongoIndex listings do: missing and null values first, then numbers, strings, objects,
+    arrays and booleans. Strings compare ignoring case first, then with lower case before upper case.
+    """
+    if value is None:
+        return 0,
+    if isinstance(value, bool):
+        return 5, value
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value.casefold(), value.swapcase()
+
+    return 3 if isinstance(value, dict) else 4, repr(value)
+
+
+class MemIndex(Index):
+    """
+    Keeps the board index in memory. Boards are kept sorted by each of SORTED_FIELDS, and an inverted index maps the
+    search tokens of MongoIndex to the boards that have them, so listings, paging and searches behave like MongoIndex
+    without scanning every board. Card text is indexed the same way, by word.
+    """
+    def __init__(self):
+        super(MemIndex, self).__init__()
+        self._lock = threading.RLock()
+        self._boards = {}
+        # Field -> sorted list of (sort_tuple(value), board id).
+        self._sorted = {field: [] for field in SORTED_FIELDS}
+        self._tokens = {}
+        self._inverted = {}
+        # Card id -> (board id, last update time, text, words), word -> card ids, and board id -> card ids.
+        self._cards = {}
+        self._card_inverted = {}
+        self._board_cards = {}
+
+    def create_indices(self):
+        pass
+
+    def drop_indices(self):
+        pass
+
+    def has_board(self, board_id):
+        return board_id in self._boards
+
+    def get_board_ids(self):
+        with self._lock:
+            return list(self._boards)
+
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
+        q_sort_key = sort_key or DEFAULT_SORT_KEY
+        q_sort_order = self._coerce_sort_order(sort_order or "asc")
+        q_search_terms = {k: re.compile(v, re.IGNORECASE) for k, v in (search_terms or {}).items()
+                          if k not in SEARCH_FIELDS}
+        required_tokens, scored_tokens = query_tokens({k: v for k, v in (search_terms or {}).items()
+                                                       if k in SEARCH_FIELDS})
+
+        def matches(board):
+            return (all(self._equals(field_value(board, k), v) for k, v in (filters or {}).items()) and
+                    all(isinstance(field_value(board, k), str) and pattern.search(field_value(board, k))
+                        for k, pattern in q_search_terms.items()))
+
+        with self._lock:
+            candidates = self._candidates(required_tokens)
+
+            if q_sort_key == RELEVANCE_SORT_KEY:
+                if cursor is not None:
+                    raise InvalidCursor("Searches sorted by relevance are paged with start, not cursors.")
+
+                ordered = self._by_relevance(candidates, scored_tokens)
+            else:
+                ordered = self._ordered(q_sort_key, q_sort_order, candidates, cursor)
+
+            boards = []
+            for board_id in ordered:
+                board = self._boards[board_id]
+
+                if (candidates is None or board_id in candidates) and matches(board):
+                    if start:
+                        start -= 1
+                        continue
+
+                    boards.append(copy.deepcopy(board))
+                    if len(boards) == count:
+                        break
+
+            return boards
+
+    def create_board(self, board_node):
+        self.update_board(board_node)
+
+    def update_board(self, board_node):
+        document = board_node.to_index_dict()
+
+        with self._lock:
+            self._remove(board_node.id)
+            self._boards[board_node.id] = document
+
+            for field, entries in self._sorted.items():
+                bisect.insort(entries, (sort_tuple(field_value(document, field)), board_node.id))
+
+            tokens = self._tokens[board_node.id] = set(board_tokens(document))
+            for token in tokens:
+                self._inverted.setdefault(token, set()).add(board_node.id)
+
+    def update_boards(self, board_nodes):
+        for board_node in board_nodes:
+            self.update_board(board_node)
+
+    def remove_board(self, board_id):
+        with self._lock:
+            self._remove(board_id)
+
+            for card_id in list(self._board_cards.get(board_id, ())):
+                self._remove_card(card_id)
+
+    def remove_all_boards(self):
+        with self._lock:
+            self._boards.clear()
+            self._tokens.clear()
+            self._inverted.clear()
+            self._cards.clear()
+            self._card_inverted.clear()
+            self._board_cards.clear()
+            for entries in self._sorted.values():
+                del entries[:]
+
+    def update_cards(self, board_id, card_nodes, removed_card_ids=()):
+        with self._lock:
+            for card_id in removed_card_ids:
+                self._remove_card(card_id)
+
+            for card_node in card_nodes:
+                self._remove_card(card_node.id)
+
+                text = card_text(card_node)
+                if not text:
+                    continue
+
+                words = card_words(text)
+                self._cards[card_node.id] = (board_id, card_node.last_update_time, text, words)
+                self._board_cards.setdefault(board_id, set()).add(card_node.id)
+                for word in words:
+                    self._card_inverted.setdefault(word, set()).add(card_node.id)
+
+    def search_cards(self, query, count=20, cursor=None):
+        words = query_words(query)
+        if not words:
+            return []
+
+        with self._lock:
+            card_ids = set.intersection(*sorted((self._card_inverted.get(word, set()) for word in words), key=len))
+
+            def sort_key(card_id):
+                return sort_tuple(self._cards[card_id][1]), card_id
+
+            if cursor is not None:
+                value, last_id = decode_cursor(cursor, CARD_SORT_KEY)
+                after = sort_tuple(value), last_id
+                card_ids = (card_id for card_id in card_ids if sort_key(card_id) < after)
+
+            # Most recent first, ties broken by id, as in MongoIndex.
+            page = heapq.nlargest(count, card_ids, key=sort_key)
+
+            return [card_result(self._cards[card_id][0], card_id, self._cards[card_id][1], self._cards[card_id][2],
+                                words) for card_id in page]
+
+    def _remove_card(self, card_id):
+        card = self._cards.pop(card_id, None)
+        if card is None:
+            return
+
+        board_id, _, _, words = card
+        self._board_cards[board_id].discard(card_id)
+        if not self._board_cards[board_id]:
+            del self._board_cards[board_id]
+
+        for word in words:
+            card_ids = self._card_inverted[word]
+            card_ids.discard(card_id)
+            if not card_ids:
+                del self._card_inverted[word]
+
+    def _remove(self, board_id):
+        document = self._boards.pop(board_id, None)
+        if document is None:
+            return
+
+        for field, entries in self._sorted.items():
+            entry = (sort_tuple(field_value(document, field)), board_id)
+            del entries[bisect.bisect_left(entries, entry)]
+
+        for token in self._tokens.pop(board_id):
+            boards = self._inverted[token]
+            boards.discard(board_id)
+            if not boards:
+                del self._inverted[token]
+
+    def _candidates(self, required_tokens):
+        """
+        :return: The ids of the boards having every token, or None to consider every board.
+        """
+        if not required_tokens:
+            return None
+
+        # Intersect starting from the rarest token.
+        postings = sorted((self._inverted.get(token, set()) for token in set(required_tokens)), key=len)
+
+        return set.intersection(*postings)
+
+    def _ordered(self, sort_key, sort_order, candidates, cursor):
+        """
+        :return: Board ids in listing order, starting after the cursor.
+        """
+        if sort_key in self._sorted and (candidates is None or len(candidates) * 8 > len(self._boards)):
+            entries = self._sorted[sort_key]
+        else:
+            # A few search results, or an unusual sort key, are cheaper to sort on their own.
+            board_ids = self._boards if candidates is None else candidates
+            entries = sorted((sort_tuple(field_value(self._boards[board_id], sort_key)), board_id)
+                             for board_id in board_ids)
+
+        first, last = 0, len(entries)
+        if cursor is not None:
+            value, board_id = decode_cursor(cursor, sort_key)
+            if sort_order == 1:
+                first = bisect.bisect_right(entries, (sort_tuple(value), board_id))
+            else:
+                last = bisect.bisect_left(entries, (sort_tuple(value), board_id))
+
+        # Ties are broken by id in the same direction, as in MongoIndex.
+        indices = range(first, last) if sort_order == 1 else range(last - 1, first - 1, -1)
+
+        return (entries[i][1] for i in indices)
+
+    def _by_relevance(self, candidates, scored_tokens):
+        board_ids = sorted(self._boards if candidates is None else candidates)
+        # Stable sorts, so boards scoring the same and updated at the same time stay ordered by id.
+        board_ids.sort(key=lambda board_id: (len(self._tokens[board_id].intersection(scored_tokens)),
+                                             sort_tuple(self._boards[board_id].get(LAST_UPDATE_TIME_KEY))),
+                       reverse=True)
+
+        return board_ids
+
+    @staticmethod
+    def _equals(value, expected):
+        # Like a Mongo equality filter, an array matches when any of its elements does.
+        return value == expected or (isinstance(value, list) and expected in value)
+
+    @staticmethod
+    def _coerce_sort_order(sort_order):
+        if sort_order in (1, -1):
+            return sort_order
+
+        try:
+            return _SORT_ORDERS[sort_order.lower()]
+        except Exception:
+            raise InvalidSortOrder(f"Sort order '{sort_order}' is not valid. Must be one of {_SORT_ORDERS.keys()}.")
@@ -1,47 +1,149 @@
 import locale
 import re
-from pymongo import collation, MongoClient, ASCENDING, DESCENDING
-from retro.chain.node import CREATE_TIME_KEY, NODE_ID_KEY
+from pymongo import collation, DeleteMany, DeleteOne, MongoClient, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import ExecutionTimeout
+from retro.chain.node import CREATE_TIME_KEY, LAST_UPDATE_TIME_KEY, NODE_ID_KEY
 from retro.index import Index
-from .exceptions import InvalidSortOrder
+from .cursor import DEFAULT_SORT_KEY, decode_cursor
+from .exceptions import InvalidCursor, InvalidSortOrder, SearchTimeoutError
+from .search import CARD_SORT_KEY, RELEVANCE_SORT_KEY, SEARCH_FIELDS, board_tokens, card_result, card_text, \
+    card_words, query_tokens, query_words
 
 _MONGO_ID_KEY = "_id"
+# Search tokens of the board, see retro.index.search. Never returned.
+_SEARCH_TOKENS_KEY = "_search"
+_SCORE_KEY = "_score"
+_HIDDEN_FIELDS = {_MONGO_ID_KEY: False, _SEARCH_TOKENS_KEY: False}
+_BOARD_ID_KEY = "board_id"
+_CARD_TEXT_KEY = "text"
+# Words of the card text, see retro.index.search.card_words. Never returned.
+_CARD_WORDS_KEY = "_words"
 _COLLATION = collation.Collation(locale.getdefaultlocale()[0] or "en_US")
 SORT_ORDER_MAP = {"asc": ASCENDING, "desc": DESCENDING}
+# Sort keys the board listing offers. Each gets an index on (sort key, id), which cursor queries range over.
+SORT_KEYS = (CREATE_TIME_KEY, LAST_UPDATE_TIME_KEY, "content.name")
 
 
 class MongoIndex(Index):
-    def __init__(self, host=None, port=None, client=None):
+    def __init__(self, host=None, port=None, client=None, database="retrospec", search_candidates=1000,
+                 search_time_ms=500):
+        """
+        :param search_candidates: Searches sorted by relevance rank at most this many matching boards.
+        :param search_time_ms: Searches taking longer fail with SearchTimeoutError.
+        """
         super(MongoIndex, self).__init__()
+        self.search_candidates = search_candidates
+        self.search_time_ms = search_time_ms
         # connect=False to avoid race condition when MongoClient is started through uwsgi (pre-fork)
         self.__client = client if client is not None else MongoClient(host=host, port=port, connect=False)
 
-        db = self.__client.retrospec
+        db = self.__client[database]
         self._boards_collection = db.boards
+        self._cards_collection = db.cards
 
     def create_indices(self):
         self._boards_collection.create_index([("content.name", DESCENDING)])
 
+        # Queries sort with _COLLATION, and only indices with the same collation can serve them.
+        for sort_key in SORT_KEYS:
+            self._boards_collection.create_index([(sort_key, ASCENDING), (NODE_ID_KEY, ASCENDING)],
+                                                 collation=_COLLATION)
+
+        self._boards_collection.create_index([(_SEARCH_TOKENS_KEY, ASCENDING)], collation=_COLLATION)
+
+        # Searches look up their first word and read its cards in result order, so a page never sorts in memory.
+        self._cards_collection.create_index([(_CARD_WORDS_KEY, ASCENDING), (CARD_SORT_KEY, DESCENDING),
+                                             (NODE_ID_KEY, DESCENDING)])
+        self._cards_collection.create_index([(NODE_ID_KEY, ASCENDING)], unique=True)
+        self._cards_collection.create_index([(_BOARD_ID_KEY, ASCENDING)])
+
     def drop_indices(self):
         self._boards_collection.drop_indexes()
+        self._cards_collection.drop_indexes()
 
     def has_board(self, board_id):
-        return self._boards_collection.find({NODE_ID_KEY: board_id}, {_MONGO_ID_KEY: True}).limit(1).count() > 0
+        return self._boards_collection.find_one({NODE_ID_KEY: board_id}, {_MONGO_ID_KEY: True}) is not None
+
+    def get_board_ids(self):
+        boards = self._boards_collection.find({}, {_MONGO_ID_KEY: False, NODE_ID_KEY: True})
+
+        return (board[NODE_ID_KEY] for board in boards)
 
-    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None):
-        q_sort_key = sort_key or CREATE_TIME_KEY
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
+        """
+        :param search_terms: Words to find in SEARCH_FIELDS, as whole words or prefixes of words. Other fields are
+                             searched with case insensitive regular expressions, which scan every board.
+        :param sort_key: RELEVANCE_SORT_KEY sorts boards by how many search words they match as whole words.
+        :param cursor: Returned by next_cursor for the previous page. The page then starts right after it, with start
+                       boards skipped on top, and costs the same however deep it is.
+        """
+        q_sort_key = sort_key or DEFAULT_SORT_KEY
         q_sort_order = self._coerce_sort_order(sort_order or ASCENDING)
-        q_search_terms = {k: re.compile(v, re.IGNORECASE) for k, v in (search_terms or {}).items()}
+        q_search_terms = {k: re.compile(v, re.IGNORECASE) for k, v in (search_terms or {}).items()
+                          if k not in SEARCH_FIELDS}
         q_filters = {**q_search_terms, **(filters or {})}
 
-        return [
-            board for board in self._boards_collection
-                                   .find(q_filters, {_MONGO_ID_KEY: False})
-                                   .skip(start)
-                                   .limit(count)
-                                   .sort(q_sort_key, q_sort_order)
-                                   .collation(_COLLATION)
-        ]
+        q_search_fields = {k: v for k, v in (search_terms or {}).items() if k in SEARCH_FIELDS}
+        required_tokens, scored_tokens = query_tokens(q_search_fields)
+        if required_tokens:
+            # Boards indexed before they had search tokens are matched by regular expression, as they were before,
+            # until retro.index.build_search_tokens has run.
+            q_legacy = {k: re.compile(v, re.IGNORECASE) for k, v in q_search_fields.items()}
+            q_tokens = {"$or": [{_SEARCH_TOKENS_KEY: {"$all": required_tokens}},
+                                {_SEARCH_TOKENS_KEY: {"$exists": False}, **q_legacy}]}
+            q_filters = {"$and": [q_filters, q_tokens]} if q_filters else q_tokens
+
+        if q_sort_key == RELEVANCE_SORT_KEY:
+            if cursor is not None:
+                raise InvalidCursor("Searches sorted by relevance are paged with start, not cursors.")
+
+            return self._search_by_relevance(q_filters, scored_tokens, start, count)
+
+        if cursor is not None:
+            q_after = self._after(q_sort_key, q_sort_order, *decode_cursor(cursor, sort_key))
+            q_filters = {"$and": [q_filters, q_after]} if q_filters else q_after
+
+        boards = (self._boards_collection
+                      .find(q_filters, _HIDDEN_FIELDS)
+                      .skip(start)
+                      .limit(count)
+                      # Ties are broken by id so every board has one place to resume from.
+                      .sort([(q_sort_key, q_sort_order), (NODE_ID_KEY, q_sort_order)])
+                      .collation(_COLLATION))
+
+        if search_terms:
+            boards = boards.max_time_ms(self.search_time_ms)
+
+        try:
+            return list(boards)
+        except ExecutionTimeout as et:
+            raise SearchTimeoutError("Search for %s took longer than %sms." % (search_terms, self.search_time_ms)) \
+                from et
+
+    def build_search_tokens(self, batch_size=1000):
+        """
+        Adds search tokens to boards indexed before boards had them. Run once on upgrade, see
+        retro.index.build_search_tokens.
+
+        :return: The number of boards given search tokens.
+        """
+        count = 0
+        batch = []
+        for board in self._boards_collection.find({_SEARCH_TOKENS_KEY: {"$exists": False}}, {_MONGO_ID_KEY: False}):
+            batch.append(UpdateOne({NODE_ID_KEY: board[NODE_ID_KEY]},
+                                   {"$set": {_SEARCH_TOKENS_KEY: board_tokens(board)}}))
+
+            if len(batch) == batch_size:
+                self._boards_collection.bulk_write(batch, ordered=False)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            self._boards_collection.bulk_write(batch, ordered=False)
+            count += len(batch)
+
+        return count
 
     def create_board(self, board_node):
         self._upsert_board(board_node)
@@ -49,18 +151,118 @@ class MongoIndex(Index):
     def update_board(self, board_node):
         self._upsert_board(board_node)
 
+    def update_boards(self, board_nodes):
+        # One round trip for many boards. Unordered, so one failed upsert doesn't hold back the rest.
+        self._boards_collection.bulk_write([
+            UpdateOne({NODE_ID_KEY: board_node.id}, {"$set": self._index_document(board_node)}, upsert=True)
+            for board_node in board_nodes
+        ], ordered=False)
+
     def _upsert_board(self, board_node):
         self._boards_collection.update_one(
             {NODE_ID_KEY: board_node.id},
-            {"$set": board_node.to_index_dict()},
+            {"$set": self._index_document(board_node)},
             upsert=True
         )
 
     def remove_board(self, board_id):
         self._boards_collection.delete_one({NODE_ID_KEY: board_id})
+        self._cards_collection.delete_many({_BOARD_ID_KEY: board_id})
 
     def remove_all_boards(self):
         self._boards_collection.remove({})
+        self._cards_collection.delete_many({})
+
+    def update_cards(self, board_id, card_nodes, removed_card_ids=()):
+        """
+        Indexes the text of a board's cards, and drops the removed ones. Cards without any text are dropped too.
+        """
+        requests = [DeleteMany({NODE_ID_KEY: {"$in": list(removed_card_ids)}})] if removed_card_ids else []
+
+        for card_node in card_nodes:
+            text = card_text(card_node)
+
+            if text:
+                requests.append(UpdateOne({NODE_ID_KEY: card_node.id},
+                                          {"$set": {_BOARD_ID_KEY: board_id, CARD_SORT_KEY: card_node.last_update_time,
+                                                    _CARD_TEXT_KEY: text, _CARD_WORDS_KEY: card_words(text)}},
+                                          upsert=True))
+            else:
+                requests.append(DeleteOne({NODE_ID_KEY: card_node.id}))
+
+        if requests:
+            self._cards_collection.bulk_write(requests, ordered=False)
+
+    def search_cards(self, query, count=20, cursor=None):
+        """
+        :param query: Words the cards must all contain, as whole words.
+        :param cursor: Returned by next_cursor(cards, count, CARD_SORT_KEY) for the previous page.
+        :return: The most recently updated cards containing every word of the query, as card_result dicts.
+        """
+        words = query_words(query)
+        if not words:
+            return []
+
+        q_filters = {_CARD_WORDS_KEY: {"$all": words}}
+        if cursor is not None:
+            q_filters = {"$and": [q_filters, self._after(CARD_SORT_KEY, DESCENDING,
+                                                         *decode_cursor(cursor, CARD_SORT_KEY))]}
+
+        cards = (self._cards_collection
+                     .find(q_filters, {_MONGO_ID_KEY: False, _CARD_WORDS_KEY: False})
+                     .limit(count)
+                     .sort([(CARD_SORT_KEY, DESCENDING), (NODE_ID_KEY, DESCENDING)])
+                     .max_time_ms(self.search_time_ms))
+
+        try:
+            return [card_result(card[_BOARD_ID_KEY], card[NODE_ID_KEY], card.get(CARD_SORT_KEY), card[_CARD_TEXT_KEY],
+                                words) for card in cards]
+        except ExecutionTimeout as et:
+            raise SearchTimeoutError("Card search for '%s' took longer than %sms." % (query, self.search_time_ms)) \
+                from et
+
+    @staticmethod
+    def _index_document(board_node):
+        document = board_node.to_index_dict()
+        document[_SEARCH_TOKENS_KEY] = board_tokens(document)
+
+        return document
+
+    def _search_by_relevance(self, q_filters, scored_tokens, start, count):
+        pipeline = [
+            {"$match": q_filters},
+            # Broad searches match too many boards to rank them all within the time budget.
+            {"$limit": self.search_candidates},
+            {"$addFields": {_SCORE_KEY: {"$size": {"$setIntersection": [{"$ifNull": ["$" + _SEARCH_TOKENS_KEY, []]},
+                                                                        {"$literal": scored_tokens}]}}}},
+            {"$sort": {_SCORE_KEY: DESCENDING, LAST_UPDATE_TIME_KEY: DESCENDING, NODE_ID_KEY: ASCENDING}},
+            {"$skip": start},
+            {"$limit": count},
+            {"$project": dict(_HIDDEN_FIELDS, **{_SCORE_KEY: False})},
+        ]
+
+        try:
+            return list(self._boards_collection.aggregate(pipeline, collation=_COLLATION,
+                                                          maxTimeMS=self.search_time_ms))
+        except ExecutionTimeout as et:
+            raise SearchTimeoutError("Search took longer than %sms." % self.search_time_ms) from et
+
+    @staticmethod
+    def _after(sort_key, sort_order, value, board_id):
+        """
+        Matches the boards sorted after (value, board_id). Mongo sorts missing and null values before everything else.
+        """
+        op = "$gt" if sort_order == ASCENDING else "$lt"
+        same_value = {sort_key: value, NODE_ID_KEY: {op: board_id}}
+
+        if value is None:
+            return {"$or": [same_value, {sort_key: {"$ne": None}}]} if sort_order == ASCENDING else same_value
+
+        after = [same_value, {sort_key: {op: value}}]
+        if sort_order == DESCENDING:
+            after.append({sort_key: None})
+
+        return {"$or": after}
 
     @staticmethod
     def _coerce_sort_order(sort_order):
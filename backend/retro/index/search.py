@@ -0,0 +1,109 @@
+import re
+from retro.chain.node import CREATOR_KEY, LAST_UPDATE_TIME_KEY, NODE_ID_KEY
+
+# Fields searched through tokens rather than regular expressions.
+SEARCH_FIELDS = ("content.name", CREATOR_KEY)
+# Sorts search results by how many search words matched whole words.
+RELEVANCE_SORT_KEY = "relevance"
+# Longer words are still found by their first MAX_PREFIX characters.
+MAX_PREFIX = 20
+# Card search results are ordered by this, most recent first.
+CARD_SORT_KEY = LAST_UPDATE_TIME_KEY
+# Characters of card text shown around the first word found.
+SNIPPET_LENGTH = 160
+
+_WORD = re.compile(r"\w+")
+
+
+def field_value(board, field):
+    # Fields can be nested, e.g. content.name.
+    value = board
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+
+    return value
+
+
+def _words(text):
+    return _WORD.findall(str(text).lower())
+
+
+def board_tokens(board):
+    """
+    :return: The search tokens of a board's index dict. Every word of a searched field yields its prefixes, as
+             "field:prefix", and itself, as "field=word".
+    """
+    tokens = set()
+
+    for field in SEARCH_FIELDS:
+        value = field_value(board, field)
+        if value is None:
+            continue
+
+        for word in _words(value):
+            tokens.add("%s=%s" % (field, word))
+            tokens.update("%s:%s" % (field, word[:length]) for length in range(1, min(len(word), MAX_PREFIX) + 1))
+
+    return sorted(tokens)
+
+
+def query_tokens(search_terms):
+    """
+    :return: The tokens a board must have to match every word of the search terms for SEARCH_FIELDS, and the tokens
+             that count towards relevance.
+    """
+    required = []
+    scored = []
+
+    for field, value in search_terms.items():
+        for word in _words(value):
+            required.append("%s:%s" % (field, word[:MAX_PREFIX]))
+            scored.append("%s=%s" % (field, word))
+
+    # Longest first, since the first token of an $all query is the one looked up in the index.
+    return sorted(required, key=len, reverse=True), scored
+
+
+def card_text(card_node):
+    """
+    :return: The searchable text of a card: its content if that is text, or the text values of its content dict.
+    """
+    content = card_node.content
+
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return "\n".join(value for value in content.values() if isinstance(value, str))
+
+    return ""
+
+
+def card_words(text):
+    """
+    :return: The distinct words of card text. Cards are found by whole words only, so long cards don't multiply into
+             prefixes the way board names do.
+    """
+    return sorted(set(word[:MAX_PREFIX] for word in _words(text)))
+
+
+def query_words(query):
+    # Longest first, for the same reason as in query_tokens.
+    return sorted(set(word[:MAX_PREFIX] for word in _words(query)), key=len, reverse=True)
+
+
+def card_result(board_id, card_id, last_update_time, text, words):
+    """
+    :return: A card search result, with a snippet of the text around the first of the words found in it.
+    """
+    match = None
+    if words:
+        match = re.search(r"\b(%s)" % "|".join(re.escape(word) for word in words), text, re.IGNORECASE)
+
+    begin = max(0, match.start() - SNIPPET_LENGTH // 4) if match else 0
+    snippet = text[begin:begin + SNIPPET_LENGTH]
+    if begin > 0:
+        snippet = "\u2026" + snippet
+    if begin + SNIPPET_LENGTH < len(text):
+        snippet += "\u2026"
+
+    return {NODE_ID_KEY: card_id, "board_id": board_id, CARD_SORT_KEY: last_update_time, "snippet": snippet}
@@ -1,13 +1,80 @@
+import atexit
+import threading
+from retro.index.existence_cache import BoardExistenceCache
+from retro.index.index_writer import IndexWriter
 from retro.index.mongo_index import MongoIndex
+from .exceptions import UnknownRedisModeError
+from .mem_journal import MemJournal
 from .mem_store import MemStore
 from .redis_store import RedisStore
+from .sharded_store import ShardedStore
+
+REDIS_MODES = ("standalone", "cluster", "sharded")
 
 
 def get_store(cfg):
-    if cfg.redis_host:
+    if cfg.redis_host or cfg.redis_shards:
         index = MongoIndex(host=cfg.mongo_host, port=int(cfg.mongo_port))
-        store = RedisStore(index, host=cfg.redis_host, port=int(cfg.redis_port))
+        if float(cfg.index_flush_interval):
+            # Board index updates are written behind transactions, and whatever is pending is flushed on exit.
+            index = IndexWriter(index, flush_interval=float(cfg.index_flush_interval))
+            atexit.register(index.close)
+        if int(cfg.board_existence_cache_size):
+            index = BoardExistenceCache(index, max_size=int(cfg.board_existence_cache_size))
+        options = dict(layout=cfg.redis_layout, codec=cfg.redis_codec,
+                       scripts=str(cfg.redis_scripts).lower() == "true",
+                       transaction_timeout=float(cfg.redis_transaction_timeout) or None,
+                       change_log_retention=int(cfg.redis_change_log_versions),
+                       event_stream_length=int(cfg.redis_event_stream_length))
+        mode = cfg.redis_mode.lower()
+
+        if mode == "standalone":
+            store = RedisStore(index, host=cfg.redis_host, port=int(cfg.redis_port), **options)
+        elif mode == "cluster":
+            # Imported here so standalone deployments don't depend on cluster support in the redis client.
+            from redis.cluster import RedisCluster
+            client = RedisCluster(host=cfg.redis_host, port=int(cfg.redis_port), encoding='utf-8',
+                                  decode_responses=True)
+            store = RedisStore(index, client=client, hash_tags=True, **options)
+        elif mode == "sharded":
+            # REDIS_SHARDS is a comma separated list of host:port. Each address also names its shard on the hash ring.
+            shards = {}
+            for address in cfg.redis_shards.split(","):
+                host, _, port = address.strip().rpartition(":")
+                shards[address.strip()] = RedisStore(index, host=host, port=int(port), **options)
+            store = ShardedStore(shards)
+        else:
+            raise UnknownRedisModeError("Unknown redis mode '%s'. Must be one of %s." % (mode, list(REDIS_MODES)))
+
+        if isinstance(index, BoardExistenceCache):
+            # Every shard publishes the events of its own boards.
+            for redis_store in (store.shards.values() if mode == "sharded" else [store]):
+                threading.Thread(target=redis_store.board_existence_listener, args=(index,), daemon=True,
+                                 name="BoardExistenceListener").start()
+    elif cfg.mem_store_path:
+        store = MemStore(journal=MemJournal(cfg.mem_store_path, codec=cfg.mem_store_codec,
+                                            snapshot_records=int(cfg.mem_store_snapshot_records)))
     else:
         store = MemStore()
 
     return store
+
+
+def get_async_store(cfg):
+    # The asyncio store only serves the websocket server, which reads boards and events but never the board index.
+    # Imported here so the API and the eventlet server don't depend on redis.asyncio.
+    from .async_redis_store import AsyncRedisStore
+
+    options = dict(layout=cfg.redis_layout, codec=cfg.redis_codec,
+                   event_stream_length=int(cfg.redis_event_stream_length))
+    mode = cfg.redis_mode.lower()
+
+    if mode == "standalone":
+        return AsyncRedisStore(host=cfg.redis_host, port=int(cfg.redis_port), **options)
+    elif mode == "cluster":
+        from redis.asyncio.cluster import RedisCluster
+        client = RedisCluster(host=cfg.redis_host, port=int(cfg.redis_port), encoding='utf-8', decode_responses=True)
+        return AsyncRedisStore(client=client, hash_tags=True, **options)
+
+    raise UnknownRedisModeError("Redis mode '%s' is not supported by the asyncio store. Must be one of %s." %
+                                (mode, ["standalone", "cluster"]))
@@ -0,0 +1,242 @@
+import asyncio
+import inspect
+import logging
+import redis
+import redis.asyncio
+from collections import OrderedDict
+from retro.events.event_processor_factory import EventProcessorFactory
+from retro.store.exceptions import NodeNotFoundError
+from retro.store.redis_layouts import LAYOUTS, board_id_from_node_id, get_layout, read_raw
+from retro.store.redis_store import RedisKeys
+
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncRedisStore(RedisKeys):
+    """
+    The read and listen paths of RedisStore on asyncio, for servers that run on an event loop instead of green threads.
+    It reads the keys RedisStore writes and listens on the channels and streams it emits to, so boards keep being
+    written by the API through RedisStore.
+    """
+    # Boards whose layout is remembered, least recently used first out.
+    BOARD_LAYOUT_CACHE_SIZE = 100000
+
+    def __init__(self, host=None, port=None, client=None, layout=None, codec=None, event_stream_length=0,
+                 hash_tags=False):
+        self.client = client if client is not None else redis.asyncio.StrictRedis(host=host,
+                                                                                  port=port,
+                                                                                  encoding='utf-8',
+                                                                                  decode_responses=True)
+        self.layout = get_layout(layout, codec, hash_tags)
+        self.hash_tags = self.layout.hash_tags
+        self._layouts = [self.layout] + [cls(self.layout.codec, self.hash_tags and cls.supports_hash_tags)
+                                         for name, cls in LAYOUTS.items() if name != self.layout.name]
+        self._board_layouts = OrderedDict()
+        # Must match the API's RedisStore. Events are read from per-board streams when it is set.
+        self.event_stream_length = event_stream_length
+        # Everything runs on one event loop, so unlike RedisStore this needs no lock.
+        self._followed_streams = {}
+        # Stream key -> the blocking read of that stream still waiting for events, in cluster mode.
+        self._stream_reads = {}
+
+    async def get_node(self, node_id):
+        return (await self.get_nodes([node_id]))[0]
+
+    async def get_nodes(self, node_ids):
+        if not node_ids:
+            return []
+
+        layout = await self.board_layout(board_id_from_node_id(node_ids[0]))
+        nodes = await self._read_nodes(layout, node_ids)
+
+        return [self._check_node(node_id, node) for node_id, node in zip(node_ids, nodes)]
+
+    async def board_layout(self, board_id):
+        layout = self._board_layouts.get(board_id)
+        if layout is not None:
+            self._board_layouts.move_to_end(board_id)
+            return layout
+
+        layout = await self._find_layout(board_id)
+
+        # Only boards found in the configured layout are remembered: they never move out of it, and ids of boards that
+        # do not exist would fill the cache.
+        if layout is self.layout:
+            self._board_layouts[board_id] = layout
+            if len(self._board_layouts) > self.BOARD_LAYOUT_CACHE_SIZE:
+                self._board_layouts.popitem(last=False)
+
+        return layout or self.layout
+
+    async def has_board(self, board_id):
+        # Always asks redis rather than the board index, which has no asyncio client. Removed boards keep their nodes.
+        if await self.client.exists(self._get_deleted_key(board_id)):
+            self._board_layouts.pop(board_id, None)
+            return False
+
+        return await self._find_layout(board_id) is not None
+
+    async def get_board_version(self, board_id):
+        return (await self.get_node(board_id)).version
+
+    async def get_node_lock(self, node_id):
+        return await self.client.get(self._get_lock_key(node_id))
+
+    async def update_listener(self, message_cb=lambda *x: True):
+        """
+        Passes every board event to message_cb until it returns False. message_cb may be a coroutine function.
+        """
+        if self.event_stream_length:
+            return await self._stream_listener(message_cb)
+
+        p = self.client.pubsub()
+        await p.psubscribe(self.BOARD_UPDATE_PATTERN, self.KEY_EXPIRATION_PATTERN)
+
+        try:
+            async for event in p.listen():
+                if not await self._process_event(event, message_cb):
+                    break
+        finally:
+            await p.punsubscribe(self.BOARD_UPDATE_PATTERN, self.KEY_EXPIRATION_PATTERN)
+            _logger.info("Subscription terminated")
+
+    async def follow_board(self, board_id):
+        if not self.event_stream_length:
+            return None
+
+        last_event_id = self._followed_streams.get(board_id)
+
+        if last_event_id is None:
+            last_entry = await self.client.xrevrange(self._get_event_stream_key(board_id), count=1)
+            # Another subscriber may have followed the board while this one waited.
+            last_event_id = self._followed_streams.setdefault(board_id, last_entry[0][0] if last_entry else '0-0')
+
+        return last_event_id
+
+    def unfollow_board(self, board_id):
+        self._followed_streams.pop(board_id, None)
+
+    async def get_board_events(self, board_id, after_event_id, until_event_id='+'):
+        if not self.event_stream_length:
+            return None
+
+        stream_key = self._get_event_stream_key(board_id)
+
+        async with self.client.pipeline(False) as pipe:
+            pipe.xrange(stream_key, count=1)
+            # Stream ranges are inclusive, and the client already has after_event_id.
+            pipe.xrange(stream_key, after_event_id, until_event_id)
+            first, entries = await pipe.execute()
+
+        if not first or self._event_id_key(first[0][0]) > self._event_id_key(after_event_id):
+            # Events after after_event_id have already been trimmed from the stream.
+            return None
+
+        return [self._stream_message(entry_id, fields) for entry_id, fields in entries if entry_id != after_event_id]
+
+    async def _find_layout(self, board_id):
+        for layout in self._layouts:
+            if (await self._read_nodes(layout, [board_id]))[0] is not None:
+                return layout
+
+        return None
+
+    async def _read_nodes(self, layout, node_ids):
+        async with self.client.pipeline(False) as pipe:
+            for node_id in node_ids:
+                read_raw(pipe, *layout.read_command(node_id))
+
+            return [layout.parse_node(raw) for raw in await pipe.execute()]
+
+    async def _stream_listener(self, message_cb):
+        # Lock expirations are keyspace notifications, which only exist as pub/sub.
+        p = self.client.pubsub()
+        await p.psubscribe(self.KEY_EXPIRATION_PATTERN)
+
+        try:
+            while True:
+                try:
+                    event = await p.get_message(timeout=0)
+                    while event:
+                        if not await self._process_event(event, message_cb):
+                            return
+                        event = await p.get_message(timeout=0)
+
+                    streams = {self._get_event_stream_key(board_id): last_event_id
+                               for board_id, last_event_id in self._followed_streams.items()}
+
+                    if not streams:
+                        await asyncio.sleep(self.STREAM_BLOCK_MS / 1000)
+                        continue
+
+                    for stream_key, entries in await self._read_streams(streams):
+                        for entry_id, fields in entries:
+                            board_id, event = self._stream_event(stream_key, entry_id, fields)
+
+                            if board_id in self._followed_streams:
+                                self._followed_streams[board_id] = entry_id
+
+                            if not await self._process_event(event, message_cb):
+                                return
+                except redis.ConnectionError:
+                    # Every followed board resumes from the last event it saw once redis is back.
+                    _logger.exception("Lost connection to redis. Reconnecting...")
+                    await asyncio.sleep(self.STREAM_BLOCK_MS / 1000)
+        finally:
+            for read in self._stream_reads.values():
+                read.cancel()
+            self._stream_reads.clear()
+            await p.punsubscribe(self.KEY_EXPIRATION_PATTERN)
+            _logger.info("Subscription terminated")
+
+    async def _read_streams(self, streams):
+        if not self.hash_tags:
+            return await self.client.xread(streams, block=self.STREAM_BLOCK_MS) or []
+
+        # A single XREAD cannot span cluster slots, so every board's stream gets a blocking read of its own. Reads still
+        # waiting when another one returns are picked up by the next call.
+        for stream_key, last_event_id in streams.items():
+            if stream_key not in self._stream_reads:
+                self._stream_reads[stream_key] = asyncio.ensure_future(
+                    self.client.xread({stream_key: last_event_id}, block=self.STREAM_BLOCK_MS))
+
+        done, _ = await asyncio.wait(list(self._stream_reads.values()), timeout=self.STREAM_BLOCK_MS / 1000,
+                                     return_when=asyncio.FIRST_COMPLETED)
+
+        results = []
+        for stream_key, read in list(self._stream_reads.items()):
+            if read in done:
+                del self._stream_reads[stream_key]
+                # Boards unfollowed while their read was waiting are dropped.
+                if stream_key in streams:
+                    results.extend(read.result() or [])
+
+        return results
+
+    @staticmethod
+    async def _process_event(event, message_cb):
+        """
+        :return: False if the listener should stop.
+        """
+        try:
+            _logger.debug("Update listener received event '%s'", event)
+            if event['type'] == 'pmessage' and event['pattern']:
+                event_processor = EventProcessorFactory.get_event_processor(event, message_cb=message_cb)
+                keep_listening = event_processor.process()
+                if inspect.isawaitable(keep_listening):
+                    keep_listening = await keep_listening
+
+                if not keep_listening:
+                    return False
+        except Exception:
+            _logger.exception("Error during subscription processing.")
+
+        return True
+
+    @staticmethod
+    def _check_node(node_id, node):
+        if node is None:
+            raise NodeNotFoundError("Node with id '%s' not found in database.", node_id)
+
+        return node
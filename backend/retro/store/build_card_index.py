@@ -0,0 +1,59 @@
+"""
+Indexes the text of every card already stored, for card search.
+
+Servers index cards as they change, so this only needs to run once, for boards written before card search existed. It
+can run while servers are writing. A server indexing a card while this indexes the card's older text could be
+overwritten, so after indexing a board its cards are read again, and those written or removed meanwhile are indexed
+again until none were.
+
+    python -m retro.store.build_card_index [board_id ...]
+
+The store is configured from the same environment variables as the servers (REDIS_HOST, MONGO_HOST, ...), see
+retro.store.cli.
+"""
+import logging
+import sys
+from retro.chain.board import Board
+from retro.chain.node import ContentNode
+from retro.store.cli import board_ids, board_parser, open_store
+from retro.store.exceptions import NodeNotFoundError
+
+_logger = logging.getLogger(__name__)
+
+
+def index_board_cards(store, index, board_id):
+    """
+    :return: The number of cards on the board, 0 if it is not stored.
+    """
+    try:
+        indexed = set()
+        cards = _read_cards(store, board_id)
+
+        # Nodes are equal when they are at the same version, and every write bumps the version of what it changes.
+        while cards != indexed:
+            card_ids = {card.id for card in cards}
+            index.update_cards(board_id, list(cards - indexed),
+                               [card.id for card in indexed if card.id not in card_ids])
+            indexed, cards = cards, _read_cards(store, board_id)
+    except NodeNotFoundError:
+        return 0
+
+    return len(cards)
+
+
+def _read_cards(store, board_id):
+    return {node for node in Board(store, board_id).nodes() if isinstance(node, ContentNode)}
+
+
+def main(argv):
+    args = board_parser("Index the text of the cards already stored, for card search.",
+                        "Boards to index.").parse_args(argv)
+    store = open_store()
+    store.index.create_indices()
+
+    for board_id in board_ids(store, args):
+        _logger.info("Indexed board '%s' (%s cards).", board_id, index_board_cards(store, store.index, board_id))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+"""
+Checks that every card points at the column it is in, and with --repair points the ones that do not at it.
+
+Cards are added to the column of the card above them, so a wrong pointer spreads to every card added below it, and
+the board's stats count those cards against the wrong column. Repairing a board also counts its stats again.
+
+    python -m retro.store.check_column_headers [--repair] [board_id ...]
+
+The store is configured from the same environment variables as the servers (REDIS_HOST, MONGO_HOST, ...), see
+retro.store.cli.
+"""
+import logging
+import sys
+from retro.chain.board import Board
+from retro.store.cli import board_ids, board_parser, open_store
+from retro.store.exceptions import NodeNotFoundError
+
+_logger = logging.getLogger(__name__)
+
+
+def check_board(store, board_id, repair=False):
+    """
+    :return: The ids of the cards pointing at another column, repaired if repair is set. Empty if the board is not
+             stored.
+    """
+    board = Board(store, board_id)
+
+    try:
+        cards = board.check_column_headers()
+        if cards and repair:
+            cards = board.repair_column_headers()
+    except NodeNotFoundError:
+        return []
+
+    return [card.id for card in cards]
+
+
+def main(argv):
+    parser = board_parser("Check, and repair, the column every card points at.", "Boards to check.")
+    parser.add_argument("--repair", action="store_true", help="Point wrong cards at their column.")
+    args = parser.parse_args(argv)
+    store = open_store()
+
+    for board_id in board_ids(store, args):
+        card_ids = check_board(store, board_id, repair=args.repair)
+        if card_ids:
+            _logger.warning("Board '%s' has %s cards pointing at another column%s: %s", board_id, len(card_ids),
+                            " (repaired)" if args.repair else "", ", ".join(card_ids))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
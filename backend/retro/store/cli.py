@@ -0,0 +1,42 @@
+"""
+Setup shared by the maintenance commands run with python -m, e.g. retro.store.migrate_order_keys. They build their store
+with get_store from the same environment variables as the servers (REDIS_HOST, REDIS_PORT, REDIS_MODE, REDIS_SHARDS,
+REDIS_LAYOUT, MONGO_HOST, MEM_STORE_PATH, ...), so they work against every deployment the servers do. A MemStore journal
+must not be open in a server at the same time.
+"""
+import argparse
+from retro.store import get_store
+from retro.utils.config import Config
+from retro.utils.retro_logging import setup_basic_logging
+
+
+def board_parser(description, board_ids_help):
+    """
+    :return: A parser of the ids of the boards to work on, for the command to add its own options to.
+    """
+    parser = argparse.ArgumentParser(description=description,
+                                     epilog="The store is configured from the environment, like the servers.")
+    parser.add_argument("board_ids", nargs="*", help="%s Defaults to every board in the index." % board_ids_help)
+
+    return parser
+
+
+def open_store(cfg=None):
+    """
+    Sets up logging and builds the configured store. Commands write the board index directly rather than behind
+    transactions, so whatever they index is written by the time they move on, and they need no board existence cache.
+    """
+    cfg = cfg if cfg is not None else Config.from_env()
+    cfg.index_flush_interval = "0"
+    cfg.board_existence_cache_size = "0"
+
+    setup_basic_logging()
+
+    return get_store(cfg)
+
+
+def board_ids(store, args):
+    """
+    :return: The boards given on the command line, or every board in the index.
+    """
+    return args.board_ids or list(store.index.get_board_ids())
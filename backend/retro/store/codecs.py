@@ -0,0 +1,114 @@
+import json
+from retro.store.exceptions import UnknownCodecError, CodecUnavailableError
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack is only needed to write or read nodes stored with the binary codec.
+    msgpack = None
+
+# Hash field holding the whole encoded node when a node hash is written with a single-value codec.
+BLOB_FIELD = '_node'
+_ENVELOPE_VALUE_KEY = 'value'
+_JSON_PREFIXES = (b'{', '{')
+
+
+class NodeCodec(object):
+    """
+    Serializes node dicts for redis. Nodes are either written as a single value (encode) or as the fields of a hash
+    (encode_fields). Readers never need to know which codec wrote a node, see decode and decode_fields.
+    """
+    name = None
+
+    def encode(self, node_dict):
+        raise NotImplementedError("Subclass must implement 'encode'!")
+
+    def encode_fields(self, node_dict):
+        return {BLOB_FIELD: self.encode(node_dict)}
+
+
+class EnvelopeCodec(NodeCodec):
+    """
+    The original format: every field of a node hash is wrapped in its own JSON envelope ({"value": ...}). A single value
+    has no per-field form, so it is written as compact JSON.
+    """
+    name = 'envelope'
+
+    def encode(self, node_dict):
+        return json.dumps(node_dict, separators=(',', ':'))
+
+    def encode_fields(self, node_dict):
+        return {k: json.dumps({_ENVELOPE_VALUE_KEY: v}) for k, v in node_dict.items()}
+
+
+class JsonCodec(NodeCodec):
+    name = 'json'
+
+    def encode(self, node_dict):
+        return json.dumps(node_dict, separators=(',', ':'))
+
+
+class MsgpackCodec(NodeCodec):
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise CodecUnavailableError("The msgpack codec requires the 'msgpack' package to be installed.")
+
+    def encode(self, node_dict):
+        return msgpack.packb(node_dict, use_bin_type=True)
+
+
+CODECS = {cls.name: cls for cls in (EnvelopeCodec, JsonCodec, MsgpackCodec)}
+
+
+def get_codec(codec):
+    if codec is None:
+        return EnvelopeCodec()
+
+    if not isinstance(codec, str):
+        return codec
+
+    try:
+        return CODECS[codec.lower()]()
+    except KeyError:
+        raise UnknownCodecError("Unknown node codec '%s'. Must be one of %s." % (codec, list(CODECS.keys())))
+
+
+def decode(raw):
+    """
+    Decodes a node written as a single value by any codec. JSON objects always start with '{', which is never the first
+    byte of a msgpack map.
+    """
+    if raw[:1] in _JSON_PREFIXES:
+        return json.loads(raw)
+
+    if msgpack is None:
+        raise CodecUnavailableError("Found a msgpack encoded node, but the 'msgpack' package is not installed.")
+
+    return msgpack.unpackb(raw, raw=False)
+
+
+def decode_fields(raw_fields):
+    """
+    Decodes a node hash written by any codec. Field names may be bytes when the hash was read without decoding.
+    """
+    fields = {k.decode() if isinstance(k, bytes) else k: v for k, v in raw_fields.items()}
+
+    if BLOB_FIELD in fields:
+        return decode(fields[BLOB_FIELD])
+
+    return {k: json.loads(v)[_ENVELOPE_VALUE_KEY] for k, v in fields.items()}
+
+
+def decode_field(name, raw_field, raw_blob):
+    """
+    Decodes a single field of a node hash written by any codec, given an HMGET of the field itself and BLOB_FIELD.
+    """
+    if raw_blob is not None:
+        return decode(raw_blob).get(name)
+
+    if raw_field is not None:
+        return json.loads(raw_field)[_ENVELOPE_VALUE_KEY]
+
+    return None
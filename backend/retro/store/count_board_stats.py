@@ -0,0 +1,44 @@
+"""
+Counts the stats of boards created before boards kept them. Once counted, every change keeps a board's stats up to date,
+and boards that already have them are skipped, so the command can be run again after a failure. Until a board has been
+counted, GET /api/v1/boards/<board_id>/stats answers 404.
+
+    python -m retro.store.count_board_stats [board_id ...]
+
+The store is configured from the same environment variables as the servers (REDIS_HOST, MONGO_HOST, ...), see
+retro.store.cli.
+"""
+import logging
+import sys
+from retro.chain.board import Board
+from retro.store.cli import board_ids, board_parser, open_store
+from retro.store.exceptions import NodeNotFoundError
+
+_logger = logging.getLogger(__name__)
+
+
+def count_board(store, board_id):
+    """
+    :return: The board node with its new stats. None if the board already had stats or is not stored.
+    """
+    try:
+        if store.get_node(board_id).stats is not None:
+            return None
+
+        return Board(store, board_id).rebuild_stats()
+    except NodeNotFoundError:
+        return None
+
+
+def main(argv):
+    args = board_parser("Count the stats of boards that have none yet.", "Boards to count.").parse_args(argv)
+    store = open_store()
+
+    for board_id in board_ids(store, args):
+        board_node = count_board(store, board_id)
+        if board_node is not None:
+            _logger.info("Counted the stats of board '%s': %s cards.", board_id, board_node.stats["cards"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -20,3 +20,35 @@ class UnlockFailureError(Exception):
 
 class ExistingNodeError(Exception):
     pass
+
+
+class UnknownLayoutError(Exception):
+    pass
+
+
+class UnknownCodecError(Exception):
+    pass
+
+
+class CodecUnavailableError(Exception):
+    pass
+
+
+class TransactionTimeoutError(Exception):
+    pass
+
+
+class UnsupportedLayoutError(Exception):
+    pass
+
+
+class UnknownRedisModeError(Exception):
+    pass
+
+
+class JournalCorruptError(Exception):
+    pass
+
+
+class UnsupportedScriptError(Exception):
+    pass
@@ -0,0 +1,288 @@
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from retro.chain.node import Node
+from retro.store import codecs
+from retro.store.exceptions import JournalCorruptError
+
+_logger = logging.getLogger(__name__)
+
+# Every journal record is framed as <payload length><crc32 of payload><payload>.
+_FRAME = struct.Struct('>II')
+# A snapshot starts with the magic, then <header length><header>, then one blob of encoded nodes per board.
+_SNAPSHOT_MAGIC = b'RETROSNAP1'
+_HEADER_LENGTH = struct.Struct('>Q')
+
+
+def _encode(codec, value):
+    encoded = codec.encode(value)
+    return encoded.encode() if isinstance(encoded, str) else encoded
+
+
+class MemSnapshot(object):
+    """
+    A snapshot file mapped into memory. Only the header is decoded up front. A board's nodes are decoded the first time
+    the board is loaded, so startup does not depend on how much data the store holds.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.seq = int(path.rpartition('.')[2])
+
+        with open(path, 'rb') as f:
+            # The mapping outlives the file object, and stays readable after a newer snapshot replaces the file.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+            raise JournalCorruptError("'%s' is not a MemStore snapshot." % path)
+
+        start = len(_SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+        header_length, = _HEADER_LENGTH.unpack_from(self._map, len(_SNAPSHOT_MAGIC))
+        header = codecs.decode(self._map[start:start + header_length])
+
+        self.boards = header['boards']
+        self.groups = header['groups']
+        self.node_locks = header['node_locks']
+        self.board_nodes = header.get('board_nodes', {})
+        # Board id -> [card id, last update time, text] of its cards. None in snapshots written before cards had it.
+        self.cards = header.get('cards')
+        # Board id -> (offset, length) of its blob.
+        self.index = {board_id: tuple(location) for board_id, location in header['index'].items()}
+
+    def raw_board(self, board_id):
+        offset, length = self.index[board_id]
+        return self._map[offset:offset + length]
+
+    def load_board(self, board_id):
+        node_dicts = codecs.decode(self.raw_board(board_id))['nodes']
+
+        return {node_dict['id']: Node.from_dict(node_dict) for node_dict in node_dicts}
+
+
+class MemJournal(object):
+    """
+    Makes a MemStore durable. Every change is appended to a log segment and fsynced in batches: the first writer to wait
+    for its record fsyncs everything appended so far, and writers arriving meanwhile wait for the next fsync together.
+
+    After snapshot_records records a snapshot of the whole store is written in the background and older segments are
+    deleted. Snapshots are taken while writers keep going, so the segment started at the snapshot may hold changes the
+    snapshot already has. Records are absolute (the final state of every node they touch), so replaying them again is
+    harmless.
+    """
+    def __init__(self, path, codec=None, snapshot_records=10000):
+        self.path = path
+        self.codec = codecs.get_codec(codec)
+        self.snapshot_records = snapshot_records
+        self._lock = threading.Lock()
+        self._sync_cond = threading.Condition()
+        self._file = None
+        self._next_seq = 0
+        self._synced_seq = -1
+        self._syncing = False
+        self._snapshot_seq = 0
+        self._snapshotting = False
+        self.stats = {"records": 0, "log_bytes": 0, "fsyncs": 0, "snapshots": 0, "snapshot_bytes": 0}
+
+        os.makedirs(path, exist_ok=True)
+
+    def recover(self):
+        """
+        :return: The latest snapshot, or None, and an iterator over every record logged after it. Call open once the
+                 records have been replayed.
+        """
+        snapshots = self._files('snapshot')
+        snapshot = MemSnapshot(snapshots[-1]) if snapshots else None
+        start = snapshot.seq if snapshot else 0
+
+        self._snapshot_seq = start
+        self._next_seq = start
+
+        return snapshot, self._replay([path for path in self._files('journal') if self._seq(path) >= start])
+
+    def open(self):
+        with self._lock:
+            self._open_segment()
+
+        self._synced_seq = self._next_seq - 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync_file()
+                self._file.close()
+                self._file = None
+
+    def append(self, record):
+        """
+        Appends a record without waiting for it to reach the disk. Callers should pass the returned sequence number to
+        sync once they no longer hold any locks.
+        """
+        payload = _encode(self.codec, record)
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            self._file.write(frame)
+            seq = self._next_seq
+            self._next_seq += 1
+            self.stats["records"] += 1
+            self.stats["log_bytes"] += len(frame)
+
+        return seq
+
+    def sync(self, seq):
+        """
+        Blocks until the record with this sequence number is on disk.
+        """
+        with self._sync_cond:
+            while self._synced_seq < seq:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+
+                self._sync_cond.wait()
+            else:
+                return
+
+        synced_seq = self._synced_seq
+        try:
+            with self._lock:
+                self._file.flush()
+                synced_seq = self._next_seq - 1
+                # fsync a duplicate so appends to the segment can continue, and a rotation cannot close it meanwhile.
+                fd = os.dup(self._file.fileno())
+
+            try:
+                os.fsync(fd)
+                self.stats["fsyncs"] += 1
+            finally:
+                os.close(fd)
+        finally:
+            with self._sync_cond:
+                self._synced_seq = max(self._synced_seq, synced_seq)
+                self._syncing = False
+                self._sync_cond.notify_all()
+
+    def snapshot_due(self):
+        return not self._snapshotting and self._next_seq - self._snapshot_seq >= self.snapshot_records
+
+    def snapshot(self, capture):
+        """
+        Starts a new segment, then writes what capture returns as the snapshot it starts at and deletes everything
+        older. Does nothing if a snapshot is already being taken.
+
+        :param capture: Returns the store's state as a dict of boards, groups, node_locks, board_nodes, cards and
+                        board_blobs.
+                        board_blobs maps board ids to the board's node dicts, or to a blob read from an older snapshot.
+        """
+        with self._lock:
+            if self._snapshotting:
+                return
+
+            self._snapshotting = True
+            self._open_segment()
+            seq = self._next_seq
+
+        try:
+            state = capture()
+            blobs = []
+            index = {}
+            offset = 0
+            for board_id, nodes in state.pop("board_blobs").items():
+                blob = nodes if isinstance(nodes, bytes) else _encode(self.codec, {"nodes": nodes})
+                index[board_id] = [offset, len(blob)]
+                blobs.append(blob)
+                offset += len(blob)
+
+            header = dict(state, index=index)
+            # Blob offsets are relative to the end of the header until its length is known.
+            header_length = len(_encode(self.codec, header))
+            while True:
+                base = len(_SNAPSHOT_MAGIC) + _HEADER_LENGTH.size + header_length
+                header["index"] = {board_id: [base + start, length] for board_id, (start, length) in index.items()}
+                encoded_header = _encode(self.codec, header)
+                if len(encoded_header) == header_length:
+                    break
+                header_length = len(encoded_header)
+
+            path = os.path.join(self.path, 'snapshot.%020d' % seq)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(_SNAPSHOT_MAGIC)
+                f.write(_HEADER_LENGTH.pack(header_length))
+                f.write(encoded_header)
+                for blob in blobs:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+
+            os.replace(path + '.tmp', path)
+            self._sync_dir()
+            self.stats["snapshots"] += 1
+            self.stats["snapshot_bytes"] += size
+            self._snapshot_seq = seq
+
+            for old in self._files('snapshot') + self._files('journal'):
+                if self._seq(old) < seq:
+                    os.remove(old)
+        finally:
+            self._snapshotting = False
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._sync_file()
+            self._file.close()
+
+        self._file = open(os.path.join(self.path, 'journal.%020d' % self._next_seq), 'ab')
+        self._sync_dir()
+
+    def _sync_file(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        with self._sync_cond:
+            self._synced_seq = max(self._synced_seq, self._next_seq - 1)
+
+    def _sync_dir(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _files(self, prefix):
+        return sorted(path for path in glob.glob(os.path.join(self.path, prefix + '.*'))
+                      if path.rpartition('.')[2].isdigit())
+
+    @staticmethod
+    def _seq(path):
+        return int(path.rpartition('.')[2])
+
+    def _replay(self, segments):
+        for i, segment in enumerate(segments):
+            self._next_seq = self._seq(segment)
+
+            with open(segment, 'rb') as f:
+                data = f.read()
+
+            offset = 0
+            while offset < len(data):
+                length, crc = _FRAME.unpack_from(data, offset) if offset + _FRAME.size <= len(data) else (None, None)
+                payload = data[offset + _FRAME.size:offset + _FRAME.size + length] if length is not None else b''
+
+                if (length is None or len(payload) < length) and i == len(segments) - 1:
+                    # A write torn by a crash can only run past the end of the last segment, and was never
+                    # acknowledged.
+                    _logger.warning("Dropping a torn record at the end of '%s'.", segment)
+                    with open(segment, 'r+b') as f:
+                        f.truncate(offset)
+                    break
+
+                if length is None or len(payload) < length or zlib.crc32(payload) != crc:
+                    raise JournalCorruptError("Corrupt record at offset %s of '%s'." % (offset, segment))
+
+                yield codecs.decode(payload)
+                self._next_seq += 1
+                offset += _FRAME.size + length
@@ -1,43 +1,184 @@
+import bisect
+import copy
+import logging
 import threading
 
 from typing import List
-from retro.chain.node import Node
-from retro.store.store import Store, Group
+from retro.chain.node import ColumnHeaderNode, ContentNode, Node
+from retro.chain.stats import apply_stats
+from retro.index.mem_index import MemIndex
+from retro.index.search import card_text
+from retro.store.store import Store, Group, board_id_from_node_id
+
+_logger = logging.getLogger(__name__)
+
+
+class MemBoard(object):
+    """
+    The committed nodes of one board. The nodes dict and the nodes in it are never changed once published. Commits build
+    a new dict and swap it in, so readers holding the old one keep a consistent snapshot without taking the lock.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.nodes = {}
+        # The nodes dict the column index was built for, and the index: column id -> sorted [(order key, card id)].
+        # Only boards ordered by key are indexed, once their columns are read, and commits then keep the index current.
+        self.columns = (None, None)
+
+    def column_index(self, nodes):
+        """
+        :return: The column index of a snapshot of the board's nodes.
+        """
+        indexed, columns = self.columns
+
+        if indexed is not nodes:
+            columns = {}
+            for node in nodes.values():
+                if isinstance(node, ContentNode) and node.order is not None:
+                    columns.setdefault(node.column_header, []).append((node.order, node.id))
+            for entries in columns.values():
+                entries.sort()
+
+            if nodes is self.nodes:
+                self.columns = (nodes, columns)
+
+        return columns
+
+    def update_column_index(self, snapshot, node_ids):
+        """
+        Carries the column index over to a new snapshot in which node_ids were written or deleted.
+        """
+        indexed, columns = self.columns
+        if indexed is not self.nodes or columns is None:
+            return
+
+        columns = dict(columns)
+        copied = set()
+
+        def entries(column_id):
+            if column_id not in copied:
+                columns[column_id] = list(columns.get(column_id, ()))
+                copied.add(column_id)
+            return columns[column_id]
+
+        for node_id in node_ids:
+            old, new = self.nodes.get(node_id), snapshot.get(node_id)
+
+            if isinstance(old, ContentNode) and old.order is not None:
+                column = entries(old.column_header)
+                i = bisect.bisect_left(column, (old.order, old.id))
+                if i < len(column) and column[i] == (old.order, old.id):
+                    del column[i]
+            if isinstance(new, ContentNode) and new.order is not None:
+                bisect.insort(entries(new.column_header), (new.order, new.id))
+            if isinstance(old, ColumnHeaderNode) and new is None:
+                columns.pop(node_id, None)
+
+        self.columns = (snapshot, columns)
+
+
+class MemProxy(object):
+    """
+    What transaction functions read through. Write transactions get private copies of the nodes they read, read
+    transactions get the snapshot's own nodes.
+    """
+    def __init__(self, store, board, copy_nodes):
+        self.store = store
+        self.board = board
+        self.snapshot = board.nodes
+        self.copy_nodes = copy_nodes
+
+    def get_node(self, node_id):
+        node = self.snapshot.get(node_id)
+
+        if node is None:
+            node = self.store._find_node(node_id)
+
+        return copy.deepcopy(node) if self.copy_nodes else node
+
+    def get_nodes(self, node_ids):
+        return [self.get_node(node_id) for node_id in node_ids]
+
+    def get_column_orders(self, column_id, after=None, count=None):
+        entries = self.board.column_index(self.snapshot).get(column_id, [])
+
+        start = 0
+        if after is not None:
+            start = bisect.bisect_left(entries, (after,))
+            while start < len(entries) and entries[start][0] == after:
+                start += 1
+
+        return entries[start:start + count if count is not None else None]
+
+    def get_node_lock(self, node_id):
+        return self.store.get_node_lock(node_id)
 
 
 class MemStore(Store):
-    def __init__(self, nodes=None):
+    def __init__(self, nodes=None, journal=None, index=None):
+        """
+        :param nodes: Nodes or node dicts by id to start with. Each one is placed on the board its id belongs to.
+        :param journal: A MemJournal to recover from and log every change to. Without one nothing survives a restart.
+        :param index: Lists boards. Defaults to a MemIndex, which is rebuilt on recovery rather than journaled.
+        """
         super(MemStore, self).__init__()
-        self.nodes = nodes if nodes else {}
+        self._boards = {}
+        # Creating a board's MemBoard is the only thing serialized across boards.
+        self._boards_lock = threading.Lock()
+        # Boards in the recovered snapshot that have not been read yet.
+        self._snapshot = None
+        self._unloaded = set()
         self.boards = set()
         self.groups = dict()
-        self.lock = threading.RLock()
         self.node_locks = dict()
+        self.journal = journal
+        self.index = index if index is not None else MemIndex()
+
+        if journal is not None:
+            self._recover()
+
+        boards = {}
+        for node_id, node in (nodes or {}).items():
+            node = copy.deepcopy(node) if isinstance(node, Node) else Node.from_dict(dict(node, id=node_id))
+            boards.setdefault(board_id_from_node_id(node_id), []).append(node)
+
+        for board_id, board_nodes in boards.items():
+            self._sync(self._publish(board_id, updates=board_nodes))
 
     def get_node(self, node_id):
-        with self.lock:
-            node_dict = self.nodes[node_id].copy()
-            node_dict['id'] = node_id
+        # Callers may change what they get, so only read transactions hand out the committed nodes themselves.
+        return copy.deepcopy(self._find_node(node_id))
 
-            return Node.from_dict(node_dict)
+    def get_board_version(self, board_id):
+        return self._find_node(board_id).version
 
     def get_node_lock(self, node_id):
         return self.node_locks.get(node_id)
 
     def create_board(self, board_node):
         self.boards.add(board_node.id)
-        self.nodes[board_node.id] = board_node.to_dict()
+        self._log({"op": "board", "board": board_node.id, "exists": True})
+        self._sync(self._publish(board_node.id, updates=[copy.deepcopy(board_node)]))
 
     def remove_board(self, board_id):
         self.boards.remove(board_id)
+        self.index.remove_board(board_id)
+        self._sync(self._log({"op": "board", "board": board_id, "exists": False}))
 
-    def get_ids_by_type(self, node_type):
-        board_ids = []
-        for node_id, node in self.nodes.items():
-            if node.get("type") == node_type:
-                board_ids.append(node_id)
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
+        return self.index.get_boards(filters=filters, search_terms=search_terms, start=start, count=count,
+                                     sort_key=sort_key, sort_order=sort_order, cursor=cursor)
+
+    def has_board(self, board_id):
+        return self.index.has_board(board_id)
 
-        return board_ids
+    def search_cards(self, query, count=20, cursor=None):
+        return self.index.search_cards(query, count=count, cursor=cursor)
+
+    def get_ids_by_type(self, node_type):
+        return [node_id for board in self._all_boards() for node_id, node in board.nodes.items()
+                if node.NODE_TYPE == node_type]
 
     def get_groups(self) -> List[Group]:
         return [Group(k, v) for k, v in self.groups.items()]
@@ -52,11 +193,15 @@ class MemStore(Store):
 
     def upsert_group(self, group_id, name) -> Group:
         self.groups[group_id] = name
+        self._sync(self._log({"op": "group", "group": group_id, "name": name}))
 
         return Group(group_id, name)
 
     def remove_group(self, group_id) -> bool:
-        return self.groups.pop(group_id, None) is not None
+        removed = self.groups.pop(group_id, None) is not None
+        self._sync(self._log({"op": "group", "group": group_id, "name": None}))
+
+        return removed
 
     def board_update_listener(self, board_id, message_cb=lambda *x: True):
         pass
@@ -64,15 +209,19 @@ class MemStore(Store):
     def stop_listener(self, board_id):
         pass
 
+    def read_transaction(self, board_id, func):
+        # Reads run against whatever snapshot is current, without waiting for writers.
+        return func(MemProxy(self, self._board(board_id), copy_nodes=False))
+
     def transaction(self, board_id, func):
-        with self.lock:
-            nodes = func(self)
+        board = self._board(board_id)
+        seq = None
 
-            board_version = self.nodes[board_id]['version']
+        with board.lock:
+            nodes = func(MemProxy(self, board, copy_nodes=True))
 
             if nodes.updates or nodes.deletes or nodes.locks or nodes.unlocks:
-                for node in nodes.deletes:
-                    del self.nodes[node.id]
+                board_version = self._find_node(board_id).version
 
                 for node in nodes.updates:
                     node.version = board_version + 1
@@ -81,17 +230,201 @@ class MemStore(Store):
                     if node.orig_version is None:
                         node.orig_version = node.version
 
-                    node_dict = node.to_dict()
+                # The caller keeps the returned nodes, so the board holds copies of them.
+                seq = self._publish(board_id, updates=[copy.deepcopy(node) for node in nodes.updates],
+                                    deletes=[node.id for node in nodes.deletes], locks=nodes.locks,
+                                    unlocks=nodes.unlocks, bump_version=True, stats=nodes.stats)
+
+        # Writers of other boards can be logged meanwhile and share the fsync.
+        self._sync(seq)
+
+        return nodes
+
+    def snapshot(self):
+        """
+        Writes a snapshot of the whole store and drops the journal records it replaces. Snapshots are also taken on
+        their own every journal.snapshot_records records.
+        """
+        self.journal.snapshot(self._capture)
+
+    def _capture(self):
+        with self._boards_lock:
+            loaded = dict(self._boards)
+            unloaded = set(self._unloaded)
+
+        board_blobs = {board_id: [node.to_dict() for node in board.nodes.values()]
+                       for board_id, board in loaded.items() if board.nodes}
+        # Boards nobody has read since startup are copied over without decoding them.
+        board_blobs.update((board_id, self._snapshot.raw_board(board_id)) for board_id in unloaded)
+
+        # Board nodes are kept apart from their boards too, so the index can be rebuilt without loading any board.
+        board_nodes = {board_id: board.nodes[board_id].to_dict() for board_id, board in loaded.items()
+                       if board_id in board.nodes}
+        board_nodes.update((board_id, self._snapshot.board_nodes[board_id]) for board_id in unloaded
+                           if board_id in self._snapshot.board_nodes)
+
+        # And so is the text of their cards, for the card index.
+        cards = {board_id: [[node.id, node.last_update_time, card_text(node)] for node in board.nodes.values()
+                            if isinstance(node, ContentNode) and card_text(node)]
+                 for board_id, board in loaded.items() if board.nodes}
+        cards.update((board_id, self._snapshot.cards[board_id]) for board_id in unloaded
+                     if board_id in (self._snapshot.cards or {}))
+
+        return {"boards": sorted(self.boards), "groups": dict(self.groups), "node_locks": dict(self.node_locks),
+                "board_nodes": board_nodes, "cards": cards,
+                "board_blobs": board_blobs}
+
+    def _background_snapshot(self):
+        try:
+            self.snapshot()
+        except Exception:
+            _logger.exception("Error writing a MemStore snapshot.")
+
+    def _recover(self):
+        snapshot, records = self.journal.recover()
+
+        if snapshot is not None:
+            self._snapshot = snapshot
+            self._unloaded = set(snapshot.index)
+            self.boards = set(snapshot.boards)
+            self.groups = dict(snapshot.groups)
+            self.node_locks = dict(snapshot.node_locks)
+
+            for board_id in self.boards:
+                board_dict = snapshot.board_nodes.get(board_id)
+                # Only the board node is needed, so the board itself stays unloaded when the snapshot has it.
+                self.index.create_board(Node.from_dict(board_dict) if board_dict else self._find_node(board_id))
+
+                if snapshot.cards is not None:
+                    # The text is all the card index reads, so it is indexed as a card holding only its text.
+                    cards = snapshot.cards.get(board_id, [])
+                    self.index.update_cards(board_id, [ContentNode(card_id, content=text, last_update_time=update_time)
+                                                       for card_id, update_time, text in cards])
+                else:
+                    board = self._get_board(board_id)
+                    self.index.update_cards(board_id, [node for node in board.nodes.values()
+                                                       if isinstance(node, ContentNode)] if board else [])
+
+        for record in records:
+            if record["op"] == "nodes":
+                self._publish(record["board"], updates=[Node.from_dict(node_dict) for node_dict in record["updates"]],
+                              deletes=record["deletes"], locks=record["locks"], unlocks=record["unlocks"], log=False)
+            elif record["op"] == "board":
+                if record["exists"]:
+                    self.boards.add(record["board"])
+                else:
+                    self.boards.discard(record["board"])
+                    self.index.remove_board(record["board"])
+            elif record["op"] == "group":
+                if record["name"] is None:
+                    self.groups.pop(record["group"], None)
+                else:
+                    self.groups[record["group"]] = record["name"]
+
+        self.journal.open()
+
+    def _log(self, record):
+        return self.journal.append(record) if self.journal is not None else None
+
+    def _sync(self, seq):
+        if seq is None:
+            return
+
+        self.journal.sync(seq)
+
+        if self.journal.snapshot_due():
+            threading.Thread(target=self._background_snapshot, daemon=True).start()
+
+    def _get_board(self, board_id):
+        board = self._boards.get(board_id)
+
+        if board is None and board_id in self._unloaded:
+            with self._boards_lock:
+                board = self._boards.get(board_id)
+
+                if board is None:
+                    board = MemBoard()
+                    board.nodes = self._snapshot.load_board(board_id)
+                    self._boards[board_id] = board
+                    self._unloaded.discard(board_id)
+
+        return board
+
+    def _board(self, board_id):
+        board = self._get_board(board_id)
+
+        if board is None:
+            with self._boards_lock:
+                board = self._boards.setdefault(board_id, MemBoard())
+
+        return board
+
+    def _all_boards(self):
+        return [self._get_board(board_id) for board_id in list(self._boards) + list(self._unloaded)]
+
+    def _find_node(self, node_id):
+        board = self._get_board(board_id_from_node_id(node_id))
+        node = board.nodes.get(node_id) if board else None
+
+        if node is None:
+            raise KeyError(node_id)
+
+        return node
+
+    def _publish(self, board_id, updates=(), deletes=(), locks=(), unlocks=(), bump_version=False, stats=None,
+                 log=True):
+        """
+        Swaps in a new snapshot of the board with the given nodes written and deleted.
+
+        :param stats: Change to the board's stats, applied along with the version bump.
+
+        :return: The journal sequence number of the change, if it was logged.
+        """
+        board = self._board(board_id)
+
+        with board.lock:
+            snapshot = dict(board.nodes)
+
+            for node_id in deletes:
+                snapshot.pop(node_id, None)
+
+            for node in updates:
+                snapshot[node.id] = node
+
+            if bump_version and board_id in snapshot:
+                # The board node is replaced rather than changed, since the old snapshot still holds it.
+                snapshot[board_id] = snapshot[board_id].copy(version=snapshot[board_id].version + 1)
+                apply_stats(snapshot[board_id], stats)
+
+            for node_id, lock_val in locks:
+                self.node_locks[node_id] = lock_val
+
+            for node_id in unlocks:
+                self.node_locks.pop(node_id, None)
+
+            board_changed = board_id in snapshot and (bump_version or any(node.id == board_id for node in updates))
+
+            board.update_column_index(snapshot, [node.id for node in updates] + list(deletes))
+            board.nodes = snapshot
 
-                    self.nodes[node.id] = node_dict
+            seq = None
+            if log:
+                # Logged only once the snapshot is swapped in, so a store snapshot taken in between either already
+                # holds the change or comes before the record. Records hold the final state of every node, including
+                # the bumped board node, so replaying one twice is harmless.
+                written = [node for node in updates if node.id != board_id]
+                if board_changed:
+                    written.append(snapshot[board_id])
 
-                for node_id, lock_val in nodes.locks:
-                    self.node_locks[node_id] = lock_val
+                seq = self._log({"op": "nodes", "board": board_id, "updates": [node.to_dict() for node in written],
+                                 "deletes": list(deletes), "locks": [list(lock) for lock in locks],
+                                 "unlocks": list(unlocks)})
 
-                for node_id in nodes.unlocks:
-                    self.node_locks.pop(node_id, None)
+            if board_changed and board_id in self.boards:
+                self.index.update_board(snapshot[board_id])
 
-                # update board version
-                self.nodes[board_id]['version'] += 1
+            cards = [node for node in updates if isinstance(node, ContentNode)]
+            if (cards or deletes) and board_id in self.boards:
+                self.index.update_cards(board_id, cards, deletes)
 
-            return nodes
+        return seq
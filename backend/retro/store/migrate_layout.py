@@ -0,0 +1,82 @@
+"""
+Online migration of existing boards into the configured redis layout.
+
+Switch every API and websocket server to the new REDIS_LAYOUT before running this. Servers read and write boards in
+whichever layout they are currently stored in, so boards stay usable while they are moved one at a time. Each board is
+moved in a single transaction that WATCHes both layouts' keys and starts over if the board is edited mid-move.
+
+    python -m retro.store.migrate_layout --layout board [--codec msgpack] [board_id ...]
+
+The store is configured from the same environment variables as the servers (REDIS_HOST, REDIS_MODE, REDIS_SHARDS,
+MONGO_HOST, ...), see retro.store.cli. --layout and --codec take the place of REDIS_LAYOUT and REDIS_CODEC.
+"""
+import logging
+import sys
+from redis import WatchError
+from retro.chain.board import Board
+from retro.store.cli import board_ids, board_parser, open_store
+from retro.store.codecs import CODECS
+from retro.store.redis_layouts import LAYOUTS
+from retro.store.sharded_store import ShardedStore
+from retro.utils.config import Config
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate_board(store, board_id):
+    """
+    Moves every node of a board into store.layout.
+
+    :return: The number of nodes moved, 0 if the board was already stored in the target layout.
+    """
+    target = store.layout
+
+    with store.client.pipeline(True) as pipe:
+        while True:
+            source = store.board_layout(board_id)
+            if source is target:
+                return 0
+
+            nodes = Board(store, board_id).nodes()
+
+            try:
+                pipe.watch(source.board_key(board_id), target.board_key(board_id))
+
+                # Anything edited between reading the board and the WATCH bumped the board version.
+                if source.read_node(pipe, board_id).version != nodes[0].version:
+                    pipe.unwatch()
+                    continue
+
+                pipe.multi()
+                for node in nodes:
+                    target.write_node(pipe, node)
+                source.delete_board(pipe, board_id, [node.id for node in nodes])
+                pipe.execute()
+
+                return len(nodes)
+            except WatchError as err:
+                _logger.info("Migration of board '%s' interrupted. Reason: %s", board_id, repr(err))
+
+
+def main(argv):
+    parser = board_parser("Move boards into a different redis storage layout.", "Boards to migrate.")
+    parser.add_argument("--layout", required=True, choices=list(LAYOUTS.keys()))
+    parser.add_argument("--codec", default=None, choices=list(CODECS.keys()))
+    args = parser.parse_args(argv)
+
+    cfg = Config.from_env()
+    if not (cfg.redis_host or cfg.redis_shards):
+        parser.error("Boards are only migrated between redis layouts. Set REDIS_HOST or REDIS_SHARDS.")
+
+    cfg.redis_layout = args.layout
+    cfg.redis_codec = args.codec or cfg.redis_codec
+    store = open_store(cfg)
+
+    for board_id in board_ids(store, args):
+        count = migrate_board(store.shard(board_id) if isinstance(store, ShardedStore) else store, board_id)
+        if count:
+            _logger.info("Migrated board '%s' (%s nodes).", board_id, count)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,43 @@
+"""
+Moves linked boards over to order keys. Each card gets a key following its place in its column and is unlinked from
+the cards around it, so that moving a card afterwards rewrites that card alone. Boards already ordered by key are
+skipped, so the migration can be run again after a failure.
+
+    python -m retro.store.migrate_order_keys [board_id ...]
+
+The store is configured from the same environment variables as the servers (REDIS_HOST, MONGO_HOST, ...), see
+retro.store.cli.
+
+Set BOARD_ORDERING=keys as well so that new boards start out ordered by key.
+"""
+import logging
+import sys
+from retro.chain.board import Board
+from retro.store.cli import board_ids, board_parser, open_store
+from retro.store.exceptions import NodeNotFoundError
+
+_logger = logging.getLogger(__name__)
+
+
+def order_board(store, board_id):
+    """
+    :return: The number of nodes rewritten. 0 if the board was already ordered by key or is not stored.
+    """
+    try:
+        return len(Board(store, board_id).order_by_keys())
+    except NodeNotFoundError:
+        return 0
+
+
+def main(argv):
+    args = board_parser("Order the cards of linked boards by key.", "Boards to migrate.").parse_args(argv)
+    store = open_store()
+
+    for board_id in board_ids(store, args):
+        count = order_board(store, board_id)
+        if count:
+            _logger.info("Ordered board '%s' by key, rewriting %s nodes.", board_id, count)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,202 @@
+from redis.client import NEVER_DECODE
+from retro.chain.node import Node, VERSION_KEY
+from retro.store import codecs
+from retro.store.exceptions import UnknownLayoutError, UnsupportedLayoutError
+from retro.store.store import board_id_from_node_id
+
+
+def tag_board_id(board_id, hash_tags):
+    # Redis Cluster only hashes the part of a key between braces, so all keys tagged with the same board id share a slot.
+    return "{%s}" % board_id if hash_tags else board_id
+
+
+def untag_board_id(tagged_board_id):
+    return tagged_board_id.replace('{', '').replace('}', '')
+
+
+def read_raw(client, *args):
+    # Node data may be binary (msgpack), so it is always read without decoding and handed to the codecs as bytes.
+    return client.execute_command(*args, **{NEVER_DECODE: True})
+
+
+class RedisLayout(object):
+    """
+    Decides which redis keys a board's nodes are stored under. Nodes are written with the layout's codec and read back
+    with whichever codec wrote them.
+    """
+    name = None
+    single_key = False
+    # Whether every key of a board can be hash tagged into one cluster slot.
+    supports_hash_tags = False
+
+    def __init__(self, codec=None, hash_tags=False):
+        self.codec = codecs.get_codec(codec)
+        self.hash_tags = hash_tags
+
+    def board_key(self, board_id):
+        raise NotImplementedError
+
+    def has_board(self, client, board_id):
+        raise NotImplementedError
+
+    def read_node(self, client, node_id):
+        raise NotImplementedError
+
+    def read_nodes(self, client, node_ids):
+        raise NotImplementedError
+
+    def read_command(self, node_id):
+        """
+        :return: The redis command reading a single node, for clients that send commands themselves. Its reply is read
+                 with parse_node.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def parse_node(raw):
+        raise NotImplementedError
+
+    def read_board(self, client, board_id):
+        raise NotImplementedError("Layout '%s' cannot read a board in a single command." % self.name)
+
+    def read_version(self, client, board_id):
+        raise NotImplementedError
+
+    def write_node(self, pipe, node):
+        raise NotImplementedError
+
+    def delete_node(self, pipe, node_id):
+        raise NotImplementedError
+
+    def delete_board(self, pipe, board_id, node_ids):
+        raise NotImplementedError
+
+class NodeKeyLayout(RedisLayout):
+    """
+    Every node is stored in its own hash keyed by the node id. The board node lives at the board id, which is the key
+    WATCHed by transactions. Node ids are the keys, so they cannot be hash tagged and this layout cannot be clustered.
+    """
+    name = 'node'
+
+    def board_key(self, board_id):
+        return board_id
+
+    def has_board(self, client, board_id):
+        return client.exists(self.board_key(board_id)) > 0
+
+    def read_node(self, client, node_id):
+        return self.parse_node(read_raw(client, *self.read_command(node_id)))
+
+    def read_nodes(self, client, node_ids):
+        with client.pipeline(False) as pipe:
+            for node_id in node_ids:
+                read_raw(pipe, *self.read_command(node_id))
+
+            return [self.parse_node(raw) for raw in pipe.execute()]
+
+    def read_command(self, node_id):
+        return 'HGETALL', node_id
+
+    @staticmethod
+    def parse_node(raw):
+        if not raw:
+            return None
+
+        return Node.from_dict(codecs.decode_fields(raw))
+
+    def read_version(self, client, board_id):
+        return codecs.decode_field(VERSION_KEY, *read_raw(client, 'HMGET', board_id, VERSION_KEY, codecs.BLOB_FIELD))
+
+    def write_node(self, pipe, node):
+        # Replace the whole hash so no fields are left over from a node written by a different codec.
+        pipe.delete(node.id)
+        pipe.hset(node.id, mapping=self.codec.encode_fields(node.to_dict()))
+
+    def delete_node(self, pipe, node_id):
+        pipe.delete(node_id)
+
+    def delete_board(self, pipe, board_id, node_ids):
+        for node_id in node_ids:
+            pipe.delete(node_id)
+
+class BoardKeyLayout(RedisLayout):
+    """
+    A whole board is stored in a single hash with one field per node id, each holding the encoded node. Loading a board
+    is a single HGETALL, deleting it is a single UNLINK, and the board key is also the WATCHed key.
+    """
+    name = 'board'
+    single_key = True
+    supports_hash_tags = True
+
+    BOARD_KEY_PREFIX = 'BOARD.'
+
+    def board_key(self, board_id):
+        return "%s%s" % (self.BOARD_KEY_PREFIX, tag_board_id(board_id, self.hash_tags))
+
+    def has_board(self, client, board_id):
+        return client.hexists(self.board_key(board_id), board_id)
+
+    def read_node(self, client, node_id):
+        return self.parse_node(read_raw(client, *self.read_command(node_id)))
+
+    def read_nodes(self, client, node_ids):
+        # Nodes are almost always requested for a single board, so this is normally a single HMGET.
+        nodes = {}
+        by_board = {}
+        for node_id in node_ids:
+            by_board.setdefault(board_id_from_node_id(node_id), []).append(node_id)
+
+        for board_id, board_node_ids in by_board.items():
+            raws = read_raw(client, 'HMGET', self.board_key(board_id), *board_node_ids)
+            nodes.update(zip(board_node_ids, (self.parse_node(raw) for raw in raws)))
+
+        return [nodes[node_id] for node_id in node_ids]
+
+    def read_command(self, node_id):
+        return 'HGET', self.board_key(board_id_from_node_id(node_id)), node_id
+
+    def read_version(self, client, board_id):
+        # The board node only holds the column ids, so reading all of it is still cheap.
+        board_node = self.read_node(client, board_id)
+
+        return board_node.version if board_node else None
+
+    def read_board(self, client, board_id):
+        return {node_id.decode(): self.parse_node(raw)
+                for node_id, raw in read_raw(client, 'HGETALL', self.board_key(board_id)).items()}
+
+    @staticmethod
+    def parse_node(raw):
+        if not raw:
+            return None
+
+        return Node.from_dict(codecs.decode(raw))
+
+    def write_node(self, pipe, node):
+        pipe.hset(self.board_key(board_id_from_node_id(node.id)), node.id, self.codec.encode(node.to_dict()))
+
+    def delete_node(self, pipe, node_id):
+        pipe.hdel(self.board_key(board_id_from_node_id(node_id)), node_id)
+
+    def delete_board(self, pipe, board_id, node_ids):
+        pipe.unlink(self.board_key(board_id))
+
+LAYOUTS = {cls.name: cls for cls in (NodeKeyLayout, BoardKeyLayout)}
+
+
+def get_layout(layout, codec=None, hash_tags=False):
+    if layout is None:
+        layout = NodeKeyLayout.name
+
+    if not isinstance(layout, str):
+        return layout
+
+    try:
+        layout_cls = LAYOUTS[layout.lower()]
+    except KeyError:
+        raise UnknownLayoutError("Unknown redis layout '%s'. Must be one of %s." % (layout, list(LAYOUTS.keys())))
+
+    if hash_tags and not layout_cls.supports_hash_tags:
+        raise UnsupportedLayoutError("Redis layout '%s' cannot be hash tagged for a cluster." % layout_cls.name)
+
+    return layout_cls(codec, hash_tags)
@@ -0,0 +1,512 @@
+import json
+from redis.exceptions import ResponseError
+from retro.chain.node import Node, BoardNode, ColumnHeaderNode, ContentNode
+from retro.store.exceptions import NodeNotFoundError, UnsupportedScriptError
+from retro.store.store import TransactionNodes
+from retro.websocket_server.websocket_message import NodeUpdateMessage, NodeDeleteMessage
+
+_NODE_NOT_FOUND = "NODE_NOT_FOUND"
+_ORDERED_BY_KEY = "ORDERED_BY_KEY"
+_INEXACT_CONTENT = "INEXACT_CONTENT"
+
+# Everything the chain scripts share: reading and writing the nodes of a board stored in a single key (the 'board'
+# layout), and committing a mutation the same way RedisStore.transaction does (version bump, node writes and
+# publishes). Every key a script touches is passed in KEYS, so boards in the 'node' layout, whose nodes each have a key
+# of their own, never run scripts. Nodes are always written as JSON because cmsgpack cannot tell an empty map from an
+# empty list, and readers accept every codec anyway.
+#
+# KEYS are the board key, the board's change log and its event stream. ARGV is board id, timestamp, publish channel,
+# change log retention, event stream length (0 publishes instead) and a JSON list of the script's own parameters.
+_PRELUDE = """
+local board_key = KEYS[1]
+local change_log_key = KEYS[2]
+local event_stream_key = KEYS[3]
+local board_id = ARGV[1]
+local now = tonumber(ARGV[2])
+local channel = ARGV[3]
+local change_log_retention = tonumber(ARGV[4])
+local event_stream_length = tonumber(ARGV[5])
+local params = cjson.decode(ARGV[6])
+
+-- XADD generates ids, which older servers only allow in scripts replicated by effects.
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+
+local loaded = {}
+
+local function present(value)
+    return value ~= nil and value ~= cjson.null
+end
+
+local function read_node(node_id)
+    local raw = redis.call('HGET', board_key, node_id)
+    if not raw then
+        return nil
+    elseif string.sub(raw, 1, 1) == '{' then
+        return cjson.decode(raw)
+    end
+
+    return cmsgpack.unpack(raw)
+end
+
+-- Every node is read at most once, so a node reached twice (e.g. as a parent and as a new child) is the same table.
+local function load_node(node_id)
+    local node = loaded[node_id]
+
+    if not node then
+        node = read_node(node_id)
+        if not node then
+            error('%(not_found)s ' .. node_id .. ' ')
+        end
+        loaded[node_id] = node
+    end
+
+    return node
+end
+
+-- cjson cannot tell an empty object from an empty list, so these fields are written out by hand when empty.
+local empty_fields = {content = '{}', children = '[]'}
+
+local function is_empty(field, value)
+    return empty_fields[field] ~= nil and type(value) == 'table' and next(value) == nil
+end
+
+-- Fields holding nothing but nested objects (board stats), written out by hand so empty ones stay objects.
+local object_fields = {stats = true}
+
+local function encode_object(value)
+    if type(value) ~= 'table' then
+        return cjson.encode(value)
+    end
+
+    local raw = {}
+    for k, v in pairs(value) do
+        raw[#raw + 1] = cjson.encode(tostring(k)) .. ':' .. encode_object(v)
+    end
+
+    return '{' .. table.concat(raw, ',') .. '}'
+end
+
+-- Whether cjson writes value back exactly as it was read: empty tables lose whether they were objects or lists, and
+-- numbers are rounded.
+local function exact(value)
+    if type(value) == 'number' then
+        return tonumber(cjson.encode(value)) == value
+    elseif type(value) ~= 'table' then
+        return true
+    elseif next(value) == nil then
+        return false
+    end
+
+    for _, v in pairs(value) do
+        if not exact(v) then
+            return false
+        end
+    end
+
+    return true
+end
+
+-- Scripts give up on nodes whose content cjson would change, and the board falls back to a transaction. They check
+-- before writing anything, as a script that fails midway keeps what it wrote.
+local function check_exact(node)
+    local content = node.content
+    if type(content) == 'table' and next(content) ~= nil and not exact(content) then
+        error('%(inexact_content)s ' .. node.id .. ' ')
+    end
+end
+
+local function encode_node(node)
+    local raw = {}
+    for field, value in pairs(node) do
+        local encoded
+        if is_empty(field, value) then
+            encoded = empty_fields[field]
+        elseif object_fields[field] and type(value) == 'table' then
+            encoded = encode_object(value)
+        else
+            encoded = cjson.encode(value)
+        end
+        raw[#raw + 1] = cjson.encode(field) .. ':' .. encoded
+    end
+
+    return '{' .. table.concat(raw, ',') .. '}'
+end
+
+local function encode_nodes(nodes)
+    local raw = {}
+    for i, node in ipairs(nodes) do
+        raw[i] = encode_node(node)
+    end
+
+    return '[' .. table.concat(raw, ',') .. ']'
+end
+
+local function write_node(node, raw)
+    redis.call('HSET', board_key, node.id, raw)
+end
+
+local function delete_node(node_id)
+    redis.call('HDEL', board_key, node_id)
+end
+
+local function remove_child(node, node_id)
+    if node.type == '%(board_type)s' then
+        for i = #node.children, 1, -1 do
+            if node.children[i] == node_id then
+                table.remove(node.children, i)
+            end
+        end
+    elseif node.child == node_id then
+        node.child = cjson.null
+    end
+end
+
+local function set_child(node, node_id)
+    if node.type == '%(board_type)s' then
+        remove_child(node, node_id)
+        table.insert(node.children, node_id)
+    else
+        node.child = node_id
+    end
+end
+
+local function find_first_parent(node_id, node_type)
+    while present(node_id) do
+        local node = load_node(node_id)
+        if node.type == node_type then
+            return node
+        end
+        node_id = node.parent
+    end
+
+    return nil
+end
+
+-- The id of the column a card added or moved under node belongs to, nil under the board. Cards know their column, so
+-- the chain is only walked up for cards written without one.
+local function column_header_id(node)
+    if node.type == '%(column_header_type)s' then
+        return node.id
+    elseif node.type ~= '%(content_type)s' then
+        return nil
+    elseif present(node.column_header) then
+        return node.column_header
+    end
+
+    local column_header = find_first_parent(node.parent, '%(column_header_type)s')
+    return column_header and column_header.id
+end
+
+local function unique(nodes)
+    local seen = {}
+    local result = {}
+
+    for _, node in pairs(nodes) do
+        if node and not seen[node.id] then
+            seen[node.id] = true
+            table.insert(result, node)
+        end
+    end
+
+    return result
+end
+
+-- Mirrors retro.chain.stats, changing the board's stats in place. Boards whose stats were never counted have none.
+local function board_stats()
+    local board = load_node(board_id)
+    if present(board.stats) then
+        return board.stats
+    end
+
+    return nil
+end
+
+-- Integral numbers count, whether written as 2 or 2.0, the same as in stats.card_stats.
+local function add_totals(totals, content, sign)
+    if type(content) ~= 'table' then
+        return
+    end
+
+    for field, value in pairs(content) do
+        if type(value) == 'number' and value == math.floor(value) and value ~= 0 and math.abs(value) ~= math.huge then
+            local total = (totals[field] or 0) + sign * value
+            if total == 0 then
+                totals[field] = nil
+            else
+                totals[field] = total
+            end
+        end
+    end
+end
+
+local function count_card(node, sign)
+    local stats = board_stats()
+    if not stats then
+        return
+    end
+
+    stats.cards = stats.cards + sign
+    add_totals(stats.totals, node.content, sign)
+
+    if present(node.column_header) then
+        local column = stats.columns[node.column_header]
+        if not column then
+            column = {cards = 0, totals = {}}
+            stats.columns[node.column_header] = column
+        end
+        column.cards = column.cards + sign
+        add_totals(column.totals, node.content, sign)
+    end
+end
+
+local function count_column(column_id, sign)
+    local stats = board_stats()
+    if not stats then
+        return
+    end
+
+    if sign > 0 then
+        stats.columns[column_id] = stats.columns[column_id] or {cards = 0, totals = {}}
+    else
+        stats.columns[column_id] = nil
+    end
+end
+
+local function emit(message)
+    if event_stream_length > 0 then
+        redis.call('XADD', event_stream_key, 'MAXLEN', '~', event_stream_length, '*', 'data', message)
+    else
+        redis.call('PUBLISH', channel, message)
+    end
+end
+
+local function commit(updates, deletes)
+    local board = load_node(board_id)
+    local board_updated = false
+
+    check_exact(board)
+    for _, node in ipairs(updates) do
+        check_exact(node)
+    end
+    for _, node in ipairs(deletes) do
+        check_exact(node)
+    end
+
+    board.version = board.version + 1
+    board.last_update_time = now
+
+    for _, node in ipairs(deletes) do
+        delete_node(node.id)
+    end
+
+    local raw_deletes = encode_nodes(deletes)
+    if #deletes > 0 then
+        emit('{"type":"%(node_delete)s","data":' .. raw_deletes .. '}')
+    end
+
+    for _, node in ipairs(updates) do
+        node.version = board.version
+        node.last_update_time = now
+
+        if not present(node.orig_version) then
+            node.orig_version = node.version
+        end
+
+        if node.id == board_id then
+            board_updated = true
+        end
+    end
+
+    local raw_updates = {}
+    for i, node in ipairs(updates) do
+        raw_updates[i] = encode_node(node)
+        write_node(node, raw_updates[i])
+    end
+
+    raw_updates = '[' .. table.concat(raw_updates, ',') .. ']'
+    if #updates > 0 then
+        emit('{"type":"%(node_update)s","data":' .. raw_updates .. '}')
+    end
+
+    local raw_board = encode_node(board)
+    if not board_updated then
+        write_node(board, raw_board)
+    end
+
+    local changes = {board.version, board_id}
+    for _, node in ipairs(deletes) do
+        table.insert(changes, board.version)
+        table.insert(changes, node.id)
+    end
+    for _, node in ipairs(updates) do
+        table.insert(changes, board.version)
+        table.insert(changes, node.id)
+    end
+    redis.call('ZADD', change_log_key, unpack(changes))
+    redis.call('ZREMRANGEBYSCORE', change_log_key, '-inf', board.version - change_log_retention)
+
+    return '{"updates":' .. raw_updates .. ',"deletes":' .. raw_deletes .. ',"board":' .. raw_board .. '}'
+end
+
+-- Boards ordered by key keep column indices these scripts do not write, so their changes go through transactions.
+if present(load_node(board_id).ordering) then
+    error('%(ordered_by_key)s')
+end
+"""
+
+# Mirrors Board._add_node.
+_ADD_NODE = """
+local parent_id, new_node_id, creator, content = params[1], params[2], params[3], params[4]
+
+local parent = load_node(parent_id)
+local column_header = column_header_id(parent)
+local node = {id = new_node_id, creator = creator, content = content, parent = parent_id, child = cjson.null,
+              create_time = now, version = 1, orig_version = cjson.null, last_update_time = cjson.null}
+local updates = {parent, node}
+
+if column_header then
+    -- we will insert this between parent and child nodes
+    node.type = '%(content_type)s'
+    node.column_header = column_header
+    node.child = parent.child
+
+    if present(node.child) then
+        local child = load_node(node.child)
+        child.parent = new_node_id
+        table.insert(updates, child)
+    end
+
+    count_card(node, 1)
+else
+    -- Parent is the top of the chain.  We will insert this as a new leaf node.
+    node.type = '%(column_header_type)s'
+    count_column(new_node_id, 1)
+end
+
+set_child(parent, new_node_id)
+
+return commit(updates, {})
+"""
+
+# Mirrors Board._move_node.
+_MOVE_NODE = """
+local node_id, new_parent_id = params[1], params[2]
+
+local node = load_node(node_id)
+local old_parent = load_node(node.parent)
+local old_child = present(node.child) and load_node(node.child) or nil
+local new_parent = load_node(new_parent_id)
+local new_child = present(new_parent.child) and load_node(new_parent.child) or nil
+
+if node.type == '%(content_type)s' and new_parent.type ~= '%(board_type)s' then
+    -- A card moved to another column takes its counts along.
+    count_card(node, -1)
+    node.column_header = column_header_id(new_parent)
+    count_card(node, 1)
+end
+
+-- unlink our moving node from old parent
+remove_child(old_parent, node_id)
+if old_child then
+    -- unlink old child from our moving node
+    remove_child(node, old_child.id)
+    set_child(old_parent, old_child.id)
+    old_child.parent = old_parent.id
+end
+
+if new_parent.type ~= '%(board_type)s' then
+    new_parent.child = node_id
+end
+node.parent = new_parent.id
+if new_child then
+    set_child(node, new_child.id)
+    new_child.parent = node_id
+end
+
+return commit(unique({node, new_parent, new_child, old_parent, old_child}), {})
+"""
+
+# Mirrors Board._remove_node.
+_REMOVE_NODE = """
+local node_id = params[1]
+
+local node = load_node(node_id)
+local parent = load_node(node.parent)
+local updates = {parent}
+
+if node.type == '%(content_type)s' then
+    count_card(node, -1)
+elseif node.type == '%(column_header_type)s' then
+    count_column(node_id, -1)
+end
+
+remove_child(parent, node_id)
+if present(node.child) then
+    local child = load_node(node.child)
+    set_child(parent, child.id)
+    child.parent = parent.id
+    table.insert(updates, child)
+end
+
+return commit(updates, {node})
+"""
+
+_SCRIPT_CONSTANTS = {
+    "not_found": _NODE_NOT_FOUND,
+    "ordered_by_key": _ORDERED_BY_KEY,
+    "inexact_content": _INEXACT_CONTENT,
+    "board_type": BoardNode.NODE_TYPE,
+    "column_header_type": ColumnHeaderNode.NODE_TYPE,
+    "content_type": ContentNode.NODE_TYPE,
+    "node_update": NodeUpdateMessage.type,
+    "node_delete": NodeDeleteMessage.type,
+}
+
+SCRIPTS = {
+    "add_node": _ADD_NODE,
+    "move_node": _MOVE_NODE,
+    "remove_node": _REMOVE_NODE,
+}
+
+
+class ChainScripts(object):
+    """
+    Chain mutations registered as redis scripts. Each one reads, rewrites and publishes the affected nodes atomically in
+    a single round trip, so unlike RedisStore.transaction they never WATCH and never retry.
+    """
+    def __init__(self, client):
+        self._scripts = {name: client.register_script((_PRELUDE + body) % _SCRIPT_CONSTANTS)
+                         for name, body in SCRIPTS.items()}
+
+    def run(self, name, layout, board_id, change_log, events, now, *params):
+        """
+        :param change_log: The board's change log key and retention, see RedisStore.get_board_changes.
+        :param events: The board's publish channel, event stream key and event stream length.
+        :return: The committed TransactionNodes and the board node with its new version.
+        """
+        change_log_key, change_log_retention = change_log
+        channel, event_stream_key, event_stream_length = events
+
+        try:
+            raw = self._scripts[name](keys=[layout.board_key(board_id), change_log_key, event_stream_key],
+                                      args=[board_id, now, channel, change_log_retention, event_stream_length,
+                                            json.dumps(params)])
+        except ResponseError as err:
+            if _NODE_NOT_FOUND in str(err):
+                node_id = str(err).partition(_NODE_NOT_FOUND)[2].split()[0]
+                raise NodeNotFoundError("Node with id '%s' not found in database.", node_id) from err
+            if _ORDERED_BY_KEY in str(err):
+                raise UnsupportedScriptError("Board '%s' is ordered by key." % board_id) from err
+            if _INEXACT_CONTENT in str(err):
+                node_id = str(err).partition(_INEXACT_CONTENT)[2].split()[0]
+                raise UnsupportedScriptError("Node '%s' has content scripts cannot write back exactly." % node_id) \
+                    from err
+            raise
+
+        result = json.loads(raw)
+
+        return (TransactionNodes(updates=[Node.from_dict(d) for d in result["updates"]],
+                                 deletes=[Node.from_dict(d) for d in result["deletes"]]),
+                Node.from_dict(result["board"]))
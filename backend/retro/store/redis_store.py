@@ -1,44 +1,244 @@
-import json
 import logging
+import random
 import redis
+import threading
+import time
+from collections import OrderedDict
+from concurrent import futures
 from typing import List
 from datetime import datetime, timedelta
-from redis import WatchError
-from retro.chain.node import Node, VERSION_KEY, LAST_UPDATE_TIME_KEY
+from redis import RedisError, WatchError
+from retro.chain.node import ColumnHeaderNode, ContentNode
+from retro.chain.stats import apply_stats
 from retro.events.event_processor_factory import EventProcessorFactory
-from retro.store.store import Store, Group
-from retro.store.exceptions import NodeNotFoundError
+from retro.store.redis_layouts import LAYOUTS, board_id_from_node_id, get_layout, tag_board_id, untag_board_id
+from retro.store.redis_scripts import ChainScripts
+from retro.store.store import Store, Group, BoardChanges
+from retro.store.write_queue import BatchProxy, BoardWriteQueue
+from retro.store.exceptions import NodeNotFoundError, TransactionTimeoutError, UnsupportedScriptError
 from retro.utils import unix_time_millis
-from retro.websocket_server.websocket_message import BoardDeleteMessage, NodeLockMessage, NodeUnlockMessage, \
-    NodeUpdateMessage, NodeDeleteMessage
+from retro.websocket_server.websocket_message import WebsocketMessage, BoardDeleteMessage, NodeLockMessage, \
+    NodeUnlockMessage, NodeUpdateMessage, NodeDeleteMessage
 
 
 _logger = logging.getLogger(__name__)
 
 
-class RedisStore(Store):
-    GROUP_HASH_KEY = 'groups'
+class RedisKeys(object):
+    """
+    Names of the keys, channels and event streams a board uses. The blocking and the asyncio stores share them, so
+    events written by one can be read by the other.
+    """
+    BOARD_UPDATE_PATTERN = 'board_update|*'
+    KEY_EXPIRATION_PATTERN = '__key*__:expired'
+    # Milliseconds the stream listener blocks in XREAD before picking up newly followed boards and lock expirations.
+    STREAM_BLOCK_MS = 1000
+
+    hash_tags = False
+
+    def _get_lock_key(self, node_id):
+        board_id = board_id_from_node_id(node_id)
+        return "NODELOCK.%s%s" % (tag_board_id(board_id, self.hash_tags), node_id[len(board_id):])
+
+    def _get_column_key(self, column_id):
+        # Cards of a column on a board ordered by key, as "<order> <card id>" members sorted lexicographically.
+        board_id = board_id_from_node_id(column_id)
+        return "ORDER.%s%s" % (tag_board_id(board_id, self.hash_tags), column_id[len(board_id):])
+
+    @staticmethod
+    def _get_publish_channel(board_id):
+        return 'board_update|%s' % board_id
+
+    def _get_change_log_key(self, board_id):
+        return "CHANGES.%s" % tag_board_id(board_id, self.hash_tags)
+
+    def _get_event_stream_key(self, board_id):
+        return "EVENTS.%s" % tag_board_id(board_id, self.hash_tags)
+
+    def _get_deleted_key(self, board_id):
+        # Set once a board is removed. Its nodes are kept, so this is how stores without the board index tell.
+        return "DELETED.%s" % tag_board_id(board_id, self.hash_tags)
 
-    def __init__(self, index, host=None, port=None, client=None):
+    def _stream_event(self, stream_key, entry_id, fields):
+        """
+        :return: The board id and the stream entry as the pub/sub event it would have been published as.
+        """
+        board_id = untag_board_id(stream_key.partition('.')[2])
+        event = {'type': 'pmessage', 'pattern': self.BOARD_UPDATE_PATTERN, 'id': entry_id,
+                 'channel': self._get_publish_channel(board_id), 'data': fields['data']}
+
+        return board_id, event
+
+    @staticmethod
+    def _event_id_key(event_id):
+        milliseconds, _, sequence = event_id.partition('-')
+        return int(milliseconds), int(sequence or 0)
+
+    @staticmethod
+    def _stream_message(entry_id, fields):
+        message = WebsocketMessage.decode(fields['data'])
+        message.event_id = entry_id
+
+        return message
+
+
+class RedisStore(Store, RedisKeys):
+    GROUP_HASH_KEY = 'groups'
+    # Seconds. WATCH retries back off exponentially between 0 and these bounds.
+    RETRY_BACKOFF_BASE = 0.005
+    RETRY_BACKOFF_CAP = 0.5
+    # Change log member marking the board version the log starts at. Its score is +inf so trimming never removes it.
+    CHANGE_LOG_START = '#start:'
+    # Seconds a deleted board's event stream is kept, so followers still see the board being deleted.
+    DELETED_STREAM_TTL = 24 * 60 * 60
+    # Boards whose layout is remembered, least recently used first out.
+    BOARD_LAYOUT_CACHE_SIZE = 100000
+    # Streams read at once in cluster mode, where every followed board's stream needs a blocking read of its own.
+    STREAM_READ_THREADS = 256
+
+    def __init__(self, index, host=None, port=None, client=None, reader=None, layout=None, codec=None,
+                 scripts=False, transaction_timeout=None, change_log_retention=1000, event_stream_length=0,
+                 hash_tags=False, board_layouts=None, snapshot=False):
         super(RedisStore, self).__init__()
         self.client = client if client is not None else redis.StrictRedis(host=host,
                                                                           port=port,
                                                                           encoding='utf-8',
                                                                           decode_responses=True)
+        # Batched reads are pipelined through the reader. Inside a transaction the client is a WATCHing pipeline that
+        # executes every command immediately, so the reader is the parent client instead. Reading on another
+        # connection is safe because every transaction bumps the WATCHed board version.
+        self.reader = reader if reader is not None else self.client
         self.index = index
+        # Layout new boards are written in. Boards are only ever migrated towards it, so it is the only layout that
+        # is remembered per board.
+        self.layout = get_layout(layout, codec, hash_tags)
+        # With hash tags every key of a board is tagged "{board_id}", so a board's transactions and scripts only ever
+        # touch a single cluster slot.
+        self.hash_tags = self.layout.hash_tags
+        self._legacy_layouts = [cls(self.layout.codec, self.hash_tags and cls.supports_hash_tags)
+                                for name, cls in LAYOUTS.items() if name != self.layout.name]
+        self._board_layouts = OrderedDict(board_layouts or ())
+        self._board_layouts_lock = threading.Lock()
+        # Scripts are passed every key they touch, which only a single-key layout can list up front.
+        self._chain_scripts = ChainScripts(self.client) if scripts and self.layout.single_key else None
+        # Transaction proxies read single-key boards in full once, since everything they read is WATCHed anyway.
+        self._snapshots = {} if snapshot else None
+        # Seconds a transaction may keep retrying before TransactionTimeoutError is raised. None retries forever.
+        self.transaction_timeout = transaction_timeout
+        self._write_queue = BoardWriteQueue()
+        # Number of board versions the change log answers get_board_changes for. Must match across all servers.
+        self.change_log_retention = change_log_retention
+        # Board events are published over pub/sub unless this is set, in which case they are appended to a per-board
+        # stream capped at roughly this many events, which listeners can replay after losing their connection.
+        self.event_stream_length = event_stream_length
+        self._followed_lock = threading.Lock()
+        self._followed_streams = {}
+        # Stream key -> the blocking read of that stream still waiting for events, in cluster mode.
+        self._stream_reads = {}
+        self._stream_reader = None
+
+    @property
+    def supports_scripts(self):
+        return self._chain_scripts is not None
 
     def get_node(self, node_id):
         return self._get_node(node_id)
 
+    def get_nodes(self, node_ids):
+        if not node_ids:
+            return []
+
+        board_id = board_id_from_node_id(node_ids[0])
+        layout = self.board_layout(board_id)
+
+        if self._snapshots is not None and layout.single_key:
+            snapshot = self._get_snapshot(layout, board_id)
+            nodes = [snapshot.get(node_id) for node_id in node_ids]
+        else:
+            nodes = layout.read_nodes(self.reader, node_ids)
+
+        return [self._check_node(node_id, node) for node_id, node in zip(node_ids, nodes)]
+
+    def board_layout(self, board_id):
+        with self._board_layouts_lock:
+            layout = self._board_layouts.get(board_id)
+            if layout is not None:
+                self._board_layouts.move_to_end(board_id)
+                return layout
+
+        if self.layout.has_board(self.client, board_id):
+            # Only boards found in the configured layout are remembered: they never move out of it, and ids of boards
+            # that do not exist would fill the cache.
+            layout = self.layout
+            with self._board_layouts_lock:
+                self._board_layouts[board_id] = layout
+                if len(self._board_layouts) > self.BOARD_LAYOUT_CACHE_SIZE:
+                    self._board_layouts.popitem(last=False)
+        else:
+            # Boards written before the configured layout changed stay usable until they are migrated.
+            layout = next((legacy for legacy in self._legacy_layouts if legacy.has_board(self.client, board_id)),
+                          self.layout)
+
+        return layout
+
+    def get_board_version(self, board_id):
+        return self._check_node(board_id, self.board_layout(board_id).read_version(self.client, board_id))
+
+    def get_board_changes(self, board_id, since_version):
+        change_log_key = self._get_change_log_key(board_id)
+
+        with self.reader.pipeline(False) as pipe:
+            pipe.zrangebyscore(change_log_key, '(%d' % since_version, '+inf')
+            pipe.zscore(change_log_key, board_id)
+            changed, version = pipe.execute()
+
+        start = next((int(member[len(self.CHANGE_LOG_START):]) for member in changed
+                      if member.startswith(self.CHANGE_LOG_START)), None)
+
+        # Boards created before the change log existed have no start, and anything older than the retention has been
+        # trimmed.
+        if start is None or version is None:
+            return None
+
+        version = int(version)
+        if not max(start, version - self.change_log_retention) <= since_version <= version:
+            return None
+
+        # The log only records which nodes changed. Whatever is no longer stored was deleted.
+        node_ids = [member for member in changed if not member.startswith(self.CHANGE_LOG_START)]
+        nodes = self.board_layout(board_id).read_nodes(self.reader, node_ids) if node_ids else []
+
+        return BoardChanges(version=version,
+                            updates=[node for node in nodes if node is not None],
+                            deletes=[node_id for node_id, node in zip(node_ids, nodes) if node is None])
+
+    def get_column_orders(self, column_id, after=None, count=None):
+        """
+        :param after: Only return cards ordered after this key.
+        :param count: The number of cards to return, all of them if None.
+        :return: The (order key, card id) of the cards of a column on a board ordered by key, in order.
+        """
+        # "!" sorts after the " " separating the key from the card id, and before every digit of a longer key.
+        start = "(%s!" % after if after is not None else "-"
+        limit = {"start": 0, "num": count} if count is not None else {}
+        members = self.client.zrangebylex(self._get_column_key(column_id), start, "+", **limit)
+
+        return [tuple(member.split(" ", 1)) for member in members]
+
     def get_node_lock(self, node_id):
         return self.client.get(self._get_lock_key(node_id))
 
     def create_board(self, board_node):
+        change_log_key = self._get_change_log_key(board_node.id)
+
         with self.client.pipeline(True) as pipe:
             pipe.multi()
-            pipe.hmset(board_node.id, self._get_node_map(board_node))
-            pipe.publish(self._get_publish_channel(board_node.id),
-                         NodeUpdateMessage(board_node.to_dict()).encode())
+            self.layout.write_node(pipe, board_node)
+            pipe.delete(change_log_key, self._get_deleted_key(board_node.id))
+            pipe.zadd(change_log_key, {"%s%s" % (self.CHANGE_LOG_START, board_node.version): "+inf",
+                                       board_node.id: board_node.version})
+            self._emit(pipe, board_node.id, NodeUpdateMessage(board_node.to_dict()))
+            self._announce(pipe, board_node.id, NodeUpdateMessage(board_node.to_dict()))
 
             pipe.execute()
 
@@ -49,43 +249,200 @@ class RedisStore(Store):
 
     def remove_board(self, board_id):
         self.index.remove_board(board_id)
+        with self._board_layouts_lock:
+            self._board_layouts.pop(board_id, None)
 
         with self.client.pipeline(True) as pipe:
             pipe.multi()
-            pipe.publish(self._get_publish_channel(board_id),
-                         BoardDeleteMessage(board_id).encode())
+            pipe.set(self._get_deleted_key(board_id), 1)
+            self._emit(pipe, board_id, BoardDeleteMessage(board_id))
+            self._announce(pipe, board_id, BoardDeleteMessage(board_id))
+            if self.event_stream_length:
+                pipe.expire(self._get_event_stream_key(board_id), self.DELETED_STREAM_TTL)
             pipe.execute()
 
-    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None):
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
         return self.index.get_boards(filters=filters, search_terms=search_terms,
                                      start=start, count=count,
-                                     sort_key=sort_key, sort_order=sort_order)
+                                     sort_key=sort_key, sort_order=sort_order, cursor=cursor)
 
     def has_board(self, board_id):
         return self.index.has_board(board_id)
 
+    def search_cards(self, query, count=20, cursor=None):
+        return self.index.search_cards(query, count=count, cursor=cursor)
+
     def update_listener(self, message_cb=lambda *x: True):
-        board_update_channel = 'board_update|*'
-        key_expiration_channel = '__key*__:expired'
+        if self.event_stream_length:
+            return self._stream_listener(message_cb)
 
         p = self.client.pubsub()
-        p.psubscribe(board_update_channel)
-        p.psubscribe(key_expiration_channel)
+        p.psubscribe(self.BOARD_UPDATE_PATTERN)
+        p.psubscribe(self.KEY_EXPIRATION_PATTERN)
 
         for event in p.listen():
-            try:
-                _logger.debug("Update listener received event '%s'", event)
-                if event['type'] == 'pmessage' and event['pattern']:
-                    event_processor = EventProcessorFactory.get_event_processor(event, message_cb=message_cb)
-                    if not event_processor.process():
-                        break
-            except:
-                _logger.exception("Error during subscription processing.")
-
-        p.punsubscribe(board_update_channel)
-        p.punsubscribe(key_expiration_channel)
+            if not self._process_event(event, message_cb):
+                break
+
+        p.punsubscribe(self.BOARD_UPDATE_PATTERN)
+        p.punsubscribe(self.KEY_EXPIRATION_PATTERN)
         _logger.info("Subscription terminated")
 
+    def board_existence_listener(self, cache):
+        """
+        Reports every board created, changed or removed by any process to a BoardExistenceCache, and loads it once
+        subscribed. Runs until the process exits. While redis is unreachable events are missed, so the cache is reset
+        and loaded again after resubscribing.
+        """
+        def message_cb(message, board_id):
+            # Deleting a board also deletes its nodes afterwards, so only updates say that the board exists.
+            if message.type == BoardDeleteMessage.type:
+                cache.board_removed(board_id)
+            elif message.type == NodeUpdateMessage.type:
+                cache.board_seen(board_id)
+
+            return True
+
+        while True:
+            p = self.client.pubsub()
+            try:
+                p.psubscribe(self.BOARD_UPDATE_PATTERN)
+
+                for event in p.listen():
+                    if event['type'] == 'psubscribe':
+                        # Only now are boards created by others reported, so the index can't miss any of them.
+                        try:
+                            cache.load()
+                        except Exception:
+                            _logger.exception("Error loading the board existence cache. Boards are looked up instead.")
+                    else:
+                        self._process_event(event, message_cb)
+            except RedisError:
+                _logger.exception("Board existence listener lost its subscription. Resubscribing.")
+                cache.reset()
+                time.sleep(1)
+            finally:
+                p.close()
+
+    def follow_board(self, board_id):
+        if not self.event_stream_length:
+            return None
+
+        with self._followed_lock:
+            last_event_id = self._followed_streams.get(board_id)
+
+            if last_event_id is None:
+                last_entry = self.client.xrevrange(self._get_event_stream_key(board_id), count=1)
+                last_event_id = self._followed_streams[board_id] = last_entry[0][0] if last_entry else '0-0'
+
+            return last_event_id
+
+    def unfollow_board(self, board_id):
+        with self._followed_lock:
+            self._followed_streams.pop(board_id, None)
+
+    def get_board_events(self, board_id, after_event_id, until_event_id='+'):
+        if not self.event_stream_length:
+            return None
+
+        stream_key = self._get_event_stream_key(board_id)
+
+        with self.client.pipeline(False) as pipe:
+            pipe.xrange(stream_key, count=1)
+            # Stream ranges are inclusive, and the client already has after_event_id.
+            pipe.xrange(stream_key, after_event_id, until_event_id)
+            first, entries = pipe.execute()
+
+        if not first or self._event_id_key(first[0][0]) > self._event_id_key(after_event_id):
+            # Events after after_event_id have already been trimmed from the stream.
+            return None
+
+        return [self._stream_message(entry_id, fields) for entry_id, fields in entries if entry_id != after_event_id]
+
+    def _stream_listener(self, message_cb):
+        # Lock expirations are keyspace notifications, which only exist as pub/sub.
+        p = self.client.pubsub()
+        p.psubscribe(self.KEY_EXPIRATION_PATTERN)
+
+        try:
+            while True:
+                try:
+                    event = p.get_message(timeout=0)
+                    while event:
+                        if not self._process_event(event, message_cb):
+                            return
+                        event = p.get_message(timeout=0)
+
+                    with self._followed_lock:
+                        streams = {self._get_event_stream_key(board_id): last_event_id
+                                   for board_id, last_event_id in self._followed_streams.items()}
+
+                    if not streams:
+                        time.sleep(self.STREAM_BLOCK_MS / 1000)
+                        continue
+
+                    for stream_key, entries in self._read_streams(streams):
+                        for entry_id, fields in entries:
+                            board_id, event = self._stream_event(stream_key, entry_id, fields)
+
+                            with self._followed_lock:
+                                if board_id in self._followed_streams:
+                                    self._followed_streams[board_id] = entry_id
+
+                            if not self._process_event(event, message_cb):
+                                return
+                except redis.ConnectionError:
+                    # Every followed board resumes from the last event it saw once redis is back.
+                    _logger.exception("Lost connection to redis. Reconnecting...")
+                    time.sleep(self.STREAM_BLOCK_MS / 1000)
+        finally:
+            p.punsubscribe(self.KEY_EXPIRATION_PATTERN)
+            _logger.info("Subscription terminated")
+
+    def _read_streams(self, streams):
+        if not self.hash_tags:
+            return self.client.xread(streams, block=self.STREAM_BLOCK_MS) or []
+
+        # Every board's stream lives in its own slot, and a single XREAD cannot span slots. Each stream gets a blocking
+        # read of its own, and reads still waiting when another one returns are picked up by the next call.
+        if self._stream_reader is None:
+            self._stream_reader = futures.ThreadPoolExecutor(max_workers=self.STREAM_READ_THREADS)
+
+        for stream_key, last_event_id in streams.items():
+            if stream_key not in self._stream_reads:
+                self._stream_reads[stream_key] = self._stream_reader.submit(
+                    self.client.xread, {stream_key: last_event_id}, block=self.STREAM_BLOCK_MS)
+
+        done, _ = futures.wait(self._stream_reads.values(), timeout=self.STREAM_BLOCK_MS / 1000,
+                               return_when=futures.FIRST_COMPLETED)
+
+        results = []
+        for stream_key, read in list(self._stream_reads.items()):
+            if read in done:
+                del self._stream_reads[stream_key]
+                # Boards unfollowed while their read was waiting are dropped.
+                if stream_key in streams:
+                    results.extend(read.result() or [])
+
+        return results
+
+    @staticmethod
+    def _process_event(event, message_cb):
+        """
+        :return: False if the listener should stop.
+        """
+        try:
+            _logger.debug("Update listener received event '%s'", event)
+            if event['type'] == 'pmessage' and event['pattern']:
+                event_processor = EventProcessorFactory.get_event_processor(event, message_cb=message_cb)
+                if not event_processor.process():
+                    return False
+        except:
+            _logger.exception("Error during subscription processing.")
+
+        return True
+
     def get_groups(self) -> List[Group]:
         groups = self.client.hgetall(self.GROUP_HASH_KEY)
 
@@ -107,113 +464,282 @@ class RedisStore(Store):
     def remove_group(self, group_id: str) -> bool:
         return self.client.hdel(self.GROUP_HASH_KEY, group_id) > 0
 
-    @staticmethod
-    def _get_lock_key(node_id):
-        return "NODELOCK.%s" % node_id
+    def _emit(self, pipe, board_id, message):
+        if self.event_stream_length:
+            pipe.xadd(self._get_event_stream_key(board_id), {"data": message.encode()},
+                      maxlen=self.event_stream_length, approximate=True)
+        else:
+            pipe.publish(self._get_publish_channel(board_id), message.encode())
 
-    @staticmethod
-    def _get_publish_channel(board_id):
-        return 'board_update|%s' % board_id
+    def _announce(self, pipe, board_id, message):
+        # Board existence caches listen on pub/sub, so boards created and removed are published there even when events
+        # go to streams.
+        if self.event_stream_length:
+            pipe.publish(self._get_publish_channel(board_id), message.encode())
 
     def transaction(self, board_id, func):
+        # Transactions on the same board from this process are queued and committed together, so they never invalidate
+        # each other's WATCH. Only writers in other processes can still force a retry.
+        return self._write_queue.submit(board_id, func, self._commit_batch)
+
+    def read_transaction(self, board_id, func):
+        # Reads never queue behind writers. A single-key board is read in full with one command, which is consistent on
+        # its own; any other board is WATCHed and read again if a writer committed while it was being read.
+        layout = self.board_layout(board_id)
+
+        if layout.single_key:
+            proxy = RedisStore(self.index, client=self.client, layout=self.layout, board_layouts={board_id: layout},
+                               snapshot=True)
+            proxy._get_snapshot(layout, board_id)
+            return func(proxy)
+
         with self.client.pipeline(True) as pipe:
             while True:
                 try:
-                    pipe.watch(board_id)
-
-                    nodes = func(RedisStore(self.index, client=pipe))
-
-                    now = unix_time_millis(datetime.now())
-                    board_node = self._get_node(board_id, pipe=pipe)
-                    board_node.version += 1
-                    board_node.last_update_time = now
-
-                    if nodes.updates or nodes.deletes or nodes.locks or nodes.unlocks:
-                        # start transaction
-                        pipe.multi()
-
-                        # delete nodes
-                        board_delete = False
-                        for node in nodes.deletes:
-                            if node.id == board_id:
-                                board_delete = True
-                            pipe.delete(node.id)
-
-                        # publish deletes
-                        if nodes.deletes:
-                            pipe.publish(self._get_publish_channel(board_id),
-                                         NodeDeleteMessage([node.to_dict() for node in nodes.deletes]).encode())
-
-                        # Update nodes
-                        for node in nodes.updates:
-                            node.version = board_node.version
-                            node.last_update_time = now
-
-                            # update orig version if needed
-                            if node.orig_version is None:
-                                node.orig_version = node.version
-
-                            node_dict = self._get_node_map(node)
-
-                            pipe.hmset(node.id, node_dict)
-
-                        # publish updates
-                        if nodes.updates:
-                            pipe.publish(self._get_publish_channel(board_id),
-                                         NodeUpdateMessage([node.to_dict() for node in nodes.updates]).encode())
-
-                        # lock nodes
-                        for node_id, lock_value in nodes.locks:
-                            lock_key = self._get_lock_key(node_id)
-                            pipe.setex(lock_key, timedelta(hours=1), lock_value)
-
-                        # publish locks
-                        if nodes.locks:
-                            pipe.publish(self._get_publish_channel(board_id),
-                                         NodeLockMessage([node_id for node_id, _ in nodes.locks]).encode())
-
-                        # unlock nodes
-                        for node_id in nodes.unlocks:
-                            lock_key = self._get_lock_key(node_id)
-                            pipe.delete(lock_key)
-
-                        # publish unlocks
-                        if nodes.unlocks:
-                            pipe.publish(self._get_publish_channel(board_id),
-                                         NodeUnlockMessage([node_id for node_id in nodes.unlocks]).encode())
-
-                        # Update board version and last_update_time as long as we're not deleting the board.
-                        if not board_delete:
-                            pipe.hmset(board_id, {
-                                VERSION_KEY: json.dumps({'value': board_node.version}),
-                                LAST_UPDATE_TIME_KEY: json.dumps({'value': board_node.last_update_time})
-                            })
-
-                        pipe.execute()
-
-                        # Update the corresponding index for the board as long as we didn't just delete it.
-                        if not board_delete:
-                            self.index.update_board(board_node)
-
-                    return nodes
+                    pipe.watch(layout.board_key(board_id))
+                    result = func(RedisStore(self.index, client=pipe, reader=self.client, layout=self.layout,
+                                             board_layouts={board_id: layout}))
+                    pipe.multi()
+                    pipe.execute()
+                    return result
                 except WatchError as err:
+                    _logger.info("Read transaction failed. Reason: %s" % repr(err))
+
+    def transaction_stats(self, board_id=None):
+        return self._write_queue.stats(board_id)
+
+    def index_stats(self):
+        return self.index.stats()
+
+    def _commit_batch(self, board_id, entries):
+        deadline = time.monotonic() + self.transaction_timeout if self.transaction_timeout else None
+        attempt = 0
+
+        with self.client.pipeline(True) as pipe:
+            while True:
+                try:
+                    layout = self.board_layout(board_id)
+                    pipe.watch(layout.board_key(board_id))
+
+                    proxy = RedisStore(self.index, client=pipe, reader=self.client, layout=self.layout,
+                                       board_layouts={board_id: layout}, snapshot=True)
+
+                    if len(entries) == 1:
+                        entries[0].result = entries[0].func(proxy)
+                        self._commit(pipe, layout, board_id, entries[0].result)
+                    else:
+                        batch = self._run_batch(proxy, entries)
+                        board_node = self._commit(pipe, layout, board_id, batch.merged())
+
+                        # Callers get back their own copies of the nodes they wrote, which need the committed version.
+                        for entry in entries:
+                            for node in entry.result.updates if entry.result else []:
+                                self._stamp_node(node, board_node)
+
+                    return
+                except WatchError as err:
+                    attempt += 1
+                    self._write_queue.record_retry(board_id)
                     _logger.info("Transaction failed. Reason: %s" % repr(err))
 
+                    # Full jitter, so processes that collided don't collide again on the next attempt.
+                    delay = random.uniform(0, min(self.RETRY_BACKOFF_CAP, self.RETRY_BACKOFF_BASE * 2 ** attempt))
+                    if deadline is not None and time.monotonic() + delay > deadline:
+                        self._write_queue.record_timeout(board_id)
+                        raise TransactionTimeoutError("Transaction on board '%s' did not commit after %s attempts."
+                                                      % (board_id, attempt))
+
+                    time.sleep(delay)
+
     @staticmethod
-    def _get_node_map(node):
-        node_dict = node.to_dict()
+    def _run_batch(proxy, entries):
+        batch = BatchProxy(proxy)
+
+        for entry in entries:
+            entry.result = None
+            entry.error = None
+
+            try:
+                entry.result = entry.func(batch)
+                batch.apply(entry.result)
+            except RedisError:
+                # Connection problems and WATCH failures apply to the whole batch.
+                raise
+            except Exception as err:
+                entry.error = err
+
+        return batch
+
+    def _commit(self, pipe, layout, board_id, nodes):
+        now = unix_time_millis(datetime.now())
+        board_node = self._check_node(board_id, layout.read_node(pipe, board_id))
+        board_node.version += 1
+        board_node.last_update_time = now
+
+        # A board node written by the transaction replaces the stored one, and is what gets indexed.
+        updated_board = next((node for node in nodes.updates if node.id == board_id), None)
+        if updated_board is not None:
+            self._stamp_node(updated_board, board_node)
+            board_node = updated_board
+        apply_stats(board_node, nodes.stats)
+        orders = self._column_order_changes(layout, board_node, nodes) if board_node.ordering else None
+
+        if nodes.updates or nodes.deletes or nodes.locks or nodes.unlocks:
+            # start transaction
+            pipe.multi()
 
-        for k, v in node_dict.items():
-            node_dict[k] = json.dumps({'value': v})
+            # delete nodes
+            board_delete = any(node.id == board_id for node in nodes.deletes)
+            if board_delete:
+                layout.delete_board(pipe, board_id, [node.id for node in nodes.deletes])
+            else:
+                for node in nodes.deletes:
+                    layout.delete_node(pipe, node.id)
+
+            # publish deletes
+            if nodes.deletes:
+                self._emit(pipe, board_id, NodeDeleteMessage([node.to_dict() for node in nodes.deletes]))
+
+            # Update nodes
+            for node in nodes.updates:
+                self._stamp_node(node, board_node)
+                layout.write_node(pipe, node)
+
+            # publish updates
+            if nodes.updates:
+                self._emit(pipe, board_id, NodeUpdateMessage([node.to_dict() for node in nodes.updates]))
+
+            # lock nodes
+            for node_id, lock_value in nodes.locks:
+                lock_key = self._get_lock_key(node_id)
+                pipe.setex(lock_key, timedelta(hours=1), lock_value)
+
+            # publish locks
+            if nodes.locks:
+                self._emit(pipe, board_id, NodeLockMessage([node_id for node_id, _ in nodes.locks]))
+
+            # unlock nodes
+            for node_id in nodes.unlocks:
+                lock_key = self._get_lock_key(node_id)
+                pipe.delete(lock_key)
+
+            # publish unlocks
+            if nodes.unlocks:
+                self._emit(pipe, board_id, NodeUnlockMessage([node_id for node_id in nodes.unlocks]))
+
+            # Update board version and last_update_time as long as we're not deleting the board. If the
+            # board node itself was updated it has already been written with the new version.
+            if not board_delete and not any(node.id == board_id for node in nodes.updates):
+                layout.write_node(pipe, board_node)
+
+            if orders:
+                self._write_column_orders(pipe, *orders)
+
+            # Record which nodes changed in this version, see get_board_changes.
+            change_log_key = self._get_change_log_key(board_id)
+            if board_delete:
+                pipe.delete(change_log_key)
+            else:
+                changes = {node.id: board_node.version for node in nodes.deletes + nodes.updates}
+                changes[board_id] = board_node.version
+                pipe.zadd(change_log_key, changes)
+                pipe.zremrangebyscore(change_log_key, '-inf', board_node.version - self.change_log_retention)
+
+            pipe.execute()
+
+            # Update the corresponding index for the board as long as we didn't just delete it. Deleting a board
+            # removes its cards from the index along with the board.
+            if not board_delete:
+                self.index.update_board(board_node)
+                self._index_cards(board_id, nodes.updates, nodes.deletes)
+
+        return board_node
 
-        return node_dict
+    def _column_order_changes(self, layout, board_node, nodes):
+        """
+        :return: The column index members to remove and to add, and the columns to drop, for the cards and columns
+                 written or deleted on a board ordered by key.
+        """
+        cards = [node for node in nodes.updates + nodes.deletes if isinstance(node, ContentNode)]
+        deleted_ids = {node.id for node in nodes.deletes}
+        # Where the cards were is read back, since a batch may have moved a card before deleting it. The board version
+        # is WATCHed, so this reads what the transaction read.
+        stored = layout.read_nodes(self.reader, [card.id for card in cards]) if cards else []
 
-    def _get_node(self, node_id, pipe=None):
-        node_dict = pipe.hgetall(node_id) if pipe else self.client.hgetall(node_id)
-        for k, v in node_dict.items():
-            node_dict[k] = json.loads(v)['value']
+        removed = [(old.column_header, "%s %s" % (old.order, old.id)) for old in stored
+                   if old is not None and old.order is not None]
+        added = [(card.column_header, "%s %s" % (card.order, card.id)) for card in cards
+                 if card.id not in deleted_ids and card.order is not None]
+        dropped = [node.id for node in nodes.deletes if isinstance(node, ColumnHeaderNode)]
 
-        if not node_dict:
+        # Cards that kept their place, e.g. edited ones, are left alone.
+        return set(removed) - set(added), set(added) - set(removed), dropped
+
+    def _write_column_orders(self, pipe, removed, added, dropped):
+        for column_id, member in removed:
+            pipe.zrem(self._get_column_key(column_id), member)
+
+        for column_id, member in added:
+            pipe.zadd(self._get_column_key(column_id), {member: 0})
+
+        for column_id in dropped:
+            pipe.delete(self._get_column_key(column_id))
+
+    @staticmethod
+    def _stamp_node(node, board_node):
+        node.version = board_node.version
+        node.last_update_time = board_node.last_update_time
+
+        # update orig version if needed
+        if node.orig_version is None:
+            node.orig_version = node.version
+
+    def script_transaction(self, board_id, script, *args):
+        layout = self.board_layout(board_id)
+        if not layout.single_key:
+            raise UnsupportedScriptError("Board '%s' is stored in the '%s' layout." % (board_id, layout.name))
+
+        nodes, board_node = self._chain_scripts.run(script, layout, board_id,
+                                                    (self._get_change_log_key(board_id), self.change_log_retention),
+                                                    (self._get_publish_channel(board_id),
+                                                     self._get_event_stream_key(board_id), self.event_stream_length),
+                                                    unix_time_millis(datetime.now()), *args)
+
+        # Update the corresponding index for the board
+        self.index.update_board(board_node)
+        self._index_cards(board_id, nodes.updates, nodes.deletes)
+
+        return nodes
+
+    def _index_cards(self, board_id, updated_nodes, deleted_nodes):
+        cards = [node for node in updated_nodes if isinstance(node, ContentNode)]
+        removed_card_ids = [node.id for node in deleted_nodes if isinstance(node, ContentNode)]
+
+        if cards or removed_card_ids:
+            self.index.update_cards(board_id, cards, removed_card_ids)
+
+    def _get_snapshot(self, layout, board_id):
+        snapshot = self._snapshots.get(board_id)
+
+        if snapshot is None:
+            snapshot = self._snapshots[board_id] = layout.read_board(self.reader, board_id)
+
+        return snapshot
+
+    def _get_node(self, node_id):
+        board_id = board_id_from_node_id(node_id)
+        layout = self.board_layout(board_id)
+
+        if self._snapshots is not None and board_id in self._snapshots:
+            node = self._snapshots[board_id].get(node_id)
+        else:
+            node = layout.read_node(self.client, node_id)
+
+        return self._check_node(node_id, node)
+
+    @staticmethod
+    def _check_node(node_id, node):
+        if node is None:
             raise NodeNotFoundError("Node with id '%s' not found in database.", node_id)
 
-        return Node.from_dict(node_dict)
+        return node
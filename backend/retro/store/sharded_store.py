@@ -0,0 +1,151 @@
+import bisect
+import hashlib
+import threading
+from retro.store.store import Store, board_id_from_node_id
+
+
+class HashRing(object):
+    """
+    Consistent hash ring. Every shard is placed on the ring many times, so adding or removing a shard only moves the
+    keys of roughly one shard's share.
+    """
+    def __init__(self, shard_names, replicas=160):
+        self._ring = sorted((self._hash("%s#%s" % (name, i)), name) for name in shard_names for i in range(replicas))
+        self._hashes = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def get_shard(self, key):
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class ShardedStore(Store):
+    """
+    Spreads boards over several independent stores by board id. Everything about a board, including its transactions,
+    stays on the board's shard. Groups are kept on the first shard.
+    """
+    def __init__(self, shards):
+        """
+        :param shards: Stores by shard name. Names decide where boards live, so they must stay the same across restarts.
+        """
+        super(ShardedStore, self).__init__()
+        self.shards = dict(shards)
+        self._ring = HashRing(self.shards.keys())
+        self._primary = next(iter(self.shards.values()))
+
+    def shard(self, board_id):
+        return self.shards[self._ring.get_shard(board_id)]
+
+    def _node_shard(self, node_id):
+        return self.shard(board_id_from_node_id(node_id))
+
+    @property
+    def supports_scripts(self):
+        return all(store.supports_scripts for store in self.shards.values())
+
+    def transaction(self, board_id, func):
+        return self.shard(board_id).transaction(board_id, func)
+
+    def read_transaction(self, board_id, func):
+        return self.shard(board_id).read_transaction(board_id, func)
+
+    def script_transaction(self, board_id, script, *args):
+        return self.shard(board_id).script_transaction(board_id, script, *args)
+
+    def transaction_stats(self, board_id=None):
+        if board_id is not None:
+            return self.shard(board_id).transaction_stats(board_id)
+
+        stats = {}
+        for store in self.shards.values():
+            stats.update(store.transaction_stats())
+
+        return stats
+
+    @property
+    def index(self):
+        # Every shard writes the same index.
+        return self._primary.index
+
+    def index_stats(self):
+        # Every shard writes the same index.
+        return next(iter(self.shards.values())).index_stats()
+
+    def create_board(self, board_node):
+        return self.shard(board_node.id).create_board(board_node)
+
+    def remove_board(self, board_id):
+        return self.shard(board_id).remove_board(board_id)
+
+    def get_boards(self, filters=None, search_terms=None, start=0, count=20, sort_key=None, sort_order=None,
+                   cursor=None):
+        # Boards are listed from the index, which all shards share.
+        return self._primary.get_boards(filters=filters, search_terms=search_terms, start=start, count=count,
+                                        sort_key=sort_key, sort_order=sort_order, cursor=cursor)
+
+    def has_board(self, board_id):
+        return self.shard(board_id).has_board(board_id)
+
+    def search_cards(self, query, count=20, cursor=None):
+        return self._primary.search_cards(query, count=count, cursor=cursor)
+
+    def get_board_version(self, board_id):
+        return self.shard(board_id).get_board_version(board_id)
+
+    def get_board_changes(self, board_id, since_version):
+        return self.shard(board_id).get_board_changes(board_id, since_version)
+
+    def get_node(self, node_id):
+        return self._node_shard(node_id).get_node(node_id)
+
+    def get_nodes(self, node_ids):
+        by_shard = {}
+        for node_id in node_ids:
+            by_shard.setdefault(self._ring.get_shard(board_id_from_node_id(node_id)), []).append(node_id)
+
+        nodes = {}
+        for name, shard_node_ids in by_shard.items():
+            nodes.update(zip(shard_node_ids, self.shards[name].get_nodes(shard_node_ids)))
+
+        return [nodes[node_id] for node_id in node_ids]
+
+    def get_node_lock(self, node_id):
+        return self._node_shard(node_id).get_node_lock(node_id)
+
+    def get_group(self, group_id):
+        return self._primary.get_group(group_id)
+
+    def get_groups(self):
+        return self._primary.get_groups()
+
+    def remove_group(self, group_id):
+        return self._primary.remove_group(group_id)
+
+    def upsert_group(self, group_id, group_name):
+        return self._primary.upsert_group(group_id, group_name)
+
+    def update_listener(self, message_cb=lambda *x: True):
+        # Every shard publishes its own boards' events, so each one gets a listener.
+        stores = list(self.shards.values())
+        threads = [threading.Thread(target=store.update_listener, args=(message_cb,), daemon=True)
+                   for store in stores[1:]]
+
+        for thread in threads:
+            thread.start()
+
+        stores[0].update_listener(message_cb)
+
+        for thread in threads:
+            thread.join()
+
+    def follow_board(self, board_id):
+        return self.shard(board_id).follow_board(board_id)
+
+    def unfollow_board(self, board_id):
+        self.shard(board_id).unfollow_board(board_id)
+
+    def get_board_events(self, board_id, after_event_id, until_event_id='+'):
+        return self.shard(board_id).get_board_events(board_id, after_event_id, until_event_id)
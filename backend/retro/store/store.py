@@ -3,12 +3,26 @@ from typing import NamedTuple, List, Dict, Callable
 from retro.chain.node import Node, BoardNode
 
 
+def board_id_from_node_id(node_id):
+    # Child node ids are "<board_id>|<uuid>", and the board node's id is the board id itself.
+    return node_id.partition('|')[0]
+
+
 class TransactionNodes(NamedTuple):
     reads: list = []
     updates: list = []
     deletes: list = []
     locks: list = []
     unlocks: list = []
+    # Change to the board's stats, see retro.chain.stats.
+    stats: dict = None
+
+
+class BoardChanges(NamedTuple):
+    version: int
+    updates: list = []
+    # Ids of the deleted nodes
+    deletes: list = []
 
 
 class Group(NamedTuple):
@@ -20,6 +34,9 @@ class Group(NamedTuple):
 
 
 class Store(object):
+    # Whether script_transaction can run chain mutations atomically inside the store.
+    supports_scripts = False
+
     @staticmethod
     def next_node_id() -> str:
         return str(uuid.uuid4())
@@ -31,6 +48,24 @@ class Store(object):
     def transaction(self, board_id: str, func: Callable) -> List[Node]:
         raise NotImplementedError
 
+    def read_transaction(self, board_id: str, func: Callable) -> TransactionNodes:
+        """
+        Runs a func that only reads against a consistent view of the board. Stores that can serve such a view without
+        taking part in writers' transactions should override this.
+        """
+        return self.transaction(board_id, func)
+
+    def script_transaction(self, board_id: str, script: str, *args) -> TransactionNodes:
+        raise NotImplementedError
+
+    def transaction_stats(self, board_id: str=None) -> Dict:
+        # Per board transaction counters, for stores that keep any.
+        return {}
+
+    def index_stats(self) -> Dict:
+        # Counters of the board index writer, for stores that write the index behind transactions.
+        return {}
+
     def create_board(self, board_node: BoardNode) -> None:
         raise NotImplementedError
 
@@ -39,15 +74,33 @@ class Store(object):
 
     def get_boards(self, filters: Dict=None, search_terms: Dict=None,
                    start: int=0, count: int=20,
-                   sort_key: str=None, sort_order: str=None) -> List[Dict]:
+                   sort_key: str=None, sort_order: str=None, cursor: str=None) -> List[Dict]:
         raise NotImplementedError
 
     def has_board(self, board_id: str) -> bool:
         raise NotImplementedError
 
+    def search_cards(self, query: str, count: int=20, cursor: str=None) -> List[Dict]:
+        raise NotImplementedError
+
     def get_node(self, node_id: str) -> Node:
         raise NotImplementedError
 
+    def get_board_version(self, board_id: str) -> int:
+        # Stores should override this with something cheaper than reading the whole board node.
+        return self.get_node(board_id).version
+
+    def get_board_changes(self, board_id: str, since_version: int) -> BoardChanges:
+        """
+        Returns every node changed after since_version, or None when the store cannot tell, e.g. because since_version is
+        older than the changes the store keeps.
+        """
+        return None
+
+    def get_nodes(self, node_ids: List[str]) -> List[Node]:
+        # Stores that can batch reads should override this so a whole set of nodes costs a single round trip.
+        return [self.get_node(node_id) for node_id in node_ids]
+
     def get_group(self, group_id: str) -> Group:
         raise NotImplementedError
 
@@ -62,3 +115,21 @@ class Store(object):
 
     def update_listener(self, message_cb: Callable=None) -> None:
         raise NotImplementedError
+
+    def follow_board(self, board_id: str) -> str:
+        """
+        Starts passing the board's events to update_listener, for stores that only deliver events of followed boards.
+
+        :return: The id of the board's latest event, or None if the store's events cannot be replayed.
+        """
+        return None
+
+    def unfollow_board(self, board_id: str) -> None:
+        pass
+
+    def get_board_events(self, board_id: str, after_event_id: str, until_event_id: str='+') -> List:
+        """
+        Returns the events after after_event_id, up to and including until_event_id, as WebsocketMessages. None means
+        some of them are no longer kept and the board has to be reloaded.
+        """
+        return None
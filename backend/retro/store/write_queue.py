@@ -0,0 +1,247 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from retro.chain.node import ContentNode
+from retro.chain.stats import add_stats
+from retro.store.exceptions import NodeNotFoundError
+from retro.store.store import TransactionNodes
+
+
+class BoardWriteStats(object):
+    """
+    Transaction counters for one board in this process.
+    """
+    def __init__(self):
+        self.transactions = 0
+        self.batches = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def to_dict(self):
+        return {
+            "transactions": self.transactions,
+            "batches": self.batches,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": self.total_wait_ms / self.transactions if self.transactions else 0.0,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+
+class QueuedWrite(object):
+    def __init__(self, func):
+        self.func = func
+        self.enqueue_time = time.monotonic()
+        self.result = None
+        self.error = None
+        self.lead = False
+        self.ready = threading.Event()
+
+    def get(self):
+        if self.error is not None:
+            raise self.error
+
+        return self.result
+
+
+class BoardWriteQueue(object):
+    """
+    Serializes transactions per board within this process. The first caller for a board becomes the leader and hands
+    everything queued behind it to commit_batch in one go, so writers in the same process never WATCH against each
+    other. When a batch is done the next waiting caller leads the following one.
+    """
+    # Boards whose counters are kept. The least recently written boards beyond that are forgotten, unless they still
+    # have writes queued.
+    STATS_CACHE_SIZE = 10000
+
+    def __init__(self, max_batch_size=64, stats_cache_size=STATS_CACHE_SIZE):
+        self.max_batch_size = max_batch_size
+        self.stats_cache_size = stats_cache_size
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._stats = OrderedDict()
+
+    def submit(self, board_id, func, commit_batch):
+        """
+        Queues func for board_id and waits for it to be committed.
+
+        :param commit_batch: Called as commit_batch(board_id, entries) by the leader. It must set each entry's result or
+                             error.
+        :return: The entry's result.
+        """
+        entry = QueuedWrite(func)
+
+        with self._lock:
+            stats = self._stats.setdefault(board_id, BoardWriteStats())
+            self._stats.move_to_end(board_id)
+            self._evict_stats()
+            queue = self._queues.get(board_id)
+
+            if queue is None:
+                queue = self._queues[board_id] = deque()
+                entry.lead = True
+
+            queue.append(entry)
+            stats.queue_depth = len(queue)
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+
+        if not entry.lead:
+            entry.ready.wait()
+
+        if entry.lead:
+            self._lead(board_id, commit_batch)
+
+        return entry.get()
+
+    def stats(self, board_id=None):
+        with self._lock:
+            if board_id is not None:
+                stats = self._stats.get(board_id)
+                return stats.to_dict() if stats else {}
+
+            return {board_id: stats.to_dict() for board_id, stats in self._stats.items()}
+
+    def _evict_stats(self):
+        excess = len(self._stats) - self.stats_cache_size
+        if excess <= 0:
+            return
+
+        # At most every queued board is older than the ones to forget.
+        oldest = islice(self._stats, excess + len(self._queues))
+        for board_id in [board_id for board_id in oldest if board_id not in self._queues][:excess]:
+            del self._stats[board_id]
+
+    def record_retry(self, board_id):
+        with self._lock:
+            self._stats[board_id].retries += 1
+
+    def record_timeout(self, board_id):
+        with self._lock:
+            self._stats[board_id].timeouts += 1
+
+    def _lead(self, board_id, commit_batch):
+        now = time.monotonic()
+
+        with self._lock:
+            queue = self._queues[board_id]
+            batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch_size))]
+
+            stats = self._stats[board_id]
+            stats.batches += 1
+            stats.transactions += len(batch)
+            stats.queue_depth = len(queue)
+            for entry in batch:
+                wait_ms = (now - entry.enqueue_time) * 1000
+                stats.total_wait_ms += wait_ms
+                stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+
+        try:
+            commit_batch(board_id, batch)
+        except Exception as err:
+            # Nothing was committed, so every caller fails. Callers whose own function failed keep that error.
+            for entry in batch:
+                entry.result = None
+                entry.error = entry.error or err
+        finally:
+            with self._lock:
+                if queue:
+                    queue[0].lead = True
+                    queue[0].ready.set()
+                else:
+                    del self._queues[board_id]
+
+            for entry in batch:
+                entry.ready.set()
+
+
+class BatchProxy(object):
+    """
+    Lets several transaction functions run against one store proxy as if each had been committed before the next one
+    started. Nodes written, deleted, locked or unlocked by earlier functions are served from an overlay, and every read
+    is a copy so a function that fails leaves nothing behind.
+    """
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self._updates = {}
+        self._deletes = {}
+        self._locks = {}
+        self._unlocks = set()
+        self._stats = None
+
+    def next_node_id(self):
+        return self.proxy.next_node_id()
+
+    def get_node(self, node_id):
+        return self.get_nodes([node_id])[0]
+
+    def get_nodes(self, node_ids):
+        for node_id in node_ids:
+            if node_id in self._deletes:
+                raise NodeNotFoundError("Node with id '%s' not found in database.", node_id)
+
+        missing = [node_id for node_id in node_ids if node_id not in self._updates]
+        fetched = dict(zip(missing, self.proxy.get_nodes(missing))) if missing else {}
+
+        # The proxy may hand out the same node object twice (see RedisStore snapshots), so fetched nodes are copied too.
+        return [copy.deepcopy(self._updates[node_id] if node_id in self._updates else fetched[node_id])
+                for node_id in node_ids]
+
+    def get_column_orders(self, column_id, after=None, count=None):
+        changed = {node.id for node in list(self._updates.values()) + list(self._deletes.values())
+                   if isinstance(node, ContentNode)}
+        if not changed:
+            return self.proxy.get_column_orders(column_id, after, count)
+
+        # Cards written by earlier functions are placed where they were written.
+        entries = [entry for entry in self.proxy.get_column_orders(column_id, after) if entry[1] not in changed]
+        entries.extend((node.order, node.id) for node in self._updates.values()
+                       if isinstance(node, ContentNode) and node.order is not None and node.column_header == column_id
+                       and (after is None or node.order > after))
+        entries.sort()
+
+        return entries[:count] if count is not None else entries
+
+    def get_node_lock(self, node_id):
+        if node_id in self._locks:
+            return self._locks[node_id]
+
+        if node_id in self._unlocks:
+            return None
+
+        return self.proxy.get_node_lock(node_id)
+
+    def apply(self, nodes):
+        for node in nodes.deletes:
+            self._updates.pop(node.id, None)
+            self._deletes[node.id] = node
+
+        for node in nodes.updates:
+            self._updates[node.id] = copy.deepcopy(node)
+
+        for node_id, lock_value in nodes.locks:
+            self._unlocks.discard(node_id)
+            self._locks[node_id] = lock_value
+
+        for node_id in nodes.unlocks:
+            self._locks.pop(node_id, None)
+            self._unlocks.add(node_id)
+
+        self._stats = add_stats(self._stats, nodes.stats)
+
+    def merged(self):
+        """
+        :return: The combined effect of every applied function as a single TransactionNodes.
+        """
+        return TransactionNodes(updates=list(self._updates.values()),
+                                deletes=list(self._deletes.values()),
+                                locks=list(self._locks.items()),
+                                unlocks=list(self._unlocks),
+                                stats=self._stats)
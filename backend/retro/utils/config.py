@@ -7,12 +7,28 @@ class Config(object):
         self.retro_api_port = 8880
         self.redis_host = None
         self.redis_port = None
+        self.redis_mode = "standalone"
+        self.redis_shards = None
+        self.redis_layout = "node"
+        self.redis_codec = "envelope"
+        self.redis_scripts = "false"
+        self.redis_transaction_timeout = "10"
+        self.redis_change_log_versions = "1000"
+        self.redis_event_stream_length = "0"
+        self.mem_store_path = None
+        self.mem_store_codec = "msgpack"
+        self.mem_store_snapshot_records = "10000"
         self.mongo_host = None
         self.mongo_port = None
+        self.index_flush_interval = "0.05"
+        self.board_existence_cache_size = "100000"
         self.websocket_host = "0.0.0.0"
         self.websocket_port = 4215
         self.flask_secret = "secret!"
         self.template_config = None
+        # "keys" orders the cards of new boards by key instead of linking them, see retro.chain.order.
+        self.board_ordering = None
+        self.board_cache_bytes = 64 * 1024 * 1024
 
     @staticmethod
     def from_env():
@@ -2,6 +2,7 @@ import eventlet
 eventlet.monkey_patch()
 
 import logging
+from collections import defaultdict
 from threading import Lock
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
@@ -35,6 +36,8 @@ app, socketio = buildapp_from_config(cfg_)
 board_engine = BoardEngine(cfg_, get_store(cfg_))
 thread = None
 thread_lock = Lock()
+# Sids subscribed to each board. Boards are only followed while someone is subscribed to them.
+subscribers = defaultdict(set)
 
 
 @app.route('/')
@@ -62,6 +65,9 @@ def test_connect():
 
 @socketio.on('disconnect', namespace=namespace)
 def test_disconnect():
+    for board_id in list(subscribers):
+        _remove_subscriber(board_id, request.sid)
+
     _logger.debug("Client '%s' successfully disconnected", request.sid)
 
 
@@ -79,14 +85,28 @@ def subscribe(message):
         raise ValueError("No board provided!")
 
     # Ensure board exists before we create a room for it
-    #if not board_engine.has_board(board_id):
-    #    raise ValueError("Board '%s' does not exist!" % board_id)
+    if not board_engine.has_board(board_id):
+        raise ValueError("Board '%s' does not exist!" % board_id)
 
     join_room(board_id)
+    with thread_lock:
+        subscribers[board_id].add(request.sid)
+        last_event_id = board_engine.follow_board(board_id)
+
+    reload = False
+
+    # A reconnecting client gets the events it missed instead of reloading the whole board.
+    if message.get("last_event_id") and last_event_id:
+        missed = board_engine.get_board_events(board_id, message["last_event_id"], last_event_id)
+        if missed is None:
+            reload = True
+        else:
+            for missed_message in missed:
+                emit(missed_message.type, missed_message.client_data)
 
     _logger.debug("Subscribed to board '%s'. [USER=%s]\n  ROOMS=%s" %
                   (board_id, request.sid, socketio.server.manager.get_rooms(request.sid, namespace)))
-    emit('subscribe_response', {'board_id': board_id})
+    emit('subscribe_response', {'board_id': board_id, 'last_event_id': last_event_id, 'reload': reload})
 
 
 @socketio.on('unsubscribe', namespace=namespace)
@@ -94,9 +114,22 @@ def unsubscribe(message):
     board_id = message['board_id']
     _logger.debug("Unsubscribing from board '%s'...", board_id)
     leave_room(board_id)
+    _remove_subscriber(board_id, request.sid)
     emit('unsubscribe_response', {'board_id': board_id})
 
 
+def _remove_subscriber(board_id, sid):
+    with thread_lock:
+        board_subscribers = subscribers.get(board_id)
+        if board_subscribers is None or sid not in board_subscribers:
+            return
+
+        board_subscribers.discard(sid)
+        if not board_subscribers:
+            del subscribers[board_id]
+            board_engine.unfollow_board(board_id)
+
+
 @socketio.on('my_ping', namespace=namespace)
 def ping_pong():
     emit('my_pong')
@@ -105,7 +138,7 @@ def ping_pong():
 def message_cb(message, board_id):
     should_keep_listening = True
     _logger.debug("Processing '%s' event for board '%s'. Event data: '%s'.", message.type, board_id, message.data)
-    socketio.emit(message.type, message.data, namespace=namespace, room=board_id)
+    socketio.emit(message.type, message.client_data, namespace=namespace, room=board_id)
 
     return should_keep_listening
 
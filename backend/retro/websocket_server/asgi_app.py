@@ -0,0 +1,130 @@
+"""
+Asyncio version of the websocket server in app.py. It serves the same Socket.IO events without eventlet's monkey
+patching, reading boards and events through AsyncRedisStore. Run it under any ASGI server, e.g.
+
+    uvicorn retro.websocket_server.asgi_app:app --host 0.0.0.0 --port 4215
+
+or directly with python, which uses uvicorn.
+"""
+import logging
+from collections import defaultdict
+import socketio
+from retro.store import get_async_store
+from retro.utils.config import Config
+from retro.utils.retro_logging import setup_basic_logging
+from retro.websocket_server import namespace
+
+_logger = logging.getLogger(__name__)
+
+
+def buildapp_from_config(cfg):
+    setup_basic_logging(level=logging.DEBUG)
+    logging.getLogger("socketio").setLevel(logging.WARNING)
+    logging.getLogger("engineio").setLevel(logging.WARNING)
+
+    _socket_io = socketio.AsyncServer(async_mode="asgi")
+
+    return socketio.ASGIApp(_socket_io), _socket_io
+
+
+cfg_ = Config.from_env()
+app, sio = buildapp_from_config(cfg_)
+store = get_async_store(cfg_)
+listener = None
+# Sids subscribed to each board. Boards are only followed while someone is subscribed to them.
+subscribers = defaultdict(set)
+
+
+@sio.on('connect', namespace=namespace)
+async def connect(sid, _environ):
+    global listener
+
+    if listener is None:
+        _logger.debug("Starting update listener task...")
+        listener = sio.start_background_task(store.update_listener, message_cb)
+
+    await sio.emit('connect_response', {'data': 'Connected'}, room=sid, namespace=namespace)
+    _logger.debug("Connection successful for sid '%s'!", sid)
+
+
+@sio.on('disconnect', namespace=namespace)
+async def disconnect(sid, *_args):
+    for board_id in list(subscribers):
+        _remove_subscriber(board_id, sid)
+
+    _logger.debug("Client '%s' successfully disconnected", sid)
+
+
+@sio.on('disconnect_request', namespace=namespace)
+async def disconnect_request(sid):
+    _logger.debug("Disconnect request received from client '%s'.", sid)
+    await sio.emit('disconnect_response', {'data': 'Disconnected!'}, room=sid, namespace=namespace)
+    await sio.disconnect(sid, namespace=namespace)
+
+
+@sio.on('subscribe', namespace=namespace)
+async def subscribe(sid, message):
+    board_id = message.get("board_id")
+    if not board_id:
+        raise ValueError("No board provided!")
+
+    # Ensure board exists before we create a room for it
+    if not await store.has_board(board_id):
+        raise ValueError("Board '%s' does not exist!" % board_id)
+
+    await sio.enter_room(sid, board_id, namespace=namespace)
+    subscribers[board_id].add(sid)
+    last_event_id = await store.follow_board(board_id)
+
+    reload = False
+
+    # A reconnecting client gets the events it missed instead of reloading the whole board.
+    if message.get("last_event_id") and last_event_id:
+        missed = await store.get_board_events(board_id, message["last_event_id"], last_event_id)
+        if missed is None:
+            reload = True
+        else:
+            for missed_message in missed:
+                await sio.emit(missed_message.type, missed_message.client_data, room=sid, namespace=namespace)
+
+    _logger.debug("Subscribed to board '%s'. [USER=%s]", board_id, sid)
+    await sio.emit('subscribe_response', {'board_id': board_id, 'last_event_id': last_event_id, 'reload': reload},
+                   room=sid, namespace=namespace)
+
+
+@sio.on('unsubscribe', namespace=namespace)
+async def unsubscribe(sid, message):
+    board_id = message['board_id']
+    _logger.debug("Unsubscribing from board '%s'...", board_id)
+    await sio.leave_room(sid, board_id, namespace=namespace)
+    _remove_subscriber(board_id, sid)
+    await sio.emit('unsubscribe_response', {'board_id': board_id}, room=sid, namespace=namespace)
+
+
+def _remove_subscriber(board_id, sid):
+    board_subscribers = subscribers.get(board_id)
+    if board_subscribers is None or sid not in board_subscribers:
+        return
+
+    board_subscribers.discard(sid)
+    if not board_subscribers:
+        del subscribers[board_id]
+        store.unfollow_board(board_id)
+
+
+@sio.on('my_ping', namespace=namespace)
+async def ping_pong(sid):
+    await sio.emit('my_pong', room=sid, namespace=namespace)
+
+
+async def message_cb(message, board_id):
+    should_keep_listening = True
+    _logger.debug("Processing '%s' event for board '%s'. Event data: '%s'.", message.type, board_id, message.data)
+    await sio.emit(message.type, message.client_data, namespace=namespace, room=board_id)
+
+    return should_keep_listening
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=cfg_.websocket_host, port=int(cfg_.websocket_port), log_level="warning")
@@ -23,11 +23,20 @@ class WebsocketMessage(object):
 
     def __init__(self, data):
         self._raw_data = data
+        self.event_id = None
 
     @property
     def data(self):
         return self._raw_data
 
+    @property
+    def client_data(self):
+        # Clients keep the id of the last event they saw so they can catch up after reconnecting.
+        if self.event_id:
+            return dict(self.data, event_id=self.event_id)
+
+        return self.data
+
     def encode(self):
         return json.dumps(self.to_dict())
 
@@ -13,7 +13,7 @@ import docker
 
 def create_redis_container():
     client = docker.from_env(assert_hostname=False)
-    container = client.containers.run("redis:4", detach=True)
+    container = client.containers.run("redis:6", detach=True)
 
     # Wait for db to be ready
     #while not _check_db_ready(container):
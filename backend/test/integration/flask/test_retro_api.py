@@ -66,6 +66,23 @@ def test_import_board(client):
     assert sorted(expected_node_ids) == sorted(actual_node_ids)
 
 
+def test_create_nodes_batch(client):
+    board_id = _create_board(client).get("id")
+    column_id = _create_node(client, board_id, board_id).get("id")
+
+    rv = client.post("/api/v1/boards/%s/nodes:batch" % board_id,
+                     json={"parent_id": column_id, "contents": [{"text": "card %s" % i} for i in range(3)]})
+    assert 200 == rv.status_code
+    nodes = rv.json.get("nodes")
+
+    assert ["card 0", "card 1", "card 2"] == [node["content"]["text"] for node in nodes]
+    assert nodes[0]["id"] == _get_node(client, board_id, column_id).get("child")
+    assert nodes[1]["id"] == nodes[0]["child"]
+
+    rv = client.post("/api/v1/boards/%s/nodes:batch" % board_id, json={"parent_id": column_id, "contents": "card"})
+    assert 400 == rv.status_code
+
+
 def _create_simple_board(client):
     create_board_response = _create_board(client)
     board_id = create_board_response.get("id")
@@ -121,7 +138,7 @@ def _create_node(client, board_id, parent_id):
 
 def _create_board(client, name="my test board"):
     route = "/api/v1/boards"
-    data = {"name": name}
+    data = {"content": {"name": name}}
 
     rv = client.post(route, json=data)
     assert 200 == rv.status_code
@@ -1,22 +1,25 @@
 
 import unittest
-from retro.store.mem_store import MemStore
+from unittest import mock
+from retro.store.mem_store import MemProxy, MemStore
 from retro.chain.board import Board
+from retro.chain.exceptions import UnsupportedMoveError
 from retro.chain.node import ColumnHeaderNode, ContentNode, BoardNode
 from retro.chain.operations import SetOperation, IncrementOperation, DeleteOperation
 
 
 class TestBoard(unittest.TestCase):
     def setUp(self):
-        default_nodes = {"root": BoardNode("root", {"test": "RootContent"}, 1, None, {'column_a', 'column_b'}).to_dict(),
-                         "column_a": ColumnHeaderNode("column_a", {"test": "ColumnA"}, 1, None, "root", "node_1").to_dict(),
-                         "column_b": ColumnHeaderNode("column_b", {"test": "ColumnB"}, 1, None, "root", "node_5").to_dict(),
-                         "node_1": ContentNode("node_1", {"test": "Node1"}, 1, None, "column_a", "node_2", "column_a").to_dict(),
-                         "node_2": ContentNode("node_2", {"test": "Node2"}, 1, None, "node_1", "node_3", "column_a").to_dict(),
-                         "node_3": ContentNode("node_3", {"test": "Node3"}, 1, None, "node_2", "node_4", "column_a").to_dict(),
-                         "node_4": ContentNode("node_4", {"test": "Node4"}, 1, None, "node_3", None, "column_a").to_dict(),
-                         "node_5": ContentNode("node_5", {"test": "Node5"}, 1, None, "column_b", "node_6", "column_b").to_dict(),
-                         "node_6": ContentNode("node_6", {"test": "Node6"}, 1, None, "node_5", None, "column_b").to_dict()}
+        default_nodes = {"root": BoardNode("root", content={"test": "RootContent"}, children={'root|column_a', 'root|column_b'}).to_dict(),
+                         "root|column_a": ColumnHeaderNode("root|column_a", content={"test": "ColumnA"}, parent="root", child="root|node_1").to_dict(),
+                         "root|column_b": ColumnHeaderNode("root|column_b", content={"test": "ColumnB"}, parent="root", child="root|node_5").to_dict(),
+                         "root|node_1": ContentNode("root|node_1", content={"test": "Node1"}, parent="root|column_a", child="root|node_2", column_header="root|column_a").to_dict(),
+                         "root|node_2": ContentNode("root|node_2", content={"test": "Node2"}, parent="root|node_1", child="root|node_3", column_header="root|column_a").to_dict(),
+                         "root|node_3": ContentNode("root|node_3", content={"test": "Node3"}, parent="root|node_2", child="root|node_4", column_header="root|column_a").to_dict(),
+                         "root|node_4": ContentNode("root|node_4", content={"test": "Node4"}, parent="root|node_3", child=None, column_header="root|column_a").to_dict(),
+                         "root|node_5": ContentNode("root|node_5", content={"test": "Node5"}, parent="root|column_b", child="root|node_6", column_header="root|column_b").to_dict(),
+                         "root|node_6": ContentNode("root|node_6", content={"test": "Node6"}, parent="root|node_5", child=None, column_header="root|column_b").to_dict()}
+        self.default_nodes = default_nodes
         self.store = MemStore(default_nodes)
 
     def test_populate_chain(self):
@@ -24,45 +27,124 @@ class TestBoard(unittest.TestCase):
 
         self.assertEqual(9, len(chain.nodes()))
 
-        self.assertEqual(BoardNode('root', content={"test": "RootContent"}, version=1, children={'column_a', 'column_b'}),
-                         chain.get_node('root'))
+        self.assertEqual(BoardNode('root', content={"test": "RootContent"}, version=1, children={'root|column_a', 'root|column_b'}).to_dict(),
+                         chain.get_node('root').to_dict())
 
-        self.assertEqual(ColumnHeaderNode('column_a', content={"test": "ColumnA"}, version=1, parent="root", child="node_1"),
-                         chain.get_node('column_a'))
+        self.assertEqual(ColumnHeaderNode('root|column_a', content={"test": "ColumnA"}, version=1, parent="root", child="root|node_1").to_dict(),
+                         chain.get_node('root|column_a').to_dict())
 
-        self.assertEqual(ContentNode('node_1', content={"test": "Node1"}, version=1, parent="column_a",
-                                     child="node_2", column_header="column_a"),
-                         chain.get_node('node_1'))
+        self.assertEqual(ContentNode('root|node_1', content={"test": "Node1"}, version=1, parent="root|column_a",
+                                     child="root|node_2", column_header="root|column_a").to_dict(),
+                         chain.get_node('root|node_1').to_dict())
 
-        self.assertEqual(ContentNode('node_2', content={"test": "Node2"}, version=1, parent="node_1",
-                                     child="node_3", column_header="column_a"),
-                         chain.get_node('node_2'))
+        self.assertEqual(ContentNode('root|node_2', content={"test": "Node2"}, version=1, parent="root|node_1",
+                                     child="root|node_3", column_header="root|column_a").to_dict(),
+                         chain.get_node('root|node_2').to_dict())
 
-        self.assertEqual(ContentNode('node_3', content={"test": "Node3"}, version=1, parent="node_2",
-                                     child="node_4", column_header="column_a"),
-                         chain.get_node('node_3'))
+        self.assertEqual(ContentNode('root|node_3', content={"test": "Node3"}, version=1, parent="root|node_2",
+                                     child="root|node_4", column_header="root|column_a").to_dict(),
+                         chain.get_node('root|node_3').to_dict())
 
-        self.assertEqual(ContentNode('node_4', content={"test": "Node4"}, version=1, parent="node_3",
-                                     child=None, column_header="column_a"),
-                         chain.get_node('node_4'))
+        self.assertEqual(ContentNode('root|node_4', content={"test": "Node4"}, version=1, parent="root|node_3",
+                                     child=None, column_header="root|column_a").to_dict(),
+                         chain.get_node('root|node_4').to_dict())
 
-        self.assertEqual(ColumnHeaderNode('column_b', content={"test": "ColumnB"}, version=1, parent="root", child="node_5"),
-                         chain.get_node('column_b'))
+        self.assertEqual(ColumnHeaderNode('root|column_b', content={"test": "ColumnB"}, version=1, parent="root", child="root|node_5").to_dict(),
+                         chain.get_node('root|column_b').to_dict())
 
-        self.assertEqual(ContentNode('node_5', content={"test": "Node5"}, version=1, parent="column_b",
-                                     child="node_6", column_header="column_b"),
-                         chain.get_node('node_5'))
+        self.assertEqual(ContentNode('root|node_5', content={"test": "Node5"}, version=1, parent="root|column_b",
+                                     child="root|node_6", column_header="root|column_b").to_dict(),
+                         chain.get_node('root|node_5').to_dict())
 
-        self.assertEqual(ContentNode('node_6', content={"test": "Node6"}, version=1, parent="node_5",
-                                     child=None, column_header="column_b"),
-                         chain.get_node('node_6'))
+        self.assertEqual(ContentNode('root|node_6', content={"test": "Node6"}, version=1, parent="root|node_5",
+                                     child=None, column_header="root|column_b").to_dict(),
+                         chain.get_node('root|node_6').to_dict())
+
+    def test_nodes_fetched_per_level(self):
+        chain = Board(self.store, 'root')
+        frontiers = []
+        get_nodes = MemProxy.get_nodes
+
+        def _get_nodes(proxy, node_ids):
+            frontiers.append(list(node_ids))
+            return get_nodes(proxy, node_ids)
+
+        with mock.patch.object(MemProxy, 'get_nodes', _get_nodes):
+            nodes = chain.nodes()
+
+        self.assertEqual(6, len(frontiers))
+        self.assertEqual(['root'], frontiers[0])
+        self.assertEqual({'root|column_a', 'root|column_b'}, set(frontiers[1]))
+        self.assertEqual(['root|node_4'], frontiers[-1])
+
+        expected_ids = ['root']
+        for column_id in self.store.get_node('root').children:
+            node_id = column_id
+            while node_id:
+                expected_ids.append(node_id)
+                node_id = self.store.get_node(node_id).child
+
+        self.assertEqual(expected_ids, [node.id for node in nodes])
+
+    def test_long_column(self):
+        nodes = {"long_root": BoardNode("long_root", content={}, children={"long_root|long_column"}).to_dict(),
+                 "long_root|long_column": ColumnHeaderNode("long_root|long_column", content={}, parent="long_root",
+                                                 child="long_root|long_1").to_dict()}
+        for i in range(1, 3001):
+            nodes["long_root|long_%s" % i] = ContentNode("long_root|long_%s" % i, content={}, parent="long_root|long_%s" % (i - 1) if i > 1 else "long_root|long_column",
+                                               child="long_root|long_%s" % (i + 1) if i < 3000 else None,
+                                               column_header="long_root|long_column").to_dict()
+        self.store = MemStore(dict(self.default_nodes, **nodes))
+        chain = Board(self.store, 'long_root')
+
+        self.assertEqual(["long_root", "long_root|long_column"] + ["long_root|long_%s" % i for i in range(1, 3001)],
+                         [node.id for node in chain.nodes()])
+
+        reads = []
+        get_node = MemProxy.get_node
+
+        def _get_node(proxy, node_id):
+            reads.append(node_id)
+            return get_node(proxy, node_id)
+
+        with mock.patch.object(MemProxy, 'get_node', _get_node):
+            node = chain.add_node('creator', {'test': 'new_content'}, 'long_root|long_3000')
+        self.assertEqual("long_root|long_column", node.column_header)
+        # The column comes from the card above, not from walking up the column.
+        self.assertEqual(["long_root|long_3000"], reads)
+
+        deleted = chain.remove_node("long_root|long_2", True)
+        self.assertEqual(3000, len(deleted))
+        self.assertEqual(None, self.store.get_node("long_root|long_1").child)
+
+    def test_column_headers_repaired(self):
+        self.default_nodes["root|node_2"]["column_header"] = "root|column_b"
+        self.default_nodes["root|node_3"]["column_header"] = "root|column_b"
+        self.default_nodes["root|node_6"]["column_header"] = None
+        self.store = MemStore(self.default_nodes)
+        chain = Board(self.store, 'root')
+
+        # Cards written without a column are still added to the right one.
+        self.assertEqual("root|column_b", chain.add_node('creator', {'test': 'new_content'}, 'root|node_6').column_header)
+
+        self.assertEqual(["root|node_2", "root|node_3", "root|node_6"], sorted(node.id for node in chain.check_column_headers()))
+        self.assertEqual("root|column_b", self.store.get_node("root|node_2").column_header)
+
+        repaired = chain.repair_column_headers()
+        self.assertEqual({"root|node_2": "root|column_a", "root|node_3": "root|column_a", "root|node_6": "root|column_b"},
+                         {node.id: node.column_header for node in repaired})
+        self.assertEqual("root|column_a", self.store.get_node("root|node_3").column_header)
+        self.assertEqual([], chain.check_column_headers())
+        self.assertEqual({"root|column_a": 4, "root|column_b": 3},
+                         {column_id: column["cards"]
+                          for column_id, column in self.store.get_node("root").stats["columns"].items()})
 
     def test_add_node_to_root(self):
         chain = Board(self.store, 'root')
 
-        node = chain.add_node('new_content', 'root')
+        node = chain.add_node('creator', {'test': 'new_content'}, 'root')
 
-        self.assertEqual({'column_a', 'column_b', node.id},
+        self.assertEqual({'root|column_a', 'root|column_b', node.id},
                          self.store.get_node('root').children)
         self.assertEqual(node.to_dict(),
                          self.store.get_node(node.id).to_dict())
@@ -70,161 +152,258 @@ class TestBoard(unittest.TestCase):
     def test_add_node_to_column_end(self):
         chain = Board(self.store, 'root')
 
-        node = chain.add_node('new_content', 'node_4')
+        node = chain.add_node('creator', {'test': 'new_content'}, 'root|node_4')
 
         self.assertEqual(node.id,
-                         self.store.get_node('node_4').child)
-        self.assertEqual('node_4',
+                         self.store.get_node('root|node_4').child)
+        self.assertEqual('root|node_4',
                          node.parent)
 
     def test_add_node_between_nodes(self):
         chain = Board(self.store, 'root')
 
-        node = chain.add_node('new_content', 'node_1')
+        node = chain.add_node('creator', {'test': 'new_content'}, 'root|node_1')
 
         self.assertEqual(node.id,
-                         self.store.get_node('node_1').child)
-        self.assertEqual('node_1',
+                         self.store.get_node('root|node_1').child)
+        self.assertEqual('root|node_1',
                          node.parent)
-        self.assertEqual('node_2',
+        self.assertEqual('root|node_2',
                          node.child)
         self.assertEqual(node.id,
-                         self.store.get_node('node_2').parent)
+                         self.store.get_node('root|node_2').parent)
 
     def test_move_node_new_column(self):
         chain = Board(self.store, 'root')
 
-        nodes = chain.move_node("node_2", "node_5")
+        nodes = chain.move_node("root|node_2", "root|node_5")
 
         self.assertEqual(5, len(nodes))
-        self.assertEqual("node_5", self.store.get_node("node_2").parent)
-        self.assertEqual("node_2", self.store.get_node("node_5").child)
-        self.assertEqual("node_6", self.store.get_node("node_2").child)
-        self.assertEqual("node_2", self.store.get_node("node_6").parent)
-        self.assertEqual("node_3", self.store.get_node("node_1").child)
-        self.assertEqual("node_1", self.store.get_node("node_3").parent)
+        self.assertEqual("root|node_5", self.store.get_node("root|node_2").parent)
+        self.assertEqual("root|node_2", self.store.get_node("root|node_5").child)
+        self.assertEqual("root|node_6", self.store.get_node("root|node_2").child)
+        self.assertEqual("root|node_2", self.store.get_node("root|node_6").parent)
+        self.assertEqual("root|node_3", self.store.get_node("root|node_1").child)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_3").parent)
 
     def test_move_node_swap_down(self):
         chain = Board(self.store, 'root')
 
-        nodes = chain.move_node("node_1", "node_2")
+        nodes = chain.move_node("root|node_1", "root|node_2")
 
         self.assertEqual(4, len(nodes))
-        self.assertEqual("column_a", self.store.get_node("node_2").parent)
-        self.assertEqual("node_1", self.store.get_node("node_2").child)
+        self.assertEqual("root|column_a", self.store.get_node("root|node_2").parent)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_2").child)
 
-        self.assertEqual("node_2", self.store.get_node("node_1").parent)
-        self.assertEqual("node_3", self.store.get_node("node_1").child)
+        self.assertEqual("root|node_2", self.store.get_node("root|node_1").parent)
+        self.assertEqual("root|node_3", self.store.get_node("root|node_1").child)
 
-        self.assertEqual("node_1", self.store.get_node("node_3").parent)
-        self.assertEqual("node_4", self.store.get_node("node_3").child)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_3").parent)
+        self.assertEqual("root|node_4", self.store.get_node("root|node_3").child)
 
-        self.assertEqual("node_2", self.store.get_node("column_a").child)
+        self.assertEqual("root|node_2", self.store.get_node("root|column_a").child)
 
     def test_move_node_swap_up(self):
         chain = Board(self.store, 'root')
 
-        nodes = chain.move_node("node_2", "column_a")
+        nodes = chain.move_node("root|node_2", "root|column_a")
 
         self.assertEqual(4, len(nodes))
-        self.assertEqual("column_a", self.store.get_node("node_2").parent)
-        self.assertEqual("node_1", self.store.get_node("node_2").child)
+        self.assertEqual("root|column_a", self.store.get_node("root|node_2").parent)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_2").child)
 
-        self.assertEqual("node_2", self.store.get_node("node_1").parent)
-        self.assertEqual("node_3", self.store.get_node("node_1").child)
+        self.assertEqual("root|node_2", self.store.get_node("root|node_1").parent)
+        self.assertEqual("root|node_3", self.store.get_node("root|node_1").child)
 
-        self.assertEqual("node_1", self.store.get_node("node_3").parent)
-        self.assertEqual("node_4", self.store.get_node("node_3").child)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_3").parent)
+        self.assertEqual("root|node_4", self.store.get_node("root|node_3").child)
 
-        self.assertEqual("node_2", self.store.get_node("column_a").child)
+        self.assertEqual("root|node_2", self.store.get_node("root|column_a").child)
 
     def test_edit_node_set_not_exists(self):
         chain = Board(self.store, 'root')
 
         op = SetOperation("foo", "bar")
-        node = chain.edit_node("node_2", [op])
+        node = chain.edit_node("root|node_2", [op])
         self.assertEqual("bar", node.content.get("foo"))
-        self.assertEqual("bar", self.store.get_node("node_2").content.get("foo"))
+        self.assertEqual("bar", self.store.get_node("root|node_2").content.get("foo"))
 
     def test_edit_node_set_exists(self):
         chain = Board(self.store, 'root')
 
-        chain.edit_node("node_2", [SetOperation("foo", "bar")])
-        node = chain.edit_node("node_2", [SetOperation("foo", "baz")])
+        chain.edit_node("root|node_2", [SetOperation("foo", "bar")])
+        node = chain.edit_node("root|node_2", [SetOperation("foo", "baz")])
         self.assertEqual("baz", node.content.get("foo"))
-        self.assertEqual("baz", self.store.get_node("node_2").content.get("foo"))
+        self.assertEqual("baz", self.store.get_node("root|node_2").content.get("foo"))
 
     def test_edit_node_incr_not_exists(self):
         chain = Board(self.store, 'root')
 
-        node = chain.edit_node("node_2", [IncrementOperation("foo", 1)])
+        node = chain.edit_node("root|node_2", [IncrementOperation("foo", 1)])
         self.assertEqual(1, node.content.get("foo"))
-        self.assertEqual(1, self.store.get_node("node_2").content.get("foo"))
+        self.assertEqual(1, self.store.get_node("root|node_2").content.get("foo"))
 
     def test_edit_node_incr_exists(self):
         chain = Board(self.store, 'root')
 
-        chain.edit_node("node_2", [IncrementOperation("foo", 1)])
-        node = chain.edit_node("node_2", [IncrementOperation("foo", 4)])
+        chain.edit_node("root|node_2", [IncrementOperation("foo", 1)])
+        node = chain.edit_node("root|node_2", [IncrementOperation("foo", 4)])
         self.assertEqual(5, node.content.get("foo"))
-        self.assertEqual(5, self.store.get_node("node_2").content.get("foo"))
+        self.assertEqual(5, self.store.get_node("root|node_2").content.get("foo"))
 
     def test_edit_node_delete_not_exists(self):
         chain = Board(self.store, 'root')
 
-        node = chain.edit_node("node_2", [DeleteOperation("foo")])
+        node = chain.edit_node("root|node_2", [DeleteOperation("foo")])
         self.assertTrue("foo" not in node.content)
-        self.assertTrue("foo" not in self.store.get_node("node_2").content)
+        self.assertTrue("foo" not in self.store.get_node("root|node_2").content)
 
     def test_edit_node_delete_exists(self):
         chain = Board(self.store, 'root')
 
-        chain.edit_node("node_2", [SetOperation("foo", "bar")])
-        node = chain.edit_node("node_2", [DeleteOperation("foo")])
+        chain.edit_node("root|node_2", [SetOperation("foo", "bar")])
+        node = chain.edit_node("root|node_2", [DeleteOperation("foo")])
         self.assertTrue("foo" not in node.content)
-        self.assertTrue("foo" not in self.store.get_node("node_2").content)
+        self.assertTrue("foo" not in self.store.get_node("root|node_2").content)
 
     def test_edit_node_multiple_ops(self):
         chain = Board(self.store, 'root')
 
-        node = chain.edit_node("node_2", [SetOperation("foo", "bar"), SetOperation("baz", "boo")])
+        node = chain.edit_node("root|node_2", [SetOperation("foo", "bar"), SetOperation("baz", "boo")])
         self.assertEqual("bar", node.content['foo'])
         self.assertEqual("boo", node.content['baz'])
 
     def test_remove_node_column_header(self):
         chain = Board(self.store, 'root')
 
-        chain.remove_node("column_a", True)
+        chain.remove_node("root|column_a", True)
 
-        self.assertEqual({"column_b"}, self.store.get_node("root").children)
+        self.assertEqual({"root|column_b"}, self.store.get_node("root").children)
         with self.assertRaises(KeyError):
-            self.store.get_node("column_a")
+            self.store.get_node("root|column_a")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_1")
+            self.store.get_node("root|node_1")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_2")
+            self.store.get_node("root|node_2")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_3")
+            self.store.get_node("root|node_3")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_4")
+            self.store.get_node("root|node_4")
 
     def test_remove_node(self):
         chain = Board(self.store, 'root')
 
-        chain.remove_node("node_2", False)
+        chain.remove_node("root|node_2", False)
 
-        self.assertEqual("node_3", self.store.get_node("node_1").child)
-        self.assertEqual("node_1", self.store.get_node("node_3").parent)
+        self.assertEqual("root|node_3", self.store.get_node("root|node_1").child)
+        self.assertEqual("root|node_1", self.store.get_node("root|node_3").parent)
 
     def test_remove_node_cascade(self):
         chain = Board(self.store, 'root')
 
-        chain.remove_node("node_2", True)
+        chain.remove_node("root|node_2", True)
 
-        self.assertEqual(None, self.store.get_node("node_1").child)
+        self.assertEqual(None, self.store.get_node("root|node_1").child)
         with self.assertRaises(KeyError):
-            self.store.get_node("node_2")
+            self.store.get_node("root|node_2")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_3")
+            self.store.get_node("root|node_3")
         with self.assertRaises(KeyError):
-            self.store.get_node("node_4")
+            self.store.get_node("root|node_4")
+
+    def test_stats_follow_every_change(self):
+        chain = Board(self.store, 'root')
+
+        self.assertIsNone(self.store.get_node("root").stats)
+        stats = chain.rebuild_stats().stats
+        self.assertEqual((6, 4, 2), (stats["cards"], stats["columns"]["root|column_a"]["cards"],
+                                     stats["columns"]["root|column_b"]["cards"]))
+
+        chain.edit_node("root|node_1", [IncrementOperation("votes", 2)])
+        chain.add_node("creator", {"votes": 3}, "root|node_5")
+        chain.move_node("root|node_1", "root|column_b")
+        chain.remove_node("root|node_6", False)
+        column = chain.add_node("creator", {"test": "ColumnC"}, "root")
+
+        stats = self.store.get_node("root").stats
+        self.assertEqual({"cards": 6, "totals": {"votes": 5},
+                          "columns": {"root|column_a": {"cards": 3, "totals": {}},
+                                      "root|column_b": {"cards": 3, "totals": {"votes": 5}},
+                                      column.id: {"cards": 0, "totals": {}}}}, stats)
+        self.assertEqual("root|column_b", self.store.get_node("root|node_1").column_header)
+
+        chain.remove_node("root|column_b", True)
+        self.assertEqual({"cards": 3, "totals": {}, "columns": {"root|column_a": {"cards": 3, "totals": {}},
+                                                                column.id: {"cards": 0, "totals": {}}}},
+                         self.store.get_node("root").stats)
+
+    def test_stats_count_integral_floats(self):
+        chain = Board(self.store, 'root')
+        chain.rebuild_stats()
+
+        chain.edit_node("root|node_1", [SetOperation("votes", 2.0), SetOperation("score", 1.5)])
+
+        self.assertEqual({"votes": 2}, self.store.get_node("root").stats["totals"])
+
+    def test_order_by_keys(self):
+        chain = Board(self.store, 'root')
+        before = [node.id for node in chain.nodes()]
+
+        self.assertEqual(9, len(chain.order_by_keys()))
+        self.assertEqual([], chain.order_by_keys())
+        self.assertEqual(before, [node.id for node in chain.nodes()])
+        self.assertEqual("keys", self.store.get_node("root").ordering)
+        self.assertEqual((None, "root|column_a", None),
+                         (self.store.get_node("root|column_a").child, self.store.get_node("root|node_3").parent,
+                          self.store.get_node("root|node_3").child))
+        after = self.store.get_node("root|node_1").order
+        self.assertEqual(["root|node_2", "root|node_3"], [node.id for node in chain.get_column("root|column_a", after, count=2)])
+        self.assertEqual(4, self.store.get_node("root").stats["columns"]["root|column_a"]["cards"])
+
+    def test_ordered_by_keys(self):
+        chain = Board(self.store, 'root')
+        chain.order_by_keys()
+
+        node = chain.add_node('creator', {'test': 'new_content'}, 'root|node_1')
+        self.assertEqual(("root|column_a", None), (node.parent, node.child))
+        self.assertEqual(["root|node_1", node.id, "root|node_2"], [card.id for card in chain.get_column("root|column_a", count=3)])
+
+        # Moves and removals only write the card itself.
+        self.assertEqual(["root|node_2"], [card.id for card in chain.move_node("root|node_2", "root|node_5")])
+        self.assertEqual(["root|node_1", node.id, "root|node_3", "root|node_4"], [card.id for card in chain.get_column("root|column_a")])
+        self.assertEqual(["root|node_5", "root|node_2", "root|node_6"], [card.id for card in chain.get_column("root|column_b")])
+        chain.move_node("root|node_4", "root|column_a")
+        self.assertEqual(["root|node_4", "root|node_1", node.id, "root|node_3"], [card.id for card in chain.get_column("root|column_a")])
+
+        self.assertEqual(["root|node_1"], [card.id for card in chain.remove_node("root|node_1", False)])
+        self.assertEqual(["root|node_3"], [card.id for card in chain.remove_node("root|node_3", True)])
+        self.assertEqual(["root|node_2", "root|node_6"], sorted(card.id for card in chain.remove_node("root|node_2", True)))
+        self.assertEqual(["root|node_5"], [card.id for card in chain.get_column("root|column_b")])
+
+        with self.assertRaises(UnsupportedMoveError):
+            chain.move_node("root|column_b", "root|column_a")
+
+        self.assertEqual(["root|column_b", "root|node_5"], sorted(node.id for node in chain.remove_node("root|column_b", False)))
+        self.assertEqual(["root", "root|column_a", "root|node_4", node.id], [node.id for node in chain.nodes()])
+        self.assertEqual({"cards": 2, "totals": {}, "columns": {"root|column_a": {"cards": 2, "totals": {}}}},
+                         self.store.get_node("root").stats)
+
+    def test_add_nodes(self):
+        chain = Board(self.store, 'root')
+
+        nodes = chain.add_nodes('creator', [{'test': 'first'}, {'test': 'second'}], 'root|node_1')
+        node_ids = [node.id for node in chain.nodes()]
+        start = node_ids.index("root|node_1")
+        self.assertEqual(["root|node_1", nodes[0].id, nodes[1].id, "root|node_2"], node_ids[start:start + 4])
+        self.assertEqual((nodes[1].id, "root|node_1"), (self.store.get_node("root|node_2").parent, nodes[0].parent))
+        self.assertEqual(1, len({node.version for node in nodes}))
+
+        columns = chain.add_nodes('creator', [{'test': 'ColumnC'}], 'root')
+        self.assertIn(columns[0].id, self.store.get_node("root").children)
+        self.assertEqual([], chain.add_nodes('creator', [], 'root|node_1'))
+
+        chain.order_by_keys()
+        nodes = chain.add_nodes('creator', [{'test': str(i)} for i in range(10)], 'root|column_b')
+        self.assertEqual([node.id for node in nodes] + ["root|node_5", "root|node_6"],
+                         [node.id for node in chain.get_column("root|column_b")])
+        self.assertEqual(12, chain.rebuild_stats().stats["columns"]["root|column_b"]["cards"])
@@ -0,0 +1,54 @@
+import copy
+import unittest
+from retro.chain.node import BoardNode, ContentNode, Node
+
+
+class TestNode(unittest.TestCase):
+    def setUp(self):
+        self.board = BoardNode("board", content={"name": "Retro"}, children={"board|b", "board|a"}, version=3)
+        self.card = ContentNode("board|1", content={"votes": 1}, version=2, parent="board|a", column_header="board|a")
+
+    def test_round_trip(self):
+        for node in (self.board, self.card):
+            self.assertEqual(node.to_dict(), Node.from_dict(node.to_dict()).to_dict())
+
+        self.assertEqual(["board|a", "board|b"], self.board.to_dict()["children"])
+        self.assertEqual(1, Node.from_dict({"type": "Content", "id": "board|2"}).version)
+        self.assertFalse(hasattr(self.card, "__dict__"))
+
+    def test_to_dict_follows_changes(self):
+        d = self.card.to_dict()
+        d["version"] = 10
+        self.assertEqual(2, self.card.to_dict()["version"])
+
+        self.card.parent = "board|b"
+        self.card.content["votes"] += 1
+        self.assertEqual("board|b", self.card.to_dict()["parent"])
+        self.assertEqual({"votes": 2}, self.card.to_dict()["content"])
+
+        self.board.to_dict()
+        self.board.set_child("board|c")
+        self.board.remove_child("board|a")
+        self.assertEqual(["board|b", "board|c"], self.board.to_dict()["children"])
+
+    def test_copies(self):
+        self.card.to_dict()
+        moved = self.card.copy(parent="board|b", version=3)
+        deep = copy.deepcopy(self.card)
+        deep.content["votes"] = 5
+
+        self.assertEqual("board|b", moved.to_dict()["parent"])
+        self.assertEqual("board|a", self.card.to_dict()["parent"])
+        self.assertEqual({"votes": 1}, self.card.to_dict()["content"])
+        self.assertEqual({"votes": 5}, deep.to_dict()["content"])
+
+    def test_equality_and_hash(self):
+        same = Node.from_dict(self.card.to_dict())
+        self.assertEqual(self.card, same)
+        self.assertEqual(1, len({self.card, same}))
+
+        same.version += 1
+        self.assertNotEqual(self.card, same)
+        self.assertNotEqual(self.card, ContentNode("board|2", version=2))
+        self.assertNotEqual(self.card, self.card.to_dict())
+        self.assertIn(same, {same})
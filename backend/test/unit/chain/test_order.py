@@ -0,0 +1,56 @@
+import random
+import unittest
+from retro.chain.order import DIGITS, key_between, keys_between, spread_keys
+
+
+class TestOrder(unittest.TestCase):
+    def test_key_between(self):
+        self.assertEqual("V", key_between())
+        self.assertEqual("W", key_between("V"))
+        self.assertEqual("U", key_between(None, "V"))
+        self.assertTrue("V" < key_between("V", "W") < "W")
+        self.assertTrue("0V" < key_between("0V", "1") < "1")
+
+        with self.assertRaises(ValueError):
+            key_between("W", "V")
+        with self.assertRaises(ValueError):
+            key_between("V", "V")
+
+    def test_keys_stay_apart(self):
+        keys = [key_between()]
+        rand = random.Random(7)
+
+        for _ in range(2000):
+            i = rand.randint(0, len(keys))
+            key = key_between(keys[i - 1] if i else None, keys[i] if i < len(keys) else None)
+            self.assertFalse(key.endswith(DIGITS[0]))
+            keys.insert(i, key)
+
+        self.assertEqual(sorted(set(keys)), keys)
+
+    def test_repeated_inserts_grow_slowly(self):
+        top = end = key_between()
+        middle = "W"
+        for _ in range(500):
+            top = key_between(None, top)
+            end = key_between(end)
+            middle = key_between("V", middle)
+
+        self.assertLess(max(len(top), len(end)), 20)
+        self.assertLess(len(middle), 110)
+
+    def test_spread_keys(self):
+        for count in (0, 1, 61, 62, 5000):
+            keys = spread_keys(count)
+            self.assertEqual(count, len(set(keys)))
+            self.assertEqual(sorted(keys), keys)
+            self.assertTrue(all(key and not key.endswith(DIGITS[0]) for key in keys))
+
+    def test_keys_between(self):
+        for before, after in ((None, None), ("V", None), (None, "V"), ("V", "W")):
+            keys = keys_between(before, after, 60)
+            self.assertEqual(sorted(set(keys)), keys)
+            self.assertTrue((before or "") < keys[0] and (after is None or keys[-1] < after))
+            self.assertLess(max(len(key) for key in keys), 5)
+
+        self.assertEqual([], keys_between("V", "W", 0))
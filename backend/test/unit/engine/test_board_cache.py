@@ -0,0 +1,49 @@
+import unittest
+from retro.engine.board_cache import BoardSnapshot, BoardSnapshotCache
+
+
+class TestBoardSnapshotCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = BoardSnapshotCache(max_bytes=100)
+
+    def test_get(self):
+        snapshot = BoardSnapshot('board', 2, ['{"id": "board"}'])
+        self.cache.put(snapshot)
+
+        self.assertEqual(snapshot, self.cache.get('board', 2))
+        self.assertIsNone(self.cache.get('board', 3))
+        self.assertIsNone(self.cache.get('other', 2))
+
+    def test_newer_version_replaces_older(self):
+        self.cache.put(BoardSnapshot('board', 2, ['x' * 10]))
+        self.cache.put(BoardSnapshot('board', 3, ['y' * 20]))
+        self.cache.put(BoardSnapshot('board', 1, ['z' * 30]))
+
+        self.assertEqual(3, self.cache.get('board', 3).version)
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(20, self.cache.size)
+
+    def test_least_recently_used_evicted(self):
+        for board_id in ('a', 'b', 'c'):
+            self.cache.put(BoardSnapshot(board_id, 1, ['x' * 40]))
+
+        self.assertIsNone(self.cache.get('a', 1))
+        self.cache.get('b', 1)
+        self.cache.put(BoardSnapshot('d', 1, ['x' * 40]))
+
+        self.assertIsNotNone(self.cache.get('b', 1))
+        self.assertIsNone(self.cache.get('c', 1))
+        self.assertEqual(80, self.cache.size)
+
+    def test_oversized_snapshot_not_cached(self):
+        self.cache.put(BoardSnapshot('board', 1, ['x' * 101]))
+
+        self.assertIsNone(self.cache.get('board', 1))
+        self.assertEqual(0, self.cache.size)
+
+    def test_discard(self):
+        self.cache.put(BoardSnapshot('board', 1, ['x' * 10]))
+        self.cache.discard('board')
+
+        self.assertIsNone(self.cache.get('board', 1))
+        self.assertEqual(0, self.cache.size)
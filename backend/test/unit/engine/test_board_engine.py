@@ -1,6 +1,7 @@
 import unittest
 from retro.chain.node import Node, BoardNode, ContentNode
 from retro.engine.board_engine import BoardEngine
+from retro.store.count_board_stats import count_board
 from retro.store.exceptions import ExistingNodeError
 from retro.store.mem_store import MemStore
 from retro.utils.config import Config
@@ -287,6 +288,28 @@ class TestBoardEngine(unittest.TestCase):
 
         self._test_import_board(expected_nodes, created_nodes)
 
+    def test_board_stats(self):
+        board_engine = BoardEngine(self.config, store=self.store)
+        cards = [node for node in self.child_nodes if isinstance(node, ContentNode)]
+
+        board_engine.import_board(self.board_json.get("board_node"), self.board_json.get("child_nodes"))
+        stats = board_engine.get_board_stats(self.board_node.id).stats
+
+        self.assertEqual(len(cards), stats["cards"])
+        self.assertEqual(sum(card.content.get("votes", 0) for card in cards), stats["totals"]["votes"])
+        self.assertEqual(len(self.board_node.children), len(stats["columns"]))
+
+        # Boards created before boards kept stats have none until they are counted.
+        store = MemStore(nodes={node.id: node for node in self.child_nodes})
+        store.create_board(self.board_node)
+        self.assertIsNone(BoardEngine(self.config, store=store).get_board_stats(self.board_node.id).stats)
+        self.assertEqual(stats, count_board(store, self.board_node.id).stats)
+        self.assertIsNone(count_board(store, self.board_node.id))
+        self.assertEqual(stats, BoardEngine(self.config, store=store).get_board_stats(self.board_node.id).stats)
+
+        new_board = board_engine.create_board("creator", content={"name": "new"})[0]
+        self.assertEqual({"cards": 0, "totals": {}, "columns": {}}, board_engine.get_board_stats(new_board.id).stats)
+
     def test_import_board_with_existing_data(self):
         store = MemStore(nodes={node.id: node for node in self.child_nodes})
         store.create_board(self.board_node)
@@ -339,6 +362,28 @@ class TestBoardEngine(unittest.TestCase):
                 if node.NODE_TYPE == ContentNode:
                     self.assertTrue(node.column_header.startswith(new_board_id))
 
+    def test_create_board_from_template(self):
+        board_engine = BoardEngine(self.config, store=self.store)
+        board_engine.templates["prompts"] = {"id": "prompts", "columns": [
+            "Liked", {"name": "Learned", "nodes": [{"text": "What surprised you?"}, {"text": "What was new?"}]}]}
+
+        nodes = board_engine.create_board("creator", template="prompts", content={"name": "new"})
+        board_node, liked, learned, first, second = nodes
+
+        # Written in one transaction on top of creating the board.
+        self.assertEqual({2}, {node.version for node in nodes})
+        self.assertEqual({board_node.id, liked.id, learned.id, first.id, second.id},
+                         {node.id for node in board_engine.get_board(board_node.id)})
+        self.assertEqual({liked.id, learned.id}, self.store.get_node(board_node.id).children)
+        self.assertEqual((learned.id, second.id, None), (first.parent, first.child, second.child))
+        self.assertEqual("What was new?", self.store.get_node(second.id).content["text"])
+        self.assertEqual(2, board_engine.get_board_stats(board_node.id).stats["columns"][learned.id]["cards"])
+
+        self.config.board_ordering = "keys"
+        nodes = board_engine.create_board("creator", template="prompts", content={"name": "keyed"})
+        self.assertEqual(["What surprised you?", "What was new?"],
+                         [node.content["text"] for node in board_engine.get_column(nodes[0].id, nodes[2].id)])
+
     def _test_import_board(self, expected_nodes, created_nodes):
         self.assertEqual(len(expected_nodes), len(created_nodes))
         for i, node in enumerate(created_nodes):
@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+
+from retro.chain.node import BoardNode
+from retro.index import Index
+from retro.index.existence_cache import BloomFilter, BoardExistenceCache
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_members_are_found(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add("board%s" % i)
+
+        self.assertTrue(all("board%s" % i in bloom for i in range(1000)))
+        # Well within what a 1% error rate allows.
+        self.assertLess(sum("other%s" % i in bloom for i in range(10000)), 300)
+
+
+class TestBoardExistenceCache(unittest.TestCase):
+    def setUp(self):
+        self.index = mock.Mock(spec=Index)
+        self.index.stats.return_value = {}
+        self.index.get_board_ids = mock.Mock(return_value=iter(["board_a", "board_b"]))
+        self.index.has_board = mock.Mock(side_effect=lambda board_id: board_id in ("board_a", "board_b"))
+        self.index.create_board = mock.Mock()
+        self.index.remove_board = mock.Mock()
+        self.cache = BoardExistenceCache(self.index, max_size=3)
+
+    def test_unloaded_cache_asks_the_index_once(self):
+        self.assertTrue(self.cache.has_board("board_a"))
+        self.assertFalse(self.cache.has_board("missing"))
+        self.assertTrue(self.cache.has_board("board_a"))
+        self.assertFalse(self.cache.has_board("missing"))
+
+        self.assertEqual(2, self.index.has_board.call_count)
+
+    def test_loaded_cache_rejects_unknown_boards(self):
+        self.cache.load()
+
+        self.assertFalse(self.cache.has_board("missing"))
+        self.assertTrue(self.cache.has_board("board_b"))
+
+        self.index.has_board.assert_called_once_with("board_b")
+        self.assertEqual(1, self.cache.stats()["existence_cache"]["bloom_rejections"])
+
+    def test_events_update_the_cache(self):
+        self.cache.load()
+
+        self.cache.board_seen("board_c")
+        self.cache.board_removed("board_a")
+        # Evicts board_c from the LRU, but the filter still lets it through to the index.
+        self.cache.board_seen("board_d")
+        self.cache.board_seen("board_e")
+
+        self.assertFalse(self.cache.has_board("board_a"))
+        self.assertTrue(self.cache.has_board("board_d"))
+        self.cache.has_board("board_c")
+        self.index.has_board.assert_called_once_with("board_c")
+
+    def test_boards_seen_while_loading_are_kept(self):
+        def get_board_ids():
+            self.cache.board_seen("board_c")
+            return iter(["board_a"])
+
+        self.index.get_board_ids.side_effect = get_board_ids
+        self.cache.load()
+        for board_id in ("board_d", "board_e", "board_f"):
+            self.cache.board_seen(board_id)
+
+        self.cache.has_board("board_c")
+        self.index.has_board.assert_called_once_with("board_c")
+
+    def test_created_and_removed_boards(self):
+        self.cache.load()
+
+        self.cache.create_board(BoardNode("board_c"))
+        self.assertTrue(self.cache.has_board("board_c"))
+        self.cache.remove_board("board_c")
+        self.assertFalse(self.cache.has_board("board_c"))
+
+        self.index.has_board.assert_not_called()
+        self.index.remove_board.assert_called_once_with("board_c")
+
+    def test_reset_falls_back_to_the_index(self):
+        self.cache.load()
+        self.cache.reset()
+
+        self.assertFalse(self.cache.has_board("missing"))
+        self.index.has_board.assert_called_once_with("missing")
@@ -0,0 +1,124 @@
+import threading
+import unittest
+
+from retro.chain.node import BoardNode, ContentNode
+from retro.index import Index
+from retro.index.index_writer import IndexWriter
+
+
+class RecordingIndex(Index):
+    def __init__(self):
+        self.batches = []
+        self.removed = []
+        self.cards = []
+        self.fail = False
+        self.written = threading.Event()
+
+    def update_boards(self, board_nodes):
+        if self.fail:
+            raise IOError("index is down")
+
+        self.batches.append({board_node.id: board_node.content["name"] for board_node in board_nodes})
+        self.written.set()
+
+    def update_board(self, board_node):
+        self.update_boards([board_node])
+
+    def update_cards(self, board_id, card_nodes, removed_card_ids=()):
+        if self.fail:
+            raise IOError("index is down")
+
+        self.cards.append((board_id, sorted(card_node.content for card_node in card_nodes), sorted(removed_card_ids)))
+
+    def remove_board(self, board_id):
+        self.removed.append(board_id)
+
+
+class TestIndexWriter(unittest.TestCase):
+    def setUp(self):
+        self.index = RecordingIndex()
+        self.writer = IndexWriter(self.index, flush_interval=60)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def _update(self, board_id, name):
+        self.writer.update_board(BoardNode(board_id, content={"name": name}))
+
+    def test_updates_are_coalesced_per_board(self):
+        self._update('board_a', 'a1')
+        self._update('board_b', 'b1')
+        self._update('board_a', 'a2')
+
+        self.assertEqual([], self.index.batches)
+        self.assertEqual(2, self.writer.stats()["queue_size"])
+
+        self.writer.flush()
+
+        self.assertEqual([{'board_a': 'a2', 'board_b': 'b1'}], self.index.batches)
+        stats = self.writer.stats()
+        self.assertEqual((3, 1, 1, 2, 0), (stats["updates"], stats["coalesced"], stats["flushes"], stats["flushed"],
+                                           stats["queue_size"]))
+
+    def test_updates_are_flushed_after_the_interval(self):
+        self.writer.close()
+        self.writer = IndexWriter(self.index, flush_interval=.01)
+
+        self._update('board_a', 'a1')
+
+        self.assertTrue(self.index.written.wait(5))
+        self.assertEqual([{'board_a': 'a1'}], self.index.batches)
+
+    def test_failed_flush_keeps_updates(self):
+        self._update('board_a', 'a1')
+        self.index.fail = True
+
+        self.assertFalse(self.writer.flush())
+        self._update('board_a', 'a2')
+
+        stats = self.writer.stats()
+        self.assertEqual((1, 1), (stats["errors"], stats["queue_size"]))
+        self.assertGreater(stats["lag_ms"], 0)
+
+        self.index.fail = False
+        self.assertTrue(self.writer.flush())
+        self.assertEqual([{'board_a': 'a2'}], self.index.batches)
+
+    def test_removed_board_is_not_written_back(self):
+        self._update('board_a', 'a1')
+        self.writer.remove_board('board_a')
+        self.writer.flush()
+
+        self.assertEqual(['board_a'], self.index.removed)
+        self.assertEqual([], self.index.batches)
+
+    def test_card_changes_are_coalesced_per_board(self):
+        self.writer.update_cards('board_a', [ContentNode('board_a|1', content='one'),
+                                             ContentNode('board_a|2', content='two')])
+        self.writer.update_cards('board_a', [ContentNode('board_a|1', content='uno')], ['board_a|2'])
+        self.writer.update_cards('board_b', [ContentNode('board_b|1', content='one')])
+        self.index.fail = True
+
+        self.assertFalse(self.writer.flush())
+        self.writer.update_cards('board_a', [ContentNode('board_a|3', content='three')])
+        self.assertEqual(4, self.writer.stats()["card_queue_size"])
+
+        self.index.fail = False
+        self.assertTrue(self.writer.flush())
+        self.assertEqual([('board_a', ['three', 'uno'], ['board_a|2']), ('board_b', ['one'], [])],
+                         sorted(self.index.cards))
+
+        self.writer.update_cards('board_a', [ContentNode('board_a|1', content='one')])
+        self.writer.remove_board('board_a')
+        self.writer.flush()
+        self.assertEqual(2, len(self.index.cards))
+
+    def test_close_flushes_pending_updates(self):
+        self._update('board_a', 'a1')
+        self.writer.close()
+
+        self.assertEqual([{'board_a': 'a1'}], self.index.batches)
+
+        # Updates after close are written directly.
+        self._update('board_a', 'a2')
+        self.assertEqual({'board_a': 'a2'}, self.index.batches[-1])
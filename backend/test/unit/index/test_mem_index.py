@@ -0,0 +1,98 @@
+import unittest
+
+from retro.chain.node import BoardNode, ContentNode
+from retro.index.cursor import next_cursor
+from retro.index.exceptions import InvalidSortOrder
+from retro.index.mem_index import MemIndex
+from retro.index.search import CARD_SORT_KEY
+
+_NAMES = ["Team retro", "alpha release", "Alpha Release", "beta", None, "Team Retrospective", "gamma retro"]
+
+
+class TestMemIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MemIndex()
+        for i, name in enumerate(_NAMES):
+            content = {"group": "g%s" % (i % 2)}
+            if name is not None:
+                content["name"] = name
+            # Every pair of boards shares a create time, so ties are broken by id.
+            self.index.create_board(BoardNode("board%s" % i, creator="user%s@example.com" % (i % 3),
+                                              create_time=i // 2, last_update_time=100 - i, content=content))
+
+    def _ids(self, **kwargs):
+        return [board["id"] for board in self.index.get_boards(**kwargs)]
+
+    def test_sorting(self):
+        self.assertEqual(["board%s" % i for i in range(7)], self._ids())
+        self.assertEqual(["board%s" % i for i in reversed(range(7))], self._ids(sort_order="desc"))
+        # Nulls first, then ignoring case, lower case first.
+        self.assertEqual(["board4", "board1", "board2", "board3", "board6", "board0", "board5"],
+                         self._ids(sort_key="content.name"))
+        self.assertRaises(InvalidSortOrder, self.index.get_boards, sort_order="sideways")
+
+    def test_cursor_pages_match_start_pages(self):
+        for sort_key in ("create_time", "content.name", "creator", "content.group"):
+            for sort_order in ("asc", "desc"):
+                expected = self._ids(sort_key=sort_key, sort_order=sort_order, count=100)
+                pages = []
+                cursor = None
+                while True:
+                    page = self.index.get_boards(count=2, sort_key=sort_key, sort_order=sort_order, cursor=cursor)
+                    pages.extend(board["id"] for board in page)
+                    cursor = next_cursor(page, 2, sort_key)
+                    if cursor is None:
+                        break
+
+                self.assertEqual(expected, pages, (sort_key, sort_order))
+                self.assertEqual(expected[2:4], self._ids(sort_key=sort_key, sort_order=sort_order, start=2,
+                                                          count=2))
+
+    def test_filters_and_search(self):
+        self.assertEqual(["board1", "board3", "board5"], self._ids(filters={"content.group": "g1"}))
+        self.assertEqual(["board0", "board5", "board6"], self._ids(search_terms={"content.name": "retro"}))
+        self.assertEqual(["board1", "board2"], self._ids(search_terms={"content.name": "RELEASE al"}))
+        self.assertEqual(["board5"], self._ids(filters={"content.group": "g1"},
+                                               search_terms={"content.name": "team"}))
+        # Fields without search tokens are matched as regular expressions.
+        self.assertEqual(["board3"], self._ids(search_terms={"content.group": "1$", "content.name": "^be"}))
+
+    def test_relevance(self):
+        # Whole word matches first, then the most recently updated.
+        self.assertEqual(["board0", "board6", "board5"], self._ids(search_terms={"content.name": "retro"},
+                                                                   sort_key="relevance"))
+
+    def test_updates_and_removals(self):
+        self.index.update_board(BoardNode("board4", create_time=10, content={"name": "Delta retro"}))
+        self.index.remove_board("board0")
+
+        self.assertFalse(self.index.has_board("board0"))
+        self.assertEqual("board4", self._ids()[-1])
+        self.assertEqual(["board5", "board6", "board4"], self._ids(search_terms={"content.name": "retro"}))
+        self.assertEqual(6, len(self.index.get_board_ids()))
+
+    def test_card_search(self):
+        self.index.update_cards("board0", [ContentNode("board0|a", content={"text": "Deploys are flaky"},
+                                                       last_update_time=1),
+                                           ContentNode("board0|b", content={"text": "Flaky tests, flaky deploys!"},
+                                                       last_update_time=3),
+                                           ContentNode("board0|c", content={"votes": 2}, last_update_time=2)])
+        self.index.update_cards("board1", [ContentNode("board1|a", content="deploy flaky", last_update_time=3)])
+
+        # Most recent first, ties broken by id.
+        self.assertEqual(["board0|b", "board0|a"], [card["id"] for card in self.index.search_cards("FLAKY deploys")])
+        pages = []
+        cursor = None
+        while True:
+            page = self.index.search_cards("flaky", count=2, cursor=cursor)
+            pages.extend((card["board_id"], card["id"]) for card in page)
+            cursor = next_cursor(page, 2, CARD_SORT_KEY)
+            if cursor is None:
+                break
+        self.assertEqual([("board1", "board1|a"), ("board0", "board0|b"), ("board0", "board0|a")], pages)
+
+        self.index.update_cards("board0", [ContentNode("board0|b", content="fixed", last_update_time=4)], ["board0|a"])
+        self.assertEqual(["board1|a"], [card["id"] for card in self.index.search_cards("flaky")])
+        self.index.remove_board("board1")
+        self.assertEqual([], self.index.search_cards("flaky"))
+        self.assertEqual("fixed", self.index.search_cards("fixed")[0]["snippet"])
@@ -0,0 +1,144 @@
+import unittest
+from unittest import mock
+
+from pymongo import ASCENDING, DESCENDING
+from retro.index.cursor import decode_cursor, next_cursor
+from retro.index.exceptions import InvalidCursor
+from retro.index.mongo_index import MongoIndex
+from retro.chain.node import ContentNode
+from retro.index.search import board_tokens, card_result
+
+
+class TestMongoIndexCursor(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.index = MongoIndex(client=self.client)
+        self.collection = self.client["retrospec"].boards
+        self.page = [{"id": "board_%s" % i, "create_time": i, "content": {"name": "Board %s" % i}} for i in range(3)]
+        self.collection.find.return_value.skip.return_value.limit.return_value.sort.return_value \
+            .collation.return_value = self.page
+
+    def _query(self):
+        query, _ = self.collection.find.call_args[0]
+        return query
+
+    def test_next_cursor_resumes_after_last_board(self):
+        cursor = next_cursor(self.page, 3, "content.name")
+
+        self.assertEqual(("Board 2", "board_2"), decode_cursor(cursor, "content.name"))
+
+        self.index.get_boards(filters={"content.group": "g"}, count=3, sort_key="content.name", sort_order="desc",
+                              cursor=cursor)
+
+        self.assertEqual({"$and": [{"content.group": "g"},
+                                   {"$or": [{"content.name": "Board 2", "id": {"$lt": "board_2"}},
+                                            {"content.name": {"$lt": "Board 2"}},
+                                            {"content.name": None}]}]}, self._query())
+        cursor_mock = self.collection.find.return_value.skip.return_value.limit.return_value
+        cursor_mock.sort.assert_called_once_with([("content.name", DESCENDING), ("id", DESCENDING)])
+
+    def test_null_sort_value_resumes_after_nulls(self):
+        page = [{"id": "board_1"}]
+
+        self.index.get_boards(count=1, sort_key="content.name", cursor=next_cursor(page, 1, "content.name"))
+
+        self.assertEqual({"$or": [{"content.name": None, "id": {"$gt": "board_1"}},
+                                  {"content.name": {"$ne": None}}]}, self._query())
+
+    def test_default_sort_key(self):
+        self.index.get_boards(count=3, cursor=next_cursor(self.page, 3))
+
+        self.assertEqual({"$or": [{"create_time": 2, "id": {"$gt": "board_2"}}, {"create_time": {"$gt": 2}}]},
+                         self._query())
+        cursor_mock = self.collection.find.return_value.skip.return_value.limit.return_value
+        cursor_mock.sort.assert_called_once_with([("create_time", ASCENDING), ("id", ASCENDING)])
+
+    def test_last_page_has_no_cursor(self):
+        self.assertIsNone(next_cursor(self.page, 4))
+        self.assertIsNone(next_cursor([], 20))
+
+    def test_invalid_cursor(self):
+        self.assertRaises(InvalidCursor, self.index.get_boards, cursor="not a cursor")
+        self.assertRaises(InvalidCursor, self.index.get_boards, sort_key="last_update_time",
+                          cursor=next_cursor(self.page, 3))
+
+
+class TestMongoIndexSearch(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.index = MongoIndex(client=self.client)
+        self.collection = self.client["retrospec"].boards
+
+    def test_board_tokens(self):
+        tokens = board_tokens({"id": "board", "creator": "someone@example.com", "content": {"name": "Team Retro"}})
+
+        self.assertIn("content.name:r", tokens)
+        self.assertIn("content.name:retr", tokens)
+        self.assertIn("content.name=retro", tokens)
+        self.assertNotIn("content.name=retr", tokens)
+        self.assertIn("creator=example", tokens)
+
+    def test_search_fields_use_tokens(self):
+        self.index.get_boards(search_terms={"content.name": "Retro alp", "content.owner": "bob"})
+
+        query, projection = self.collection.find.call_args[0]
+        filters, (tokens, legacy) = query["$and"][0], query["$and"][1]["$or"]
+        self.assertEqual({"$all": ["content.name:retro", "content.name:alp"]}, tokens["_search"])
+        self.assertEqual("bob", filters["content.owner"].pattern)
+        self.assertFalse(projection["_search"])
+
+        # Boards indexed before they had tokens are still matched by regular expression.
+        self.assertEqual({"$exists": False}, legacy["_search"])
+        self.assertEqual("Retro alp", legacy["content.name"].pattern)
+
+    def test_build_search_tokens(self):
+        self.collection.find.return_value = [{"id": "board_%s" % i, "content": {"name": "Board %s" % i}}
+                                             for i in range(3)]
+
+        self.assertEqual(3, self.index.build_search_tokens(batch_size=2))
+
+        self.assertEqual({"_search": {"$exists": False}}, self.collection.find.call_args[0][0])
+        batches = [call[0][0] for call in self.collection.bulk_write.call_args_list]
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual({"id": "board_2"}, batches[1][0]._filter)
+        self.assertIn("content.name=board", batches[1][0]._doc["$set"]["_search"])
+
+    def test_card_search(self):
+        cards = self.client["retrospec"].cards
+        cards.find.return_value.limit.return_value.sort.return_value.max_time_ms.return_value = [
+            {"id": "board|card", "board_id": "board", "last_update_time": 5, "text": "Deploys are flaky"}]
+
+        result = self.index.search_cards("flaky  DEPLOYS", count=1, cursor=next_cursor([{"id": "board|last",
+                                                                                          "last_update_time": 7}],
+                                                                                        1, "last_update_time"))
+
+        query, _ = cards.find.call_args[0]
+        self.assertEqual({"$and": [{"_words": {"$all": ["deploys", "flaky"]}},
+                                   {"$or": [{"last_update_time": 7, "id": {"$lt": "board|last"}},
+                                            {"last_update_time": {"$lt": 7}},
+                                            {"last_update_time": None}]}]}, query)
+        self.assertEqual([{"id": "board|card", "board_id": "board", "last_update_time": 5,
+                           "snippet": "Deploys are flaky"}], result)
+        self.assertEqual([], self.index.search_cards(" ... "))
+
+    def test_cards_without_text_are_dropped(self):
+        self.index.update_cards("board", [ContentNode("board|a", content={"text": "Flaky deploys", "votes": 3}),
+                                          ContentNode("board|b", content={"votes": 1})], ["board|c"])
+
+        requests = self.client["retrospec"].cards.bulk_write.call_args[0][0]
+        self.assertEqual({"id": {"$in": ["board|c"]}}, requests[0]._filter)
+        self.assertEqual(["deploys", "flaky"], requests[1]._doc["$set"]["_words"])
+        self.assertEqual({"id": "board|b"}, requests[2]._filter)
+
+    def test_snippet(self):
+        text = "x" * 200 + " flaky deploys " + "y" * 200
+        snippet = card_result("board", "board|card", 1, text, ["deploys"])["snippet"]
+
+        self.assertTrue(snippet.startswith("\u2026"))
+        self.assertTrue(snippet.endswith("\u2026"))
+        self.assertIn("flaky deploys", snippet)
+
+    def test_relevance_has_no_cursor(self):
+        self.assertIsNone(next_cursor([{"id": "board"}], 1, "relevance"))
+        self.assertRaises(InvalidCursor, self.index.get_boards, search_terms={"content.name": "retro"},
+                          sort_key="relevance", cursor="cursor")
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from retro.chain.node import BoardNode, ColumnHeaderNode
+from retro.store.async_redis_store import AsyncRedisStore
+from retro.store.exceptions import NodeNotFoundError
+from retro.store.redis_store import RedisStore
+from retro.store.store import TransactionNodes
+from retro.websocket_server.websocket_message import NodeUpdateMessage
+from test.helpers import get_redis_container, get_redis_config
+
+
+class TestAsyncRedisStore(unittest.IsolatedAsyncioTestCase):
+    layout = 'node'
+    event_stream_length = 0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_container = get_redis_container()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.redis_container:
+            cls.redis_container.stop()
+            cls.redis_container.remove()
+
+    def setUp(self):
+        config = dict(get_redis_config(self.redis_container), layout=self.layout,
+                      event_stream_length=self.event_stream_length)
+        self.store = RedisStore(mock.Mock(), **config)
+        self.store.create_board(BoardNode('root', content={"name": "test board"}))
+        self.async_store = AsyncRedisStore(**config)
+
+    def tearDown(self):
+        self.store.client.flushall()
+
+    def _add_column(self, name):
+        def add(proxy):
+            root = proxy.get_node('root')
+            column = ColumnHeaderNode('root|%s' % name, parent='root', content={"name": name})
+            root.set_child(column.id)
+            return TransactionNodes(updates=[column, root])
+
+        return self.store.transaction('root', add).updates[0]
+
+    async def test_get_nodes(self):
+        column = self._add_column('a')
+
+        nodes = await self.async_store.get_nodes(['root', column.id])
+
+        self.assertEqual([node.to_dict() for node in self.store.get_nodes(['root', column.id])],
+                         [node.to_dict() for node in nodes])
+        self.assertEqual(self.store.get_board_version('root'), await self.async_store.get_board_version('root'))
+
+    async def test_missing_node(self):
+        with self.assertRaises(NodeNotFoundError):
+            await self.async_store.get_node('root|missing')
+
+        self.assertTrue(await self.async_store.has_board('root'))
+        self.assertFalse(await self.async_store.has_board('missing'))
+
+    async def test_missing_board_is_not_remembered(self):
+        with self.assertRaises(NodeNotFoundError):
+            await self.async_store.get_node('missing')
+
+        self.assertFalse(await self.async_store.has_board('missing'))
+        self.assertNotIn('missing', self.async_store._board_layouts)
+
+    async def test_removed_board(self):
+        self.assertTrue(await self.async_store.has_board('root'))
+        self.store.remove_board('root')
+        self.assertFalse(await self.async_store.has_board('root'))
+
+        self.store.create_board(BoardNode('root', content={"name": "test board"}))
+        self.assertTrue(await self.async_store.has_board('root'))
+
+    async def test_update_listener(self):
+        received = []
+
+        async def message_cb(message, board_id):
+            received.append((message.type, board_id))
+            return False
+
+        await self.async_store.follow_board('root')
+        listener = asyncio.ensure_future(self.async_store.update_listener(message_cb))
+        await asyncio.sleep(.1)
+        await asyncio.get_event_loop().run_in_executor(None, self._add_column, 'a')
+        await asyncio.wait_for(listener, 5)
+
+        self.assertEqual([(NodeUpdateMessage.type, 'root')], received)
+
+
+class TestAsyncRedisStoreBoardLayout(TestAsyncRedisStore):
+    layout = 'board'
+
+
+class TestAsyncRedisStoreEventStream(TestAsyncRedisStore):
+    event_stream_length = 100
+
+    async def test_get_board_events(self):
+        last_event_id = await self.async_store.follow_board('root')
+        self._add_column('a')
+        self._add_column('b')
+
+        events = await self.async_store.get_board_events('root', last_event_id)
+
+        self.assertEqual([NodeUpdateMessage.type, NodeUpdateMessage.type], [event.type for event in events])
+        self.assertEqual(events[1].event_id, self.store.follow_board('root'))
+        self.assertIsNone(await self.async_store.get_board_events('root', '0-1'))
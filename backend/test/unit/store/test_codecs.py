@@ -0,0 +1,43 @@
+import unittest
+from retro.chain.node import ContentNode
+from retro.store import codecs
+from retro.store.exceptions import UnknownCodecError
+
+
+class TestCodecs(unittest.TestCase):
+    def setUp(self):
+        self.node_dict = ContentNode("board|node", content={"text": "Ünïcode card", "votes": 3}, version=4,
+                                     parent="board|column", column_header="board|column").to_dict()
+
+    def test_round_trip_value(self):
+        for name in codecs.CODECS:
+            encoded = codecs.get_codec(name).encode(self.node_dict)
+            self.assertEqual(self.node_dict, codecs.decode(encoded))
+            self.assertEqual(self.node_dict, codecs.decode(encoded.encode() if isinstance(encoded, str) else encoded))
+
+    def test_round_trip_fields(self):
+        for name in codecs.CODECS:
+            fields = codecs.get_codec(name).encode_fields(self.node_dict)
+            self.assertEqual(self.node_dict, codecs.decode_fields(fields))
+
+    def test_envelope_fields(self):
+        fields = codecs.EnvelopeCodec().encode_fields(self.node_dict)
+
+        self.assertEqual('{"value": 4}', fields["version"])
+        self.assertNotIn(codecs.BLOB_FIELD, fields)
+
+    def test_decode_fields_bytes(self):
+        fields = codecs.MsgpackCodec().encode_fields(self.node_dict)
+
+        self.assertEqual(self.node_dict, codecs.decode_fields({k.encode(): v for k, v in fields.items()}))
+
+    def test_decode_field(self):
+        for name in codecs.CODECS:
+            fields = codecs.get_codec(name).encode_fields(self.node_dict)
+            self.assertEqual(4, codecs.decode_field("version", fields.get("version"), fields.get(codecs.BLOB_FIELD)))
+
+        self.assertIsNone(codecs.decode_field("version", None, None))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(UnknownCodecError):
+            codecs.get_codec("xml")
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from retro.chain.board import Board
+from retro.chain.node import BoardNode
+from retro.store.exceptions import JournalCorruptError
+from retro.store.mem_journal import MemJournal
+from retro.store.mem_store import MemStore
+
+
+class TestMemJournal(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = self._open()
+        self.store.create_board(BoardNode('board_a', content={"name": "a"}))
+        self.store.create_board(BoardNode('board_b', content={"name": "b"}))
+        self.column = Board(self.store, 'board_a').add_node('creator', {'name': 'column'}, 'board_a')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _open(self, snapshot_records=10000):
+        return MemStore(journal=MemJournal(self.path, codec='json', snapshot_records=snapshot_records))
+
+    def _state(self, store):
+        return ({node_id: node.to_dict() for board in store._all_boards() for node_id, node in board.nodes.items()},
+                store.boards, store.groups, store.node_locks)
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.path) if name.startswith('journal.'))
+
+    def test_changes_survive_a_restart(self):
+        board = Board(self.store, 'board_a')
+        card = board.add_node('creator', {'text': 'card'}, self.column.id)
+        board.edit_node(card.id, [], lock='lock')
+        self.store.upsert_group('group', 'name')
+        self.store.remove_board('board_b')
+
+        recovered = self._open()
+
+        self.assertEqual(self._state(self.store), self._state(recovered))
+        self.assertEqual(['board_a', self.column.id, card.id],
+                         [node.id for node in Board(recovered, 'board_a').nodes()])
+        self.assertEqual(self.store.get_board_version('board_a'), recovered.get_board_version('board_a'))
+
+    def test_recovers_from_snapshot_and_later_records(self):
+        self.store.snapshot()
+        card = Board(self.store, 'board_a').add_node('creator', {'text': 'card'}, self.column.id)
+        self.store.remove_group('missing')
+
+        recovered = self._open()
+
+        self.assertEqual(self._state(self.store), self._state(recovered))
+        self.assertEqual(card.to_dict(), recovered.get_node(card.id).to_dict())
+        self.assertEqual(1, len([name for name in os.listdir(self.path) if name.startswith('snapshot.')]))
+
+    def test_snapshot_right_after_a_record_keeps_it(self):
+        append = self.store.journal.append
+
+        def append_then_snapshot(record):
+            seq = append(record)
+            self.store.journal.append = append
+            self.store.snapshot()
+            return seq
+
+        self.store.journal.append = append_then_snapshot
+        card = Board(self.store, 'board_a').add_node('creator', {'text': 'card'}, self.column.id)
+
+        self.assertEqual(card.to_dict(), self._open().get_node(card.id).to_dict())
+
+    def test_snapshot_boards_are_loaded_when_read(self):
+        self.store.snapshot()
+
+        recovered = self._open()
+
+        self.assertEqual({'board_a', 'board_b'}, recovered._unloaded)
+        self.assertEqual('column', recovered.get_node(self.column.id).content['name'])
+        self.assertEqual({'board_b'}, recovered._unloaded)
+
+        # A snapshot taken now copies board_b over without loading it.
+        recovered.snapshot()
+        self.assertEqual({'board_b'}, recovered._unloaded)
+        self.assertEqual(self._state(self.store), self._state(self._open()))
+
+    def test_card_index_is_rebuilt_without_loading_boards(self):
+        card = Board(self.store, 'board_a').add_node('creator', {'text': 'flaky deploys'}, self.column.id)
+        self.store.snapshot()
+
+        recovered = self._open()
+
+        self.assertEqual({'board_a', 'board_b'}, recovered._unloaded)
+        self.assertEqual([card.id], [found["id"] for found in recovered.search_cards('deploys')])
+
+        Board(recovered, 'board_a').add_node('creator', {'text': 'more flaky tests'}, self.column.id)
+        self.assertEqual(2, len(self._open().search_cards('flaky')))
+
+    def test_snapshots_are_taken_every_snapshot_records(self):
+        store = self._open(snapshot_records=5)
+        board = Board(store, 'board_a')
+        for i in range(10):
+            board.add_node('creator', {'text': str(i)}, self.column.id)
+
+        # Snapshots are written in the background.
+        deadline = time.time() + 5
+        while not store.journal.stats["snapshots"] and time.time() < deadline:
+            time.sleep(.01)
+
+        self.assertGreaterEqual(store.journal.stats["snapshots"], 1)
+        self.assertEqual(self._state(store), self._state(self._open()))
+
+    def test_torn_record_is_dropped(self):
+        before = self._state(self.store)
+        with open(os.path.join(self.path, self._segments()[-1]), 'ab') as f:
+            f.write(b'\x00\x00\x01\x00torn')
+
+        recovered = self._open()
+        self.assertEqual(before, self._state(recovered))
+
+        # Records appended after the torn one was dropped are recovered too.
+        column = Board(recovered, 'board_b').add_node('creator', {'name': 'column'}, 'board_b')
+        self.assertEqual(column.to_dict(), self._open().get_node(column.id).to_dict())
+
+    def test_corrupt_record_in_the_last_segment_fails(self):
+        self.store.journal.close()
+        # A whole record whose checksum does not match was not torn by a crash, even at the end of the journal.
+        with open(os.path.join(self.path, self._segments()[-1]), 'ab') as f:
+            f.write(b'\x00\x00\x00\x04\x00\x00\x00\x00torn')
+
+        self.assertRaises(JournalCorruptError, self._open)
+
+    def test_corrupt_record_before_the_last_segment_fails(self):
+        self.store.snapshot()
+        Board(self.store, 'board_a').add_node('creator', {'text': 'card'}, self.column.id)
+        self.store.journal.close()
+        # Corrupt the first segment after the snapshot, then start a new one after it.
+        segment = os.path.join(self.path, self._segments()[0])
+        with open(segment, 'r+b') as f:
+            f.seek(10)
+            f.write(b'xx')
+        open(os.path.join(self.path, 'journal.%020d' % 10 ** 6), 'wb').close()
+
+        self.assertRaises(JournalCorruptError, self._open)
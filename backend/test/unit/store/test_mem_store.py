@@ -0,0 +1,71 @@
+import threading
+import unittest
+
+from retro.chain.board import Board
+from retro.chain.node import BoardNode
+from retro.store.mem_store import MemStore
+from retro.store.store import TransactionNodes
+
+
+class TestMemStore(unittest.TestCase):
+    def setUp(self):
+        self.store = MemStore()
+        self.store.create_board(BoardNode('board_a', content={"name": "a"}))
+        self.store.create_board(BoardNode('board_b', content={"name": "b"}))
+        self.board_a = Board(self.store, 'board_a')
+        self.board_b = Board(self.store, 'board_b')
+        self.column = self.board_a.add_node('creator', {'name': 'column'}, 'board_a')
+
+    def _blocked_transaction(self, started, release):
+        def func(proxy):
+            started.set()
+            release.wait()
+            return TransactionNodes(updates=[proxy.get_node(self.column.id)])
+
+        thread = threading.Thread(target=self.store.transaction, args=('board_a', func))
+        thread.start()
+        started.wait()
+
+        return thread
+
+    def test_readers_do_not_wait_for_writers(self):
+        version = self.store.get_board_version('board_a')
+        started, release = threading.Event(), threading.Event()
+        writer = self._blocked_transaction(started, release)
+
+        nodes = self.board_a.nodes()
+        self.board_b.add_node('creator', {'name': 'column'}, 'board_b')
+
+        release.set()
+        writer.join()
+
+        self.assertEqual(['board_a', self.column.id], [node.id for node in nodes])
+        self.assertEqual(version, nodes[0].version)
+        self.assertEqual(version + 1, self.store.get_board_version('board_a'))
+        self.assertEqual(2, len(self.board_b.nodes()))
+
+    def test_reads_share_unchanged_nodes(self):
+        card = self.board_a.add_node('creator', {'text': 'card'}, self.column.id)
+        before = self.board_a.nodes()
+        self.board_a.edit_node(self.column.id, [], lock='lock')
+        after = self.board_a.nodes()
+
+        self.assertEqual(['board_a', self.column.id, card.id], [node.id for node in after])
+        self.assertIs(before[2], after[2])
+        self.assertIsNot(before[1], after[1])
+
+    def test_failed_transaction_changes_nothing(self):
+        def func(proxy):
+            node = proxy.get_node(self.column.id)
+            node.content['name'] = 'changed'
+            raise RuntimeError("failed")
+
+        self.assertRaises(RuntimeError, self.store.transaction, 'board_a', func)
+        self.assertEqual({'name': 'column'}, self.store.get_node(self.column.id).content)
+
+    def test_returned_nodes_are_not_the_stored_ones(self):
+        self.column.content['name'] = 'changed'
+        self.store.get_node(self.column.id).content['name'] = 'changed'
+
+        self.assertEqual({'name': 'column'}, self.store.get_node(self.column.id).content)
+        self.assertEqual({'name': 'column'}, self.board_a.nodes()[1].content)
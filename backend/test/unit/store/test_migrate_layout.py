@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from retro.chain.board import Board
+from retro.chain.node import BoardNode
+from retro.store.migrate_layout import migrate_board
+from retro.store.redis_store import RedisStore
+from test.helpers import get_redis_container, get_redis_config
+
+
+class TestMigrateLayout(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_container = get_redis_container()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.redis_container:
+            cls.redis_container.stop()
+            cls.redis_container.remove()
+
+    def setUp(self):
+        self.node_store = RedisStore(mock.Mock(), layout='node', **get_redis_config(self.redis_container))
+        self.node_store.create_board(BoardNode('root', content={"name": "test board"}))
+
+        board = Board(self.node_store, 'root')
+        column = board.add_node('creator', {"name": "column"}, 'root')
+        board.add_node('creator', {"text": "card"}, column.id)
+
+        self.board_store = RedisStore(mock.Mock(), layout='board', client=self.node_store.client)
+
+    def tearDown(self):
+        self.node_store.client.flushall()
+
+    def test_migrate_board(self):
+        nodes = [node.to_dict() for node in Board(self.node_store, 'root').nodes()]
+
+        self.assertEqual(3, migrate_board(self.board_store, 'root'))
+        self.assertEqual(0, migrate_board(self.board_store, 'root'))
+
+        self.assertEqual(['BOARD.root', 'CHANGES.root'], sorted(self.board_store.client.keys()))
+        self.assertEqual(nodes, [node.to_dict() for node in Board(self.board_store, 'root').nodes()])
+
+        # Servers still configured with the old layout read the board where it now is.
+        node_store = RedisStore(mock.Mock(), layout='node', client=self.node_store.client)
+        self.assertEqual(nodes, [node.to_dict() for node in Board(node_store, 'root').nodes()])
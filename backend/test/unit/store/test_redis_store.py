@@ -1,10 +1,13 @@
 
 from functools import partial
 import unittest
+from unittest import mock
 
+from retro.store.exceptions import NodeNotFoundError, UnsupportedScriptError
 from retro.store.store import TransactionNodes
 from retro.store.redis_store import RedisStore
 from retro.chain.node import ColumnHeaderNode, BoardNode
+from retro.websocket_server.websocket_message import NodeUpdateMessage
 from test.helpers import get_redis_container, get_redis_config
 
 
@@ -20,7 +23,7 @@ class TestRedisStore(unittest.TestCase):
             cls.redis_container.remove()
 
     def setUp(self):
-        self.store = RedisStore(**get_redis_config(self.redis_container))
+        self.store = RedisStore(mock.Mock(), **get_redis_config(self.redis_container))
         self.store.create_board(BoardNode('root', content={"name": "test board"}))
 
     def tearDown(self):
@@ -42,6 +45,21 @@ class TestRedisStore(unittest.TestCase):
         self.assertEqual({"foo": "ColumnA"},
                          self.store.get_node(node.id).content)
 
+    def test_read_transaction(self):
+        versions = []
+
+        def read(proxy):
+            versions.append(proxy.get_node('root').version)
+            if len(versions) == 1:
+                self.store.transaction('root', lambda p: TransactionNodes(updates=[p.get_node('root')]))
+            return versions[-1]
+
+        with mock.patch.object(self.store._write_queue, 'submit', wraps=self.store._write_queue.submit) as submit:
+            self.assertEqual(2, self.store.read_transaction('root', read))
+
+        self.assertEqual([1, 2], versions)
+        self.assertEqual(1, submit.call_count)
+
     def test_get_node(self):
         node = self.store.get_node('root')
 
@@ -49,10 +67,153 @@ class TestRedisStore(unittest.TestCase):
         self.assertEqual('root', node.id)
         self.assertEqual(1, node.version)
 
+    def test_get_nodes(self):
+        node, _ = self.store.transaction('root', partial(self._transaction, {"foo": "ColumnA"}, "root")).updates
+
+        nodes = self.store.get_nodes([node.id, 'root'])
+
+        self.assertEqual([node.id, 'root'], [n.id for n in nodes])
+        self.assertEqual({"foo": "ColumnA"}, nodes[0].content)
+
+    def test_get_board_changes(self):
+        node, _ = self.store.transaction('root', partial(self._transaction, {"foo": "ColumnA"}, "root")).updates
+
+        changes = self.store.get_board_changes('root', 1)
+
+        self.assertEqual(2, changes.version)
+        self.assertEqual({node.id, 'root'}, {n.id for n in changes.updates})
+        self.assertEqual([], changes.deletes)
+        self.assertIsNone(self.store.get_board_changes('root', 0))
+
+        def remove(proxy):
+            root = proxy.get_node('root')
+            root.remove_child(node.id)
+            return TransactionNodes(updates=[root], deletes=[proxy.get_node(node.id)])
+
+        self.store.transaction('root', remove)
+        changes = self.store.get_board_changes('root', 2)
+
+        self.assertEqual(3, changes.version)
+        self.assertEqual(['root'], [n.id for n in changes.updates])
+        self.assertEqual([node.id], changes.deletes)
+        self.assertEqual([], self.store.get_board_changes('root', 3).updates)
+
+    def test_board_layouts_remembered(self):
+        self.assertEqual(1, self.store.get_board_version('root'))
+        with self.assertRaises(NodeNotFoundError):
+            self.store.get_board_version('missing')
+
+        # Only boards that exist are remembered, until they are removed.
+        self.assertEqual(['root'], list(self.store._board_layouts))
+        self.store.remove_board('root')
+        self.assertEqual([], list(self.store._board_layouts))
+
     def _transaction(self, node_content, parent_id, proxy):
         parent = proxy.get_node(parent_id)
 
-        node = ColumnHeaderNode(proxy.next_node_id(), node_content, parent=parent_id)
+        node = ColumnHeaderNode(proxy.next_node_id(), content=node_content, parent=parent_id)
         parent.set_child(node.id)
 
         return TransactionNodes(updates=[node, parent])
+
+
+class TestRedisStoreBoardLayout(TestRedisStore):
+    def setUp(self):
+        self.store = RedisStore(mock.Mock(), layout='board', **get_redis_config(self.redis_container))
+        self.store.create_board(BoardNode('root', content={"name": "test board"}))
+
+    def test_board_key(self):
+        self.assertEqual(['BOARD.root', 'CHANGES.root'], sorted(self.store.client.keys()))
+
+    def test_read_transaction(self):
+        def read(proxy):
+            self.store.transaction('root', lambda p: TransactionNodes(updates=[p.get_node('root')]))
+            return proxy.get_node('root').version
+
+        with mock.patch.object(self.store._write_queue, 'submit', wraps=self.store._write_queue.submit) as submit:
+            self.assertEqual(1, self.store.read_transaction('root', read))
+
+        self.assertEqual(1, submit.call_count)
+
+
+class TestRedisStoreScripts(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_container = get_redis_container()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.redis_container:
+            cls.redis_container.stop()
+            cls.redis_container.remove()
+
+    def setUp(self):
+        self.store = RedisStore(mock.Mock(), layout='board', scripts=True, **get_redis_config(self.redis_container))
+        self.store.create_board(BoardNode('root', content={"name": "test board"}))
+
+    def tearDown(self):
+        self.store.client.flushall()
+
+    def test_no_scripts_for_node_layout(self):
+        store = RedisStore(mock.Mock(), layout='node', scripts=True, **get_redis_config(self.redis_container))
+
+        self.assertFalse(store.supports_scripts)
+
+    def test_script_transaction(self):
+        parent, node = self.store.script_transaction('root', 'add_node', 'root', 'root|column', None, {}).updates
+
+        root = self.store.get_node('root')
+
+        self.assertEqual({node.id}, root.children)
+        self.assertEqual(2, root.version)
+        self.assertEqual({}, self.store.get_node(node.id).content)
+        self.store.index.update_board.assert_called_once_with(root)
+
+    def test_script_transaction_content_unchanged(self):
+        content = {"name": "column", "options": {"tags": ["a"], "width": 2}}
+        self.store.script_transaction('root', 'add_node', 'root', 'root|column', None, content)
+        self.store.script_transaction('root', 'add_node', 'root|column', 'root|card', None, {})
+
+        self.assertEqual(content, self.store.get_node('root|column').content)
+        self.assertEqual({"name": "test board"}, self.store.get_node('root').content)
+
+    def test_script_transaction_inexact_content(self):
+        content = {"name": "column", "options": {"tags": [], "colors": {}}, "id": 12345678901234567}
+
+        with self.assertRaises(UnsupportedScriptError):
+            self.store.script_transaction('root', 'add_node', 'root', 'root|column', None, content)
+
+        self.assertEqual(set(), self.store.get_node('root').children)
+
+    def test_script_transaction_missing_node(self):
+        with self.assertRaises(NodeNotFoundError):
+            self.store.script_transaction('root', 'remove_node', 'root|missing')
+
+
+class TestRedisStoreEventStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_container = get_redis_container()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.redis_container:
+            cls.redis_container.stop()
+            cls.redis_container.remove()
+
+    def setUp(self):
+        self.store = RedisStore(mock.Mock(), event_stream_length=100, **get_redis_config(self.redis_container))
+        self.store.create_board(BoardNode('root', content={"name": "test board"}))
+
+    def tearDown(self):
+        self.store.client.flushall()
+
+    def test_get_board_events(self):
+        last_event_id = self.store.follow_board('root')
+        self.store.transaction('root', lambda proxy: TransactionNodes(updates=[proxy.get_node('root')]))
+
+        events = self.store.get_board_events('root', last_event_id)
+
+        self.assertEqual([NodeUpdateMessage.type], [event.type for event in events])
+        self.assertEqual(2, events[0].data["nodes"][0]["version"])
+        self.assertIsNone(self.store.get_board_events('root', '0-1'))
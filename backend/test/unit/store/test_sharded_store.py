@@ -0,0 +1,57 @@
+import unittest
+from retro.chain.board import Board
+from retro.chain.node import BoardNode
+from retro.store.mem_store import MemStore
+from retro.store.sharded_store import HashRing, ShardedStore
+
+
+class TestHashRing(unittest.TestCase):
+    def test_keys_spread_over_shards(self):
+        ring = HashRing(["a", "b", "c"])
+        counts = {}
+        for i in range(3000):
+            shard = ring.get_shard("board-%s" % i)
+            counts[shard] = counts.get(shard, 0) + 1
+
+        self.assertEqual({"a", "b", "c"}, set(counts))
+        self.assertTrue(all(count > 600 for count in counts.values()), counts)
+
+    def test_adding_a_shard_moves_few_keys(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        keys = ["board-%s" % i for i in range(3000)]
+
+        moved = [key for key in keys if before.get_shard(key) != after.get_shard(key)]
+
+        self.assertTrue(all(after.get_shard(key) == "d" for key in moved))
+        self.assertLess(len(moved), 1200)
+
+
+class TestShardedStore(unittest.TestCase):
+    def setUp(self):
+        self.shards = {"a": MemStore(), "b": MemStore()}
+        self.store = ShardedStore(self.shards)
+
+    def test_boards_stay_on_their_shard(self):
+        board_ids = ["board-%s" % i for i in range(10)]
+        for board_id in board_ids:
+            self.store.create_board(BoardNode(board_id, content={"name": board_id}))
+            Board(self.store, board_id).add_node("creator", {"name": "column"}, board_id)
+
+        for board_id in board_ids:
+            shard = self.store.shard(board_id)
+            nodes = Board(self.store, board_id).nodes()
+
+            self.assertEqual(2, len(nodes))
+            self.assertEqual([node.id for node in nodes], [shard.get_node(node.id).id for node in nodes])
+            self.assertEqual(shard.get_board_version(board_id), self.store.get_board_version(board_id))
+
+        self.assertEqual(10, sum(len(shard.boards) for shard in self.shards.values()))
+        self.assertTrue(all(shard.boards for shard in self.shards.values()))
+
+    def test_get_nodes_across_shards(self):
+        board_ids = ["board-%s" % i for i in range(10)]
+        for board_id in board_ids:
+            self.store.create_board(BoardNode(board_id, content={"name": board_id}))
+
+        self.assertEqual(board_ids, [node.id for node in self.store.get_nodes(board_ids)])
@@ -0,0 +1,135 @@
+import threading
+import unittest
+from functools import partial
+
+from retro.chain.board import Board
+from retro.chain.node import BoardNode, ColumnHeaderNode
+from retro.store.exceptions import NodeLockedError, NodeNotFoundError
+from retro.store.mem_store import MemStore
+from retro.store.write_queue import BatchProxy, BoardWriteQueue
+
+
+class _NotifyingLock(threading.Condition):
+    """
+    A lock that wakes up its waiters whenever it is released, so tests can wait for the queue to change.
+    """
+    def __exit__(self, *args):
+        self.notify_all()
+        return super().__exit__(*args)
+
+
+class TestBoardWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = BoardWriteQueue()
+        self.batches = []
+
+    def _commit_batch(self, board_id, entries):
+        self.batches.append([entry.func for entry in entries])
+        for entry in entries:
+            entry.result = entry.func()
+
+    def test_submit(self):
+        self.assertEqual('result', self.queue.submit('board', lambda: 'result', self._commit_batch))
+        self.assertEqual([1], [len(batch) for batch in self.batches])
+        self.assertEqual(1, self.queue.stats('board')['transactions'])
+
+    def test_queued_writes_are_batched(self):
+        self.queue._lock = _NotifyingLock()
+        committing = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def blocking_commit(board_id, entries):
+            committing.set()
+            release.wait(5)
+            self._commit_batch(board_id, entries)
+
+        leader = threading.Thread(target=lambda: results.append(self.queue.submit('board', lambda: 0, blocking_commit)))
+        leader.start()
+        self.assertTrue(committing.wait(5))
+
+        followers = [threading.Thread(target=lambda i=i: results.append(self.queue.submit('board', lambda: i,
+                                                                                          blocking_commit)))
+                     for i in range(1, 5)]
+        for follower in followers:
+            follower.start()
+
+        with self.queue._lock:
+            self.assertTrue(self.queue._lock.wait_for(lambda: self.queue.stats('board')['queue_depth'] == 4, 5))
+
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual([0, 1, 2, 3, 4], sorted(results))
+        self.assertEqual([1, 4], [len(batch) for batch in self.batches])
+        self.assertEqual(2, self.queue.stats('board')['batches'])
+        self.assertEqual(4, self.queue.stats('board')['max_queue_depth'])
+
+    def test_failed_commit(self):
+        def failing_commit(board_id, entries):
+            entries[0].result = entries[0].func()
+            raise RuntimeError("commit failed")
+
+        self.assertRaises(RuntimeError, self.queue.submit, 'board', lambda: 'result', failing_commit)
+        self.assertEqual('result', self.queue.submit('board', lambda: 'result', self._commit_batch))
+
+    def test_stats_evicted(self):
+        self.queue = BoardWriteQueue(stats_cache_size=2)
+
+        def commit_others(board_id, entries):
+            # Boards written while 'a' is still queued never push its counters out.
+            self.queue.submit('b', lambda: None, self._commit_batch)
+            self.queue.submit('c', lambda: None, self._commit_batch)
+            self._commit_batch(board_id, entries)
+
+        self.queue.submit('a', lambda: None, commit_others)
+        self.assertEqual(['a', 'c'], sorted(self.queue.stats()))
+
+        self.queue.submit('d', lambda: None, self._commit_batch)
+        self.assertEqual(['c', 'd'], sorted(self.queue.stats()))
+
+
+class TestBatchProxy(unittest.TestCase):
+    def setUp(self):
+        self.store = MemStore({"root": BoardNode("root", children={'root|column_a'}).to_dict(),
+                               "root|column_a": ColumnHeaderNode("root|column_a", parent="root").to_dict()})
+        self.board = Board(self.store, 'root')
+        self.proxy = BatchProxy(self.store)
+
+    def test_reads_see_earlier_writes(self):
+        first = self.board._add_node('creator', {'text': 'first'}, 'root|column_a', self.proxy)
+        self.proxy.apply(first)
+        second = self.board._add_node('creator', {'text': 'second'}, 'root|column_a', self.proxy)
+        self.proxy.apply(second)
+
+        merged = {node.id: node for node in self.proxy.merged().updates}
+
+        self.assertEqual(3, len(merged))
+        self.assertEqual(second.updates[1].id, merged['root|column_a'].child)
+        self.assertEqual(first.updates[1].id, merged[second.updates[1].id].child)
+
+    def test_unapplied_changes_are_discarded(self):
+        node = self.proxy.get_node('root|column_a')
+        node.content = {'name': 'changed'}
+
+        self.assertEqual(None, self.proxy.get_node('root|column_a').content)
+        self.assertEqual([], self.proxy.merged().updates)
+
+    def test_deleted_nodes(self):
+        self.proxy.apply(self.board._remove_node('root|column_a', self.proxy))
+
+        self.assertRaises(NodeNotFoundError, self.proxy.get_node, 'root|column_a')
+        self.assertEqual(['root|column_a'], [node.id for node in self.proxy.merged().deletes])
+
+    def test_locks(self):
+        self.proxy.apply(self.board._edit_node('root|column_a', [], 'lock_value', None, self.proxy))
+
+        self.assertEqual('lock_value', self.proxy.get_node_lock('root|column_a'))
+        self.assertRaises(NodeLockedError, partial(self.board._edit_node, 'root|column_a', [], None, None, self.proxy))
+
+        self.proxy.apply(self.board._edit_node('root|column_a', [], None, 'lock_value', self.proxy))
+
+        self.assertEqual(None, self.proxy.get_node_lock('root|column_a'))
+        self.assertEqual(['root|column_a'], self.proxy.merged().unlocks)
+        self.assertEqual([], self.proxy.merged().locks)